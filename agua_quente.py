@@ -0,0 +1,149 @@
+# Demanda de água quente e capacidade do aquecedor, sobre os mesmos eventos da simulação de vazão.
+#
+# Cada evento de aparelho (os do catálogo e a máquina de lavar) é dividido em água quente e fria
+# por mistura: a fração quente é (T_uso - T_fria) / (T_quente - T_fria), limitada a [0, 1], com a
+# temperatura de uso de cada aparelho (a do catálogo, ver catalogo_aparelhos; os demais só usam
+# água fria). A água fria acompanha a temperatura do ar (limitada a FAIXA_AGUA_FRIA) ou é fixa, de
+# modo que a temperatura afeta tanto a duração do banho quanto a parcela quente da sua vazão.
+# A série de água quente do prédio sai dos mesmos intervalos com a vazão multiplicada pela fração
+# e é acumulada como a vazão total (memoria.AcumuladorVazao: média e P5/P95 por instante).
+# O aquecedor é um reservatório de água quente que começa cheio e recupera a vazão constante R:
+#   - central: um para o prédio, avaliado por reservatorio.AcumuladorReservatorio (volume
+#     necessário, recuperação mínima e probabilidade de faltar água quente);
+#   - individual: um por apartamento, com o déficit de Lindley de cada apartamento calculado de uma
+#     vez, com os apartamentos como linhas (ver trechos_por_apartamento).
+# Um aquecedor de passagem (sem reservação) é o caso de volume zero com R igual à sua capacidade.
+
+import numpy as np
+
+import catalogo_aparelhos
+import eventos
+import memoria
+import reservatorio
+
+# Temperatura de uso (°C) dos aparelhos do catálogo padrão que misturam água quente
+TEMPERATURAS_USO = catalogo_aparelhos.temperaturas_uso(catalogo_aparelhos.CATALOGO)
+
+# Faixa da temperatura da água fria quando ela acompanha a temperatura do ar (°C)
+FAIXA_AGUA_FRIA = (10.0, 30.0)
+
+# Opções exibidas na barra lateral -> tipo de aquecedor
+TIPOS_AQUECEDOR = {"Central (um para o prédio)": "central", "Individual (um por apartamento)": "individual"}
+
+
+def temperatura_agua_fria(temperatura_ar, temperatura_fria=None):
+    """Temperatura da água fria: fixa ('temperatura_fria') ou a do ar limitada a FAIXA_AGUA_FRIA."""
+    if temperatura_fria is not None:
+        return np.full(np.shape(temperatura_ar), float(temperatura_fria))
+    return np.clip(temperatura_ar, *FAIXA_AGUA_FRIA)
+
+
+def fracoes_quente(aparelhos, temperatura_fria, temperatura_quente, temperaturas_uso=TEMPERATURAS_USO):
+    """Fração de água quente de cada evento ('aparelhos': chaves dos aparelhos), 0 nos aparelhos só de água fria."""
+    aparelhos = np.asarray(aparelhos)
+    uso = np.full(aparelhos.shape, np.nan)
+    for aparelho, temperatura_uso in temperaturas_uso.items():
+        uso[aparelhos == aparelho] = temperatura_uso
+    fracao = (uso - temperatura_fria) / np.maximum(temperatura_quente - temperatura_fria, 1e-9)
+    return np.nan_to_num(np.clip(fracao, 0.0, 1.0), nan=0.0)
+
+
+def trechos_por_apartamento(inicios, fins, vazoes, apartamentos, n_apartamentos, n_pontos, passo_tempo):
+    """
+    Matrizes (vazoes, duracoes) n_apartamentos x n_trechos da vazão de cada apartamento.
+
+    Os eventos de cada apartamento são deslocados para uma linha do tempo própria e montados numa
+    única SerieEsparsa; os limites entre apartamentos viram pontos de mudança, e os trechos de cada
+    apartamento vão para a sua linha (completada com trechos de duração zero).
+    """
+    deslocamento = np.asarray(apartamentos, dtype=np.int64) * n_pontos * passo_tempo
+    serie = eventos.SerieEsparsa.de_intervalos(np.asarray(inicios) + deslocamento, np.asarray(fins) + deslocamento,
+                                               vazoes, n_apartamentos * n_pontos, passo_tempo)
+    tempos = np.union1d(serie.tempos, np.arange(n_apartamentos, dtype=np.int64) * n_pontos)
+    valores = serie.vazoes[np.searchsorted(serie.tempos, tempos, side='right') - 1]
+    duracoes = np.diff(np.append(tempos, n_apartamentos * n_pontos))
+    apartamento = tempos // n_pontos
+    contagem = np.bincount(apartamento, minlength=n_apartamentos)
+    coluna = np.arange(len(tempos)) - np.repeat(np.cumsum(contagem) - contagem, contagem)
+    matriz_vazoes = np.zeros((n_apartamentos, contagem.max()))
+    matriz_duracoes = np.zeros((n_apartamentos, contagem.max()))
+    matriz_vazoes[apartamento, coluna] = valores
+    matriz_duracoes[apartamento, coluna] = duracoes
+    return matriz_vazoes, matriz_duracoes
+
+
+class AcumuladorAguaQuente:
+    """
+    Acumula a demanda de água quente e a capacidade do aquecedor a partir dos eventos de cada iteração.
+
+    'parametros': {'temperatura_quente', 'temperatura_fria' (None = acompanha o ar), 'aquecedor'
+    ('central' ou 'individual'), 'volume' (L, por aquecedor), 'recuperacao' (L/s, por aquecedor),
+    'nivel_servico' (%)}. 'temperaturas_uso' ({chave do aparelho: °C}) vem do catálogo de aparelhos.
+    """
+
+    def __init__(self, parametros, n_pontos, passo_tempo, n_apartamentos, orcamento_mb=None,
+                 temperaturas_uso=TEMPERATURAS_USO):
+        self.parametros = parametros
+        self.temperaturas_uso = temperaturas_uso
+        self.n_pontos = n_pontos
+        self.passo_tempo = passo_tempo
+        self.n_apartamentos = n_apartamentos
+        self.acumulador = memoria.AcumuladorVazao(n_pontos, orcamento_mb)
+        self.volumes_quentes = []
+        self.central = None
+        self.necessarios_apartamentos = []
+        if parametros['aquecedor'] == 'central':
+            self.central = reservatorio.AcumuladorReservatorio(parametros['recuperacao'], parametros['volume'],
+                                                               parametros['nivel_servico'], passo_tempo)
+
+    def adicionar(self, inicios, fins, vazoes, aparelhos, apartamentos, temperatura_ar):
+        """
+        Eventos de uma iteração: intervalos [inicio, fim) em segundos, vazão total (L/s), aparelho,
+        apartamento (a partir de 0) e temperatura do ar (um valor ou um por evento).
+        """
+        inicios = np.asarray(inicios, dtype=np.int64)
+        fins = np.asarray(fins, dtype=np.int64)
+        temperatura_fria = temperatura_agua_fria(temperatura_ar, self.parametros['temperatura_fria'])
+        fracao = fracoes_quente(aparelhos, temperatura_fria, self.parametros['temperatura_quente'], self.temperaturas_uso)
+        quentes = np.asarray(vazoes, dtype=float) * fracao
+        selecao = quentes > 0
+        inicios, fins, quentes = inicios[selecao], fins[selecao], quentes[selecao]
+
+        serie_quente = eventos.SerieEsparsa.de_intervalos(inicios, fins, quentes, self.n_pontos, self.passo_tempo)
+        self.acumulador.adicionar(serie_quente)
+        self.volumes_quentes.append(float(np.sum(quentes * (fins - inicios))))
+        if self.central is not None:
+            self.central.adicionar(serie_quente)
+        else:
+            matriz_vazoes, matriz_duracoes = trechos_por_apartamento(
+                inicios, fins, quentes, np.asarray(apartamentos)[selecao], self.n_apartamentos, self.n_pontos, self.passo_tempo)
+            self.necessarios_apartamentos.append(reservatorio.volumes_necessarios(
+                matriz_vazoes, matriz_duracoes, self.parametros['recuperacao'], self.passo_tempo))
+
+    def finalizar(self):
+        media_ts, p5_ts, p95_ts = self.acumulador.finalizar()
+        volumes_quentes = np.asarray(self.volumes_quentes)
+        resultados = {
+            'parametros': self.parametros,
+            'media_ts': media_ts,
+            'p5_ts': p5_ts,
+            'p95_ts': p95_ts,
+            'max_media': float(np.max(media_ts)),
+            'max_p95': float(np.max(p95_ts)),
+            'volumes_iteracao': volumes_quentes, # L de água quente por iteração
+            'volume_medio': float(volumes_quentes.mean()) if len(volumes_quentes) else float('nan'),
+        }
+        if self.central is not None:
+            resultados['central'] = self.central.finalizar()
+            resultados['probabilidade_falta'] = resultados['central']['probabilidade_falta']
+        else:
+            # Volume necessário de cada apartamento em cada iteração (n_iteracoes x n_apartamentos)
+            necessarios = np.vstack(self.necessarios_apartamentos)
+            falta = necessarios > self.parametros['volume']
+            resultados['individual'] = {
+                'volume_nivel_servico': float(np.percentile(necessarios, self.parametros['nivel_servico'])),
+                'fracao_apartamentos_falta': float(falta.mean()),
+            }
+            # Falta de água quente em algum apartamento do prédio
+            resultados['probabilidade_falta'] = float(falta.any(axis=1).mean())
+        return resultados
@@ -0,0 +1,106 @@
+# Sorteio dos números aleatórios de cada lote do Monte Carlo.
+#
+# Cada iteração consome um ponto em [0, 1)^d, com d = 2 x (moradores do prédio): a primeira
+# metade define o horário de início do banho de cada morador e a segunda metade o modelo
+# da máquina de lavar. Nos métodos de baixa discrepância (Sobol embaralhado e Hipercubo
+# Latino) cada lote é uma réplica independente, gerada com nova semente, de modo que as
+# estatísticas calculadas lote a lote (erro padrão do P95) continuam válidas.
+#
+# As técnicas de redução de variância seguem a mesma regra: os pares antitéticos e os estratos
+# ficam sempre dentro do lote, e lotes diferentes são independentes entre si.
+
+import warnings
+
+import numpy as np
+
+# Opções exibidas na barra lateral -> identificador interno do método
+METODOS_AMOSTRAGEM = {
+    "Aleatória simples": "aleatoria",
+    "Sobol embaralhado (QMC)": "sobol",
+    "Hipercubo Latino (LHS)": "lhs",
+    "Antitética (t ↔ duração − t)": "antitetica",
+    "Estratificada por faixas fuzzy": "estratificada",
+}
+
+# Número de faixas de horário entre os picos dos 5 conjuntos fuzzy de início do banho
+N_FAIXAS_FUZZY = 4
+
+# Dimensão máxima suportada pelo gerador de Sobol do SciPy
+DIMENSAO_MAXIMA_SOBOL = 21201
+
+
+def dimensao_por_iteracao(total_moradores):
+    """Quantidade de números uniformes consumidos por iteração."""
+    return 2 * total_moradores
+
+
+def sortear_lote(metodo, n_iteracoes, total_moradores, rng):
+    """
+    Gera uma matriz (n_iteracoes x 2*total_moradores) de uniformes em [0, 1) para um lote.
+
+    'rng' é um numpy.random.Generator; ele fornece a semente de cada réplica embaralhada.
+    """
+    dimensao = dimensao_por_iteracao(total_moradores)
+    if metodo in ("sobol", "lhs"):
+        # scipy.stats é importado sob demanda (custa ~1 s na partida do aplicativo)
+        from scipy.stats import qmc
+
+    if metodo == "sobol" and dimensao <= DIMENSAO_MAXIMA_SOBOL:
+        amostrador = qmc.Sobol(d=dimensao, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # O balanceamento ideal exige lotes com tamanho potência de 2, mas qualquer tamanho é válido
+            warnings.simplefilter("ignore", UserWarning)
+            return amostrador.random(n_iteracoes)
+
+    if metodo in ("sobol", "lhs"):
+        # Sobol acima da dimensão suportada recai no Hipercubo Latino
+        return qmc.LatinHypercube(d=dimensao, seed=rng).random(n_iteracoes)
+
+    if metodo == "antitetica":
+        # Iterações em pares (u, 1 - u): horário t vira (duração - 1 - t) e o modelo da MLR é espelhado
+        n_pares = n_iteracoes // 2
+        base = rng.random((n_pares, dimensao))
+        uniformes = np.empty((n_iteracoes, dimensao))
+        uniformes[0:2 * n_pares:2] = base
+        uniformes[1:2 * n_pares:2] = np.nextafter(1.0, 0.0) - base
+        if n_iteracoes % 2:
+            # Lote de tamanho ímpar: a última iteração fica sem par
+            uniformes[-1] = rng.random(dimensao)
+        return uniformes
+
+    if metodo == "estratificada":
+        # Para cada morador, os horários do lote são distribuídos igualmente entre as faixas fuzzy
+        # (ordem aleatória) e sorteados uniformemente dentro da faixa; com lote que não é múltiplo de
+        # N_FAIXAS_FUZZY, as faixas que recebem um horário a mais são sorteadas por morador (a partir
+        # de uma faixa inicial aleatória), para não favorecer as primeiras
+        uniformes = rng.random((n_iteracoes, dimensao))
+        faixas = (np.arange(n_iteracoes)[:, None] + rng.integers(N_FAIXAS_FUZZY, size=total_moradores)) % N_FAIXAS_FUZZY
+        faixas = rng.permuted(faixas, axis=0)
+        uniformes[:, :total_moradores] = (faixas + uniformes[:, :total_moradores]) / N_FAIXAS_FUZZY
+        return uniformes
+
+    return rng.random((n_iteracoes, dimensao))
+
+
+def uniforme_para_inteiro(u, n_opcoes):
+    """Converte um uniforme em [0, 1) para um inteiro em [0, n_opcoes)."""
+    return min(int(u * n_opcoes), n_opcoes - 1)
+
+
+def fator_reducao_variancia(valores_iteracao, tamanho_lote):
+    """
+    Estima quantas vezes a variância da média de um lote caiu em relação à amostragem simples.
+
+    Compara a variância observada entre as médias dos lotes com a variância esperada caso as
+    iterações do lote fossem independentes (variância por iteração / tamanho do lote).
+    Retorna None enquanto houver menos de dois lotes completos.
+    """
+    n_lotes = len(valores_iteracao) // tamanho_lote
+    if n_lotes < 2:
+        return None
+    valores = np.asarray(valores_iteracao[:n_lotes * tamanho_lote], dtype=float)
+    variancia_medias_lotes = np.var(valores.reshape(n_lotes, tamanho_lote).mean(axis=1), ddof=1)
+    variancia_simples = np.var(valores, ddof=1) / tamanho_lote
+    if variancia_medias_lotes <= 0:
+        return None
+    return variancia_simples / variancia_medias_lotes
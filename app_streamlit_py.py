@@ -1,21 +1,31 @@
 # This code should be saved as a Python file (e.g., app.py) and run from the terminal using 'streamlit run app.py'
 
+import contextlib
+import os
+import uuid
+
 import streamlit as st
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
-import random
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
 import pandas as pd
-import io
-
-# --- FUNÇÃO PARA CÁLCULO DA DURAÇÃO DA MÁQUINA DE LAVAR (NOVA) ---
-def calcular_tempo_enchimento(volume_litros, vazao_L_por_s):
-    """Calcula o tempo (em segundos) necessário para encher a máquina."""
-    if vazao_L_por_s > 0:
-        return volume_litros / vazao_L_por_s
-    return 0
+from time import perf_counter
+import motor_convolucao
+import amostragem
+import catalogo_aparelhos
+import cauda
+import criterios_parada
+import motor_simulacao
+import instrumentacao
+import memoria
+import eventos
+import simulacao_diaria
+import regras_fuzzy
+import exportacao
+import armazem_series
+import graficos
+import janelas_moveis
+import agua_quente
+import sensibilidade
 
 # Define the main title of the application
 st.title("Simulação de Vazão em Prédio Residencial")
@@ -30,100 +40,53 @@ O usuário deve fornecer as informações do edifício, moradores e as demais in
 # --- INÍCIO DA ALTERAÇÃO 3: ADIÇÃO DA TABELA DE REGRAS NA SEÇÃO CENTRAL ---
 # Criação da Tabela de Regras Fuzzy para o Usuário
 # Conjuntos de Entrada (Horário de Início e Temperatura)
-conjuntos_inicio = ["Muito Cedo", "Cedo", "Na Hora", "Atrasado", "Muito Atrasado"]
-conjuntos_temp = ["Muito Frio", "Frio", "Agradável", "Quente", "Muito Quente"]
-
-# Conjuntos de Saída (Duração do Banho) - Correspondente aos conjuntos Fuzzy (em minutos)
-# No código original: 'No shower', 'Very fast', 'Fast', 'Normal', 'Long'
-mapa_duracao = {
-    'No shower': 'Sem Banho',
-    'Very fast': 'Muito Rápido',
-    'Fast': 'Rápido',
-    'Normal': 'Normal',
-    'Long': 'Longo'
-}
-
-# Definição das Regras em Português para cada Morador (Visualização)
-# As regras são extraídas da lógica do código original, mas MANTIDAS AQUI APENAS PARA EXIBIÇÃO
-regras_morador_1_display = {
-    "Muito Frio": [mapa_duracao['Very fast'], mapa_duracao['Very fast'], mapa_duracao['Very fast'], mapa_duracao['No shower'], mapa_duracao['No shower']],
-    "Frio":       [mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['No shower'], mapa_duracao['No shower']],
-    "Agradável":  [mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['Fast'],      mapa_duracao['No shower'], mapa_duracao['No shower']],
-    "Quente":     [mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['Very fast'], mapa_duracao['No shower']],
-    "Muito Quente": [mapa_duracao['Long'],      mapa_duracao['Long'],      mapa_duracao['Normal'],    mapa_duracao['Very fast'], mapa_duracao['No shower']]
-}
-
-regras_morador_2_display = {
-    "Muito Frio": [mapa_duracao['Very fast'], mapa_duracao['Very fast'], mapa_duracao['Very fast'], mapa_duracao['No shower'], mapa_duracao['No shower']],
-    "Frio":       [mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['No shower'], mapa_duracao['No shower']],
-    "Agradável":  [mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['Fast'],      mapa_duracao['No shower'], mapa_duracao['No shower']], # DIFERENÇA EM AGRADAVEL / NA HORA
-    "Quente":     [mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['Very fast'], mapa_duracao['No shower']],
-    "Muito Quente": [mapa_duracao['Normal'],    mapa_duracao['Long'],      mapa_duracao['Normal'],    mapa_duracao['Very fast'], mapa_duracao['No shower']] # DIFERENÇA EM MUITO QUENTE
-}
-
-regras_morador_3_display = {
-    "Muito Frio": [mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower']], # DIFERENÇA EM TODAS AS FRIAS
-    "Frio":       [mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower'], mapa_duracao['No shower']], # DIFERENÇA EM TODAS AS FRIAS
-    "Agradável":  [mapa_duracao['Fast'],      mapa_duracao['Normal'],    mapa_duracao['Normal'],    mapa_duracao['No shower'], mapa_duracao['No shower']], # DIFERENÇA EM AGRADAVEL
-    "Quente":     [mapa_duracao['Long'],      mapa_duracao['Normal'],    mapa_duracao['Long'],      mapa_duracao['Very fast'], mapa_duracao['No shower']], # DIFERENÇA EM QUENTE / NA HORA
-    "Muito Quente": [mapa_duracao['Long'],      mapa_duracao['Normal'],    mapa_duracao['Long'],      mapa_duracao['Very fast'], mapa_duracao['No shower']] # DIFERENÇA EM MUITO QUENTE
-}
-
-def criar_tabela_regra(titulo_regra, regras_data):
-    """Gera o HTML para a tabela de regras detalhada."""
-    # Transforma o dicionário de regras em um DataFrame para facilitar o manuseio das linhas
-    df_regras_display = pd.DataFrame(regras_data, index=conjuntos_inicio).T.reset_index()
-    df_regras_display.columns = ['Temperatura'] + conjuntos_inicio # Garante os nomes corretos das colunas
-    
-    # Inicia a string HTML
-    html_content = f"""
+conjuntos_inicio = regras_fuzzy.ROTULOS_INICIO
+conjuntos_temp = regras_fuzzy.ROTULOS_TEMPERATURA
+
+# As tabelas de regras são geradas das matrizes de regras (regras_fuzzy), as mesmas usadas na simulação
+
+# Estilos das células das tabelas de regras
+ESTILO_CABECALHO = "text-align:center; font-weight:bold; padding: 8px; background-color: #f8f8f8;"
+ESTILO_CABECALHO_INICIO = "text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;"
+ESTILO_TEMPERATURA = "text-align:left; padding: 8px; font-weight:bold;"
+ESTILO_CELULA = "text-align:center; padding: 8px;"
+
+
+# O HTML de cada tabela é gerado uma vez por conjunto de regras (título e matriz) e reaproveitado nas reexecuções
+@st.cache_data(show_spinner=False)
+def criar_tabela_regra(titulo_regra, regras):
+    """Gera o HTML para a tabela de regras detalhada a partir da matriz de regras."""
+    cabecalho_inicio = "".join(f'<td style="{ESTILO_CABECALHO_INICIO}">{inicio}</td>' for inicio in conjuntos_inicio)
+    linhas = "".join(
+        f'<tr><td style="{ESTILO_TEMPERATURA}">{temperatura}</td>'
+        + "".join(f'<td style="{ESTILO_CELULA}">{duracao}</td>' for duracao in duracoes)
+        + "</tr>"
+        for temperatura, duracoes in regras_fuzzy.tabela_exibicao(regras).items()
+    )
+    return f"""
     <div style="margin-top: 30px; margin-bottom: 20px;">
     <h4>{titulo_regra}</h4>
     <div style="overflow-x:auto;">
     <table border="1" style="width:100%; border-collapse: collapse; font-size: 14px;">
         <thead>
             <tr>
-                <td rowspan="2" style="text-align:center; font-weight:bold; padding: 8px; background-color: #f8f8f8;">Temperatura</td>
-                <td colspan="5" style="text-align:center; font-weight:bold; padding: 8px; background-color: #f8f8f8;">Horário de Início</td>
-            </tr>
-            <tr>
-                <td style="text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;">Muito Cedo</td>
-                <td style="text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;">Cedo</td>
-                <td style="text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;">Na Hora</td>
-                <td style="text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;">Atrasado</td>
-                <td style="text-align:center; font-weight:bold; padding: 8px; background-color: #f0f0f0;">Muito Atrasado</td>
+                <td rowspan="2" style="{ESTILO_CABECALHO}">Temperatura</td>
+                <td colspan="{len(conjuntos_inicio)}" style="{ESTILO_CABECALHO}">Horário de Início</td>
             </tr>
+            <tr>{cabecalho_inicio}</tr>
         </thead>
-        <tbody>
-    """
-    
-    # Adiciona as linhas da tabela
-    for index, row in df_regras_display.iterrows():
-        html_content += "<tr>"
-        html_content += f"<td style=\"text-align:left; padding: 8px; font-weight:bold;\">{row['Temperatura']}</td>"
-        
-        # Itera sobre os conjuntos de início para as células de dados
-        for inicio in conjuntos_inicio:
-            html_content += f"<td style=\"text-align:center; padding: 8px;\">{row[inicio]}</td>"
-            
-        html_content += "</tr>"
-    
-    # Fecha o corpo e a tabela
-    html_content += """
-        </tbody>
+        <tbody>{linhas}</tbody>
     </table>
     </div>
     </div>
     """
-    # Retorna o HTML sem tags extras que possam causar erro de renderização
-    return html_content
+
 
 st.markdown("---")
 st.header("Resumo das Regras Fuzzy de Duração do Banho")
 
-# Tabela 1: Resumo das Regras para as Opções 1, 2, 3
-st.write(
-    """
+# Tabela 1: Resumo das Regras para as Opções 1, 2, 3 (conteúdo fixo, montado uma única vez por processo)
+TABELA_RESUMO_REGRAS = """
     **Tabela de Opções de Regras (Duração do Banho em Minutos)**
     <div style="overflow-x:auto;">
     <table border="1" style="width:100%; border-collapse: collapse; font-size: 14px;">
@@ -150,19 +113,13 @@ st.write(
     </table>
     </div>
     """
-, unsafe_allow_html=True)
+st.markdown(TABELA_RESUMO_REGRAS, unsafe_allow_html=True)
 st.markdown("---")
 
 
-# Tabela 2: Regras da Opção 1 (Detalhe)
-# Título alterado para "Regras da Opção 1"
-st.markdown(criar_tabela_regra("Regras da Opção 1 ", regras_morador_1_display), unsafe_allow_html=True)
-
-# Tabela 3: Regras da Opção 2 (Detalhe)
-st.markdown(criar_tabela_regra("Regras da Opção 2 ", regras_morador_2_display), unsafe_allow_html=True)
-
-# Tabela 4: Regras da Opção 3 (Detalhe)
-st.markdown(criar_tabela_regra("Regras da Opção 3 ", regras_morador_3_display), unsafe_allow_html=True)
+# Tabelas 2 em diante: regras de cada opção (detalhe), preenchidas depois da barra lateral,
+# que pode acrescentar conjuntos de regras personalizados
+area_tabelas_regras = st.container()
 
 st.markdown("---")
 # --- FIM DA ALTERAÇÃO 3 ---
@@ -170,6 +127,9 @@ st.markdown("---")
 
 # Create a sidebar for user inputs
 st.sidebar.title("Configurações da Simulação")
+# Modo de dia inteiro: horizonte de 24 h x dias, perfil horário de temperatura e várias janelas de uso
+modo_simulacao = st.sidebar.radio("Modo de Simulação:", ["Janela única (temperaturas fixas)", "Dia inteiro / vários dias (perfil horário)"])
+modo_diario = modo_simulacao.startswith("Dia inteiro")
 st.sidebar.markdown("---") # Separator
 
 # Definição de como calcular a diferença em segundos dos horários inseridos
@@ -194,20 +154,73 @@ quantidade_pavimentos = st.sidebar.number_input("Quantidade de pavimentos:", min
 quantidade_moradores_por_apartamento = st.sidebar.number_input("Quantidade de moradores por apartamento:", min_value=1, value=5, step=1)
 quantidade_banheiros_por_apartamento = st.sidebar.number_input("Quantidade de banheiros por apartamento:", min_value=1, value=2, step=1)
 
+# Catálogo dos aparelhos da rotina do banho (ver catalogo_aparelhos.py): editado aqui ou lido de CSV
+with st.sidebar.expander("Catálogo de aparelhos"):
+    arquivo_catalogo = st.file_uploader("Catálogo em CSV (mesmas colunas da tabela):", type=["csv", "txt"])
+    linhas_catalogo = catalogo_aparelhos.CATALOGO_PADRAO
+    if arquivo_catalogo is not None:
+        try:
+            linhas_catalogo = catalogo_aparelhos.ler_catalogo_csv(arquivo_catalogo)
+        except ValueError as erro:
+            st.error(f"{arquivo_catalogo.name}: {erro}")
+    tabela_catalogo = st.data_editor(
+        pd.DataFrame(linhas_catalogo), num_rows="dynamic", hide_index=True,
+        column_config={
+            'Referência': st.column_config.SelectboxColumn('Referência', options=list(catalogo_aparelhos.REFERENCIAS), required=True),
+            'Usuário': st.column_config.SelectboxColumn('Usuário', options=list(catalogo_aparelhos.USUARIOS), required=True),
+            'Ocupa o banheiro': st.column_config.CheckboxColumn('Ocupa o banheiro', default=True),
+            **{coluna: st.column_config.SelectboxColumn(coluna, options=list(catalogo_aparelhos.DISTRIBUICOES))
+               for coluna in ('Distribuição da duração', 'Distribuição do deslocamento')},
+        })
+    st.caption("Deslocamento a partir do início ou do fim do banho (negativo = antes); a linha 'banho' acompanha o chuveiro. "
+               "A máquina de lavar começa após a pia (ou após o banho). Temperatura de uso vazia = só água fria. "
+               "Duração e deslocamento podem ser sorteados a cada iteração: a dispersão é o desvio padrão "
+               "(lognormal, com média no valor da tabela) ou a meia largura (triangular).")
+try:
+    catalogo = catalogo_aparelhos.converter_catalogo(tabela_catalogo.to_dict('records'))
+except ValueError as erro:
+    st.sidebar.error(f"Catálogo de aparelhos: {erro} Usando o catálogo padrão.")
+    catalogo = catalogo_aparelhos.CATALOGO
+
 # --- INÍCIO DA ALTERAÇÃO 1: Configuração das Regras Fuzzy por Morador ---
 st.sidebar.markdown("---")
 st.sidebar.subheader("Configuração das Regras Fuzzy")
 
+# Conjuntos de regras: os padrão (1, 2 e 3) e os personalizados (4 em diante), lidos de CSV ou
+# montados aqui a partir de uma cópia de um conjunto existente (ex.: um perfil "idoso")
+conjuntos_regras = dict(regras_fuzzy.REGRAS_PADRAO)
+nomes_conjuntos_regras = {}
+with st.sidebar.expander("Conjuntos de regras personalizados"):
+    arquivos_regras = st.file_uploader("Regras em CSV (temperaturas nas linhas, horários de início nas colunas):",
+                                       type=["csv", "txt"], accept_multiple_files=True)
+    for arquivo_regras in arquivos_regras or []:
+        try:
+            regras_lidas = regras_fuzzy.ler_regras_csv(arquivo_regras)
+        except ValueError as erro:
+            st.error(f"{arquivo_regras.name}: {erro}")
+        else:
+            nomes_conjuntos_regras[len(conjuntos_regras) + 1] = arquivo_regras.name
+            conjuntos_regras[len(conjuntos_regras) + 1] = regras_lidas
+    if st.checkbox("Montar um conjunto de regras na barra lateral"):
+        nome_montado = st.text_input("Nome do conjunto:", value="Idoso")
+        base_montado = st.selectbox("Partir das regras da opção:", options=list(conjuntos_regras))
+        tabela_montada = st.data_editor(
+            pd.DataFrame(regras_fuzzy.tabela_exibicao(conjuntos_regras[base_montado]), index=conjuntos_inicio).T,
+            column_config={inicio: st.column_config.SelectboxColumn(inicio, options=regras_fuzzy.ROTULOS_DURACAO, required=True)
+                           for inicio in conjuntos_inicio},
+            key=f"regras_montadas_{base_montado}")
+        nomes_conjuntos_regras[len(conjuntos_regras) + 1] = nome_montado
+        conjuntos_regras[len(conjuntos_regras) + 1] = regras_fuzzy.matriz_de_rotulos(tabela_montada.to_numpy())
+opcoes_regras = list(conjuntos_regras)
+
 # Tabela de opções para o usuário
 # ALTERAÇÃO DE TEXTO SOLICITADA
-st.sidebar.markdown("""
-Escolha a regra fuzzy para cada morador **(1, 2 ou 3, conforme tabela ao lado):**
+st.sidebar.markdown(f"""
+Escolha a regra fuzzy para cada morador **({', '.join(map(str, opcoes_regras[:-1]))} ou {opcoes_regras[-1]}, conforme tabela ao lado):**
 """)
 
 # Cria uma lista para armazenar as regras escolhidas
 regras_por_morador = []
-# ALTERAÇÃO DE NOMES SOLICITADA
-regras_map_nome = {1: "Morador 1 (Pai)", 2: "Morador 2 (Mãe)", 3: "Morador 3+ (Filho)"}
 regras_default = {1: 1, 2: 2}
 
 # Loop para criar o seletor para cada morador
@@ -225,7 +238,7 @@ for i in range(1, quantidade_moradores_por_apartamento + 1):
         
     regra_escolhida = st.sidebar.selectbox(
         f"{morador_display_name} (Regra padrão: {default_value}):",
-        options=[1, 2, 3],
+        options=opcoes_regras,
         index=default_value - 1, # Define o valor padrão
         key=f"regra_morador_{i}"
     )
@@ -233,6 +246,12 @@ for i in range(1, quantidade_moradores_por_apartamento + 1):
 
 # --- FIM DA ALTERAÇÃO 1: Configuração das Regras Fuzzy por Morador ---
 
+# Tabelas de regras de cada opção, geradas das matrizes, num único elemento da área reservada da seção central
+area_tabelas_regras.markdown("".join(
+    criar_tabela_regra(f"Regras da Opção {tipo_regra} " + (f"({nomes_conjuntos_regras[tipo_regra]})" if tipo_regra in nomes_conjuntos_regras else ""), regras)
+    for tipo_regra, regras in conjuntos_regras.items()
+), unsafe_allow_html=True)
+
 
 st.sidebar.markdown("---") # Separator
 st.sidebar.subheader("Parâmetros de Tempo")
@@ -246,6 +265,11 @@ intervalo_segundos = diferenca_tempo_em_segundos(horario_inicio_str, horario_fim
 # Solicita a duração da simulação com base no intervalo calculado
 duracao_simulacao = st.sidebar.number_input(f"Duração da simulação (segundos, mínimo {intervalo_segundos:.0f}):", min_value=int(intervalo_segundos), value=max(int(intervalo_segundos), 15300), step=60)
 
+# Resolução da grade de tempo: cada intervalo recebe a vazão média dos aparelhos abertos nele
+passo_tempo = st.sidebar.selectbox("Passo de Tempo (s):", options=list(motor_simulacao.PASSOS_TEMPO), index=0)
+if passo_tempo > 1:
+    st.sidebar.caption("Com passo maior que 1 s, o P95 é o da vazão média em cada intervalo (picos de poucos segundos são suavizados). Para o pré-dimensionamento, 10 s é suficiente.")
+
 
 st.sidebar.markdown("---") # Separator
 st.sidebar.subheader("Parâmetros de Temperatura")
@@ -269,6 +293,23 @@ except ValueError:
 # Exibe as temperaturas a serem simuladas (opcional, para verificação)
 st.sidebar.write(f"Temperaturas a serem simuladas: {temperaturas}")
 
+if modo_diario:
+    st.sidebar.markdown("---") # Separator
+    st.sidebar.subheader("Perfil Diário")
+    st.sidebar.caption("No modo de dia inteiro, o intervalo, a duração e as temperaturas acima são substituídos pelo perfil horário e pelas janelas de uso abaixo.")
+    arquivo_perfil = st.sidebar.file_uploader("Perfil horário de temperatura (CSV, uma linha por hora):", type=["csv", "txt"])
+    perfil_horario = None
+    if arquivo_perfil is not None:
+        try:
+            perfil_horario = simulacao_diaria.ler_perfil_temperatura(arquivo_perfil)
+        except ValueError as erro:
+            st.sidebar.error(str(erro))
+    if perfil_horario is None:
+        dias_perfil = st.sidebar.number_input("Dias (perfil senoidal entre as temperaturas mínima e máxima):", min_value=1, value=1, step=1)
+        perfil_horario = simulacao_diaria.perfil_sintetico(temperatura_minima, temperatura_maxima, dias_perfil)
+    st.sidebar.caption(f"Perfil com {len(perfil_horario)} h ({len(perfil_horario) / 24:g} dia(s)), de {np.min(perfil_horario):.1f} a {np.max(perfil_horario):.1f} °C.")
+    janelas_uso = st.sidebar.data_editor(pd.DataFrame(simulacao_diaria.JANELAS_PADRAO), num_rows="dynamic", hide_index=True).to_dict('records')
+
 st.sidebar.markdown("---") # Separator
 st.sidebar.subheader("Parâmetros da Simulação Monte Carlo")
 
@@ -284,198 +325,143 @@ limiar_convergencia = st.sidebar.number_input("Erro Padrão Aceitável do P95 (T
 
 # Número máximo de simulações (mantido como salvaguarda)
 n_simulacoes_maximo = st.sidebar.number_input("Máximo de Simulações (Salvaguarda):", min_value=1, value=5000, step=100)
-# --- FIM DA ALTERAÇÃO 2 ---
-
-st.sidebar.markdown("---") # Separator
-# Removed the checkbox for showing membership functions
-# show_membership_functions = st.sidebar.checkbox("Mostrar Funções de Pertinência Fuzzy")
 
+# Critério de parada avaliado ao fim de cada lote (os demais são acompanhados para diagnóstico)
+criterio_parada_nome = st.sidebar.selectbox("Critério de Parada:", options=list(criterios_parada.CRITERIOS_PARADA.keys()), index=0)
+criterio_parada = criterios_parada.CRITERIOS_PARADA[criterio_parada_nome]
+precisao_relativa = st.sidebar.number_input("Precisão Relativa Alvo (EP / P95, %):", min_value=0.01, value=0.5, step=0.1, format="%.2f") / 100
+# --- FIM DA ALTERAÇÃO 2 ---
 
-# Passo 2: Definindo as variáveis fuzzy
-# O universo para 'inicio_do_banho' deve ir de 0 até a duração total da simulação
-inicio_do_banho = ctrl.Antecedent(np.arange(0, duracao_simulacao + 1, 1), 'inicio_do_banho')
-temperatura_do_ar = ctrl.Antecedent(np.arange(temperatura_minima, temperatura_maxima + 0.1, 0.1), 'temperatura_do_ar')
-duracao_do_banho = ctrl.Consequent(np.arange(0, 16, 0.01), 'duracao_do_banho')
+# Método de amostragem dos horários de início e dos modelos de máquina de lavar
+# (cada lote é uma réplica independente, mantendo válido o erro padrão entre lotes)
+metodo_amostragem_nome = st.sidebar.selectbox("Amostragem dos Sorteios:", options=list(amostragem.METODOS_AMOSTRAGEM.keys()), index=0)
+metodo_amostragem = amostragem.METODOS_AMOSTRAGEM[metodo_amostragem_nome]
+if metodo_amostragem == "sobol" and (tamanho_do_lote_k & (tamanho_do_lote_k - 1)) != 0:
+    st.sidebar.caption("Dica: para Sobol, use um tamanho de lote potência de 2 (ex: 32, 64) para melhor balanceamento.")
 
-# Passo 3: Definindo funções de pertinência para as variáveis de entrada
+# Modo de cauda: quantis altos do pico por iteração (empírico e extrapolado pela GPD) com intervalos de confiança
+estimar_cauda = st.sidebar.checkbox("Estimar cauda do pico por iteração (P95, P99, P99,9)", value=False)
 
-# Calculando os limites para os conjuntos de início do banho
-# O step_tempo deve ser baseado na duração total da simulação, não apenas no intervalo
-if duracao_simulacao > 0:
-    step_tempo = duracao_simulacao / 4 # 5 conjuntos, 4 intervalos entre eles
+# Vazões médias em janelas móveis (normas de dimensionamento), acumuladas na mesma passada do Monte Carlo
+janelas_str = st.sidebar.text_input("Janelas da vazão média móvel (s, separadas por vírgula; vazio desativa):",
+                                    value=", ".join(str(janela) for janela in janelas_moveis.JANELAS_PADRAO_S))
+try:
+    janelas_s = sorted({float(janela.strip()) for janela in janelas_str.split(',') if janela.strip()})
+    if any(janela <= 0 for janela in janelas_s):
+        raise ValueError
+except ValueError:
+    st.sidebar.error("As janelas devem ser números positivos separados por vírgula (ex: 10, 60, 300).")
+    janelas_s = []
+
+# Reservatório (ver reservatorio.py): volume a reservar e reposição mínima para o nível de serviço
+parametros_reservatorio = None
+if st.sidebar.checkbox("Dimensionar reservatório (volume e reposição)", value=False):
+    parametros_reservatorio = {
+        'vazao_reposicao': st.sidebar.number_input("Vazão de reposição do reservatório (L/s):", min_value=0.0, value=0.1, step=0.01, format="%.3f"),
+        'volume': st.sidebar.number_input("Volume do reservatório (L):", min_value=0.0, value=500.0, step=50.0),
+        'nivel_servico': st.sidebar.number_input("Nível de serviço (% das iterações atendidas):", min_value=50.0, max_value=100.0, value=95.0, step=1.0),
+    }
+
+# Água quente (ver agua_quente.py): demanda pela mistura nos aparelhos e capacidade do aquecedor
+parametros_agua_quente = None
+if st.sidebar.checkbox("Demanda de água quente e aquecedor", value=False):
+    temperatura_quente = st.sidebar.number_input("Temperatura da água quente (°C):", min_value=30.0, max_value=95.0, value=60.0, step=1.0)
+    fria_acompanha_ar = st.sidebar.checkbox("Água fria acompanha a temperatura do ar", value=True,
+                                            help=f"Limitada entre {agua_quente.FAIXA_AGUA_FRIA[0]:g} e {agua_quente.FAIXA_AGUA_FRIA[1]:g} °C.")
+    temperatura_fria = None if fria_acompanha_ar else st.sidebar.number_input("Temperatura da água fria (°C):", min_value=0.0, max_value=40.0, value=20.0, step=1.0)
+    tipo_aquecedor = agua_quente.TIPOS_AQUECEDOR[st.sidebar.selectbox("Aquecedor:", options=list(agua_quente.TIPOS_AQUECEDOR.keys()))]
+    parametros_agua_quente = {
+        'temperatura_quente': temperatura_quente,
+        'temperatura_fria': temperatura_fria,
+        'aquecedor': tipo_aquecedor,
+        'volume': st.sidebar.number_input("Volume de água quente armazenado por aquecedor (L, 0 = de passagem):", min_value=0.0,
+                                          value=1000.0 if tipo_aquecedor == 'central' else 100.0, step=10.0),
+        'recuperacao': st.sidebar.number_input("Recuperação por aquecedor (L/s de água quente):", min_value=0.0,
+                                               value=0.3 if tipo_aquecedor == 'central' else 0.05, step=0.01, format="%.3f"),
+        'nivel_servico': st.sidebar.number_input("Nível de serviço da água quente (% das iterações atendidas):", min_value=50.0, max_value=100.0, value=95.0, step=1.0),
+    }
+
+# Captura opcional de perfil da execução completa (arquivo disponível para download no painel "Desempenho")
+ferramenta_perfil_nome = st.sidebar.selectbox("Capturar perfil:", options=list(instrumentacao.FERRAMENTAS_PERFIL.keys()), index=0)
+ferramenta_perfil = instrumentacao.FERRAMENTAS_PERFIL[ferramenta_perfil_nome]
+
+# Orçamento de memória: ao ser atingido, a média e os percentis passam a ser calculados em fluxo
+orcamento_memoria_mb = st.sidebar.number_input("Orçamento de Memória por Execução (MB):", min_value=16, value=1024, step=128)
+
+
+# Horizonte de cada série, grupos de séries (um por temperatura, ou o horizonte do dia inteiro) e
+# possíveis banhos de cada morador por iteração (um, ou um por janela de uso e dia)
+if modo_diario:
+    duracao_series = len(perfil_horario) * simulacao_diaria.SEGUNDOS_POR_HORA
+    grupos_series = 1
+    banhos_por_morador = len(janelas_uso) * int(np.ceil(len(perfil_horario) / 24))
+    descricao_grupos = f"{len(perfil_horario) / 24:g} dia(s)"
 else:
-    step_tempo = 1 # Prevent division by zero if duracao_simulacao is 0
+    duracao_series = duracao_simulacao
+    grupos_series = len(temperaturas)
+    banhos_por_morador = 1
+    descricao_grupos = f"{len(temperaturas)} temperatura(s)"
+
+
+def estimar_memoria_passo(passo):
+    n_pontos = motor_simulacao.pontos_da_grade(duracao_series, passo)
+    total_moradores = apartamentos_por_pavimento * quantidade_pavimentos * quantidade_moradores_por_apartamento
+    eventos_iteracao = eventos.eventos_por_iteracao(total_moradores * banhos_por_morador, n_pontos, passo)
+    return memoria.estimar_memoria_mb(n_simulacoes_maximo, n_pontos, eventos_iteracao, grupos_series, tamanho_do_lote_k,
+                                      len(janelas_s))
+
+
+def cabe_no_orcamento(estimativa):
+    # A execução só passa a fluxo se guardar todas as séries não couber
+    return min(estimativa['completo_mb'], estimativa['fluxo_mb']) <= orcamento_memoria_mb
+
+
+estimativa_memoria = estimar_memoria_passo(passo_tempo)
+# Nem em fluxo cabe no orçamento: usa o menor passo de tempo mais grosso que caiba
+if not cabe_no_orcamento(estimativa_memoria):
+    passos_que_cabem = [passo for passo in motor_simulacao.PASSOS_TEMPO
+                        if passo > passo_tempo and cabe_no_orcamento(estimar_memoria_passo(passo))]
+    passo_escolhido = passos_que_cabem[0] if passos_que_cabem else motor_simulacao.PASSOS_TEMPO[-1]
+    st.sidebar.warning(f"Mesmo em fluxo a execução excede o orçamento com passo de {passo_tempo}s; usando passo de {passo_escolhido}s.")
+    passo_tempo = passo_escolhido
+    estimativa_memoria = estimar_memoria_passo(passo_tempo)
+st.sidebar.caption(f"Memória estimada ({n_simulacoes_maximo} iterações × {duracao_series} s / passo de {passo_tempo}s × {descricao_grupos}): "
+                   f"≈ {estimativa_memoria['completo_mb']:.1f} MB guardando todas as séries; ≈ {estimativa_memoria['fluxo_mb']:.1f} MB em fluxo.")
+if estimativa_memoria['completo_mb'] > orcamento_memoria_mb:
+    st.sidebar.warning("A estimativa excede o orçamento: se a execução chegar ao limite, o P5/P95 de cada instante passará a ser estimado em fluxo (P²).")
+
+# Gravação opcional das séries de cada iteração em disco, para reanálise sem refazer o Monte Carlo
+# (cada sessão grava, lista e apaga só no seu subdiretório; o diretório é compartilhado pelo servidor)
+if 'sessao_series' not in st.session_state:
+    st.session_state['sessao_series'] = uuid.uuid4().hex
+sessao_series = st.session_state['sessao_series']
+gravar_series = st.sidebar.checkbox("Gravar séries de cada iteração em disco (reanálise)", value=False)
+if gravar_series:
+    tipo_series = armazem_series.TIPOS_SERIES[st.sidebar.selectbox("Precisão das séries gravadas:", options=list(armazem_series.TIPOS_SERIES.keys()))]
+    disco_series_mb = (n_simulacoes_maximo * motor_simulacao.pontos_da_grade(duracao_series, passo_tempo)
+                       * np.dtype(tipo_series).itemsize * grupos_series / 2**20)
+    st.sidebar.caption(f"Espaço em disco (até {n_simulacoes_maximo} iterações): ≈ {disco_series_mb:.0f} MB em {armazem_series.diretorio_sessao(sessao_series)}.")
+
+
+def gravador_series(grupo, descricao):
+    """Gravador das séries de cada iteração (armazem_series), ou contexto vazio se a gravação estiver desligada."""
+    if not gravar_series:
+        return contextlib.nullcontext()
+    return armazem_series.GravadorSeries(
+        armazem_series.novo_caminho(grupo, sessao_series), n_simulacoes_maximo, tipo_series, passo_tempo,
+        {'descricao': descricao, 'apartamentos': total_apartamentos, 'moradores': total_moradores_predio})
 
 
-inicio_do_banho['Very early'] = fuzz.trimf(inicio_do_banho.universe, [0, 0, step_tempo])
-inicio_do_banho['Early'] = fuzz.trimf(inicio_do_banho.universe, [0, step_tempo, 2 * step_tempo])
-inicio_do_banho['On time'] = fuzz.trimf(inicio_do_banho.universe, [step_tempo, 2 * step_tempo, 3 * step_tempo])
-inicio_do_banho['Delayed'] = fuzz.trimf(inicio_do_banho.universe, [2 * step_tempo, 3 * step_tempo, 4 * step_tempo])
-inicio_do_banho['Very delayed'] = fuzz.trimf(inicio_do_banho.universe, [3 * step_tempo, 4 * step_tempo, 4 * step_tempo])
+st.sidebar.markdown("---") # Separator
+# Removed the checkbox for showing membership functions
+# show_membership_functions = st.sidebar.checkbox("Mostrar Funções de Pertinência Fuzzy")
 
 
-# Calculando os limites para os conjuntos de temperatura do ar
-if temperatura_maxima > temperatura_minima:
-    step_temp = (temperatura_maxima - temperatura_minima) / 4 # 5 conjuntos, 4 intervalos entre eles
-else:
-    step_temp = 1 # Prevent division by zero
-
-temperatura_do_ar['Very cold'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima, temperatura_minima, temperatura_minima + step_temp])
-temperatura_do_ar['Cold'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima, temperatura_minima + step_temp, temperatura_minima + 2 * step_temp])
-temperatura_do_ar['Pleasant'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + step_temp, temperatura_minima + 2 * step_temp, temperatura_minima + 3 * step_temp])
-# Corrected Hot and Very Hot ranges to ensure they are within the universe and have correct triangular/trapezoidal shapes
-temperatura_do_ar['Hot'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + 2 * step_temp, temperatura_minima + 3 * step_temp, temperatura_maxima])
-temperatura_do_ar['Very hot'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + 3 * step_temp, temperatura_maxima, temperatura_maxima])
-
-
-# Passo 4: Definindo funções de pertinência para a variável de saída (Mantido como antes)
-duracao_do_banho['No shower'] = fuzz.trapmf(duracao_do_banho.universe, [0, 0, 3, 3.01])
-duracao_do_banho['Very fast'] = fuzz.trimf(duracao_do_banho.universe, [3.02, 3.02, 5])
-duracao_do_banho['Fast'] = fuzz.trimf(duracao_do_banho.universe, [3, 5, 10])
-duracao_do_banho['Normal'] = fuzz.trimf(duracao_do_banho.universe, [5, 10, 15])
-duracao_do_banho['Long'] = fuzz.trimf(duracao_do_banho.universe, [10, 15, 15])
-
-
-# Passo 5: Regras fuzzy (Mantido como antes) - sem alteração nos conjuntos de regras
-morador_1_rules = [
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very early'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very early'], duracao_do_banho['Long']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Early'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Early'], duracao_do_banho['Long']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['On time'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['On time'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['On time'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['On time'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['On time'], duracao_do_banho['Normal']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower'])
-]
-
-
-morador_2_rules = [
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very early'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very early'], duracao_do_banho['Normal']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Early'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Early'], duracao_do_banho['Long']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['On time'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['On time'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['On time'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['On time'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['On time'], duracao_do_banho['Normal']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower'])
-]
-
-morador_3_rules = [
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very early'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very early'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very early'], duracao_do_banho['Fast']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very early'], duracao_do_banho['Long']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very early'], duracao_do_banho['Long']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Early'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Early'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Early'], duracao_do_banho['Normal']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['On time'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['On time'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['On time'], duracao_do_banho['Normal']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['On time'], duracao_do_banho['Long']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['On time'], duracao_do_banho['Long']),
-
-    # --- LINHA 268 ORIGINALMENTE COM ERRO: CORRIGIDA DE 'temperatura_ar' PARA 'temperatura_do_ar' ---
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Delayed'], duracao_do_banho['Very fast']),
-
-    ctrl.Rule(temperatura_do_ar['Very cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Cold'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Pleasant'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower']),
-    ctrl.Rule(temperatura_do_ar['Very hot'] & inicio_do_banho['Very delayed'], duracao_do_banho['No shower'])
-]
-
-# Mapeia o TIPO de morador para o conjunto de regras
-rules_map = {
-    1: morador_1_rules, # Morador 1 (Pai)
-    2: morador_2_rules, # Morador 2 (Mãe)
-    3: morador_3_rules  # Morador 3+ (Filho)
-}
-
-# Cria UMA lista de simuladores (três, um para cada conjunto de regras)
-simuladores = []
-for tipo_regra in range(1, 4):
-    regras_morador_atual = rules_map[tipo_regra]
-    control_system_atual = ctrl.ControlSystem(regras_morador_atual)
-    simulador_morador_atual = ctrl.ControlSystemSimulation(control_system_atual)
-    simuladores.append(simulador_morador_atual)
-
-# Vazões dos aparelhos (L/s) e durações fixas (em segundos)
-chuveiro = 0.12
-vaso = 0.15
-lavatorio = 0.07
-pia = 0.10
-duracao_vaso = 60
-duracao_lavatorio = 30
-duracao_pia = 40
-
-# --- LÓGICA DO VASO: INÍCIO 90s ANTES DO BANHO (CORREÇÃO DE LÓGICA) ---
-# Se o vaso dura 60s e deve começar 90s antes do banho, o fim do vaso é 30s antes do banho.
-# O início do vaso é: inicio_banho - 90
-TEMPO_ANTES_DO_BANHO_PARA_INICIO_VASO = 90
-# --- FIM DA CORREÇÃO DE LÓGICA ---
-
-# --- INÍCIO DA ALTERAÇÃO MÁQUINA DE LAVAR (V2) ---
-# Vazão para enchimento da máquina de lavar (L/s) - Constante
-vazao_enchimento_mlr = 0.135 
-
-# Volumes dos modelos de máquina de lavar (L) - Três modelos
-volumes_maquina_lavar = {
-    'pequena': 174,
-    'media': 202,
-    'grande': 260
-}
-# --- FIM DA ALTERAÇÃO MÁQUINA DE LAVAR (V2) ---
+# Passos 2 a 5: variáveis, funções de pertinência e regras fuzzy (ver motor_simulacao.py)
+# O modelo (e o skfuzzy) só é montado ao executar a simulação, para que a página abra sem esperar por ele
+def construir_modelo():
+    return motor_simulacao.construir_modelo_fuzzy(duracao_simulacao, temperatura_minima, temperatura_maxima, passo_tempo,
+                                                  conjuntos_regras)
 
 
 # Cria a lista de todos os moradores do prédio com suas características e apartamento
@@ -484,73 +470,178 @@ total_moradores_predio = total_apartamentos * quantidade_moradores_por_apartamen
 
 st.write(f"Calculando moradores para {total_apartamentos} apartamentos com {quantidade_moradores_por_apartamento} moradores por apartamento...")
 
-moradores_predio = []
-
-# Creating the list of all residents, identified by apartment, type, and rule chosen by the user
-for apt_num in range(1, total_apartamentos + 1):
-    moradores_no_apartamento = []
-    for morador_num_no_apt in range(1, quantidade_moradores_por_apartamento + 1):
-        # Determine the resident type based on the user's choice
-        tipo_regra_escolhida = regras_por_morador[morador_num_no_apt - 1]
-        
-        # ALTERAÇÃO DE NOME SOLICITADA
-        if morador_num_no_apt == 1:
-            nome_morador_interno = 'Morador 1 (Pai)'
-        elif morador_num_no_apt == 2:
-            nome_morador_interno = 'Morador 2 (Mãe)'
-        else:
-            nome_morador_interno = f'Morador {morador_num_no_apt} (Filho)'
-            
-        moradores_no_apartamento.append({
-            'nome': nome_morador_interno, # Identificador no apartamento (visualização interna/relatório)
-            'tipo_regra': tipo_regra_escolhida, # 1, 2 ou 3
-            'apartamento': apt_num,
-            'usa_pia': False, # Initialize all as False for kitchen sink
-            'usa_mlr': False, # Máquina de Lavar
-            'fim_pia_simulacao': 0, # Variável para armazenar o fim da pia na simulação (necessário para a lógica da MLR)
-            'inicio_banho_sorteado': 0 # NOVO: Armazena o tempo sorteado para ordenação
-        })
-    moradores_predio.extend(moradores_no_apartamento)
-
-# Randomly select one resident per apartment to use the sink and one for the washing machine
-# Group residents by apartment for easier selection
-moradores_por_apartamento_dict = {}
-# Filtering out non-dict elements from moradores_predio which might have caused issues in the previous run
-moradores_temp_filtered = [m for m in moradores_predio if isinstance(m, dict)]
-for morador in moradores_temp_filtered:
-    if morador['apartamento'] not in moradores_por_apartamento_dict:
-        moradores_por_apartamento_dict[morador['apartamento']] = []
-    moradores_por_apartamento_dict[morador['apartamento']].append(morador)
-
-# Randomly select one resident to use the sink and one for the washing machine in each apartment
-for apt_num, lista_moradores_apt in moradores_por_apartamento_dict.items():
-    if lista_moradores_apt: # Ensures there are residents in the apartment
-        # Kitchen Sink Selection (existing logic)
-        morador_usa_pia = random.choice(lista_moradores_apt)
-        morador_usa_pia['usa_pia'] = True
-        
-        # Seleção da Máquina de Lavar
-        # Select one resident for the washing machine (it can be the same as the one who uses the sink)
-        morador_usa_mlr = random.choice(lista_moradores_apt)
-        morador_usa_mlr['usa_mlr'] = True
-
-# The final list of residents for the simulation is 'moradores_predio'
-# Use the filtered list for the rest of the simulation logic
-moradores_predio = moradores_temp_filtered
+moradores_predio = motor_simulacao.criar_moradores(total_apartamentos, quantidade_moradores_por_apartamento, regras_por_morador, np.random.default_rng())
 st.write(f"Lista criada com {len(moradores_predio)} moradores para todo o prédio.")
 
 
-# Calculate the total number of bathrooms in the building (assuming each apartment has the same quantity)
-total_banheiros_predio = total_apartamentos * quantidade_banheiros_por_apartamento
-
 # Variável para armazenar o relatório da última simulação da primeira temperatura
 relatorio_simulacao = []
 
 
+# Gráficos das séries (reduzidas à resolução da tela, ver graficos.py), guardados em cache pelo conteúdo dos resumos
+imagem_vazao_temperatura = st.cache_data(show_spinner=False, max_entries=64)(graficos.png_vazao_temperatura)
+imagem_comparacao_temperaturas = st.cache_data(show_spinner=False, max_entries=16)(graficos.png_comparacao_temperaturas)
+imagem_vazao_periodo = st.cache_data(show_spinner=False, max_entries=16)(graficos.png_vazao_periodo)
+
+
+def exibir_janelas_moveis(janelas):
+    """Tabela das vazões médias em janelas móveis (ver janelas_moveis)."""
+    if not janelas:
+        return
+    st.write("Vazão média em janelas móveis:")
+    st.table(pd.DataFrame([
+        {'Janela': f"{estatisticas['janela_efetiva_s']:g} s",
+         'Máx da Média (L/s)': f"{estatisticas['max_media']:.3f}",
+         'Máx do P95 por instante (L/s)': f"{estatisticas['max_p95']:.3f}",
+         'P95 do pico por iteração (L/s)': f"{estatisticas['p95_pico']:.3f}"}
+        for estatisticas in janelas.values()
+    ]).set_index('Janela'))
+    if any(estatisticas['p95_em_fluxo'] for estatisticas in janelas.values()):
+        st.caption("Orçamento de memória atingido: o P95 por instante da média móvel foi estimado em fluxo (P²), "
+                   "que nestas séries costuma ficar alguns por cento acima do exato (cerca de 5% na janela de 10 s); "
+                   "o pico por iteração é o maior valor da média móvel em cada iteração.")
+    else:
+        st.caption("P95 por instante exato sobre as médias móveis de cada iteração; "
+                   "o pico por iteração é o maior valor da média móvel em cada iteração.")
+
+
+def exibir_reservatorio(resultado_reservatorio):
+    """Volume necessário, reposição mínima e probabilidade de esvaziar o reservatório (ver reservatorio)."""
+    if resultado_reservatorio is None:
+        return
+    nivel = resultado_reservatorio['nivel_servico']
+    st.write("Reservatório:")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label=f"Volume necessário (P{nivel:g}) com {resultado_reservatorio['vazao_reposicao']:.3f} L/s",
+                  value=f"{resultado_reservatorio['volume_nivel_servico']:.0f} L")
+    with col2:
+        st.metric(label=f"Reposição mínima (P{nivel:g}) para {resultado_reservatorio['volume']:.0f} L",
+                  value=f"{resultado_reservatorio['reposicao_nivel_servico']:.3f} L/s")
+    with col3:
+        st.metric(label="Probabilidade de esvaziar", value=f"{100 * resultado_reservatorio['probabilidade_falta']:.1f} %")
+    st.caption(f"O reservatório começa cheio e é reabastecido a vazão constante; o volume e a reposição atendem "
+               f"{nivel:g}% das iterações simuladas.")
+
+
+def exibir_agua_quente(resultado_agua_quente):
+    """Demanda de água quente e probabilidade de faltar água quente no aquecedor (ver agua_quente)."""
+    if resultado_agua_quente is None:
+        return
+    parametros = resultado_agua_quente['parametros']
+    nivel = parametros['nivel_servico']
+    st.write("Água quente:")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Máximo da Vazão Quente P95", value=f"{resultado_agua_quente['max_p95']:.2f} L/s")
+    with col2:
+        st.metric(label="Consumo médio de água quente por iteração", value=f"{resultado_agua_quente['volume_medio']:.0f} L")
+    with col3:
+        st.metric(label="Probabilidade de faltar água quente", value=f"{100 * resultado_agua_quente['probabilidade_falta']:.1f} %")
+    if parametros['aquecedor'] == 'central':
+        central = resultado_agua_quente['central']
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric(label=f"Armazenamento necessário (P{nivel:g}) com {parametros['recuperacao']:.3f} L/s",
+                      value=f"{central['volume_nivel_servico']:.0f} L")
+        with col2:
+            st.metric(label=f"Recuperação mínima (P{nivel:g}) para {parametros['volume']:.0f} L",
+                      value=f"{central['reposicao_nivel_servico']:.3f} L/s")
+        st.caption("Aquecedor central: um reservatório de água quente para o prédio, que começa cheio e recupera a vazão informada.")
+    else:
+        individual = resultado_agua_quente['individual']
+        st.metric(label=f"Armazenamento necessário por apartamento (P{nivel:g}) com {parametros['recuperacao']:.3f} L/s",
+                  value=f"{individual['volume_nivel_servico']:.0f} L")
+        st.caption(f"Aquecedores individuais: falta água quente em algum apartamento na fração de iterações indicada; "
+                   f"em média, {100 * individual['fracao_apartamentos_falta']:.1f}% dos apartamentos ficam sem água quente por iteração.")
+
+
+def preparar_superficies(superficies, tipos_regra):
+    """Carrega as superfícies de duração dos conjuntos de regras usados; a primeira construção é exibida com progresso."""
+    faltantes = superficies.faltantes(tipos_regra)
+    if faltantes:
+        barra_superficie = st.progress(0.0, text=f"Construindo a superfície de duração do banho (regras {', '.join(map(str, faltantes))}); "
+                                                 f"ela fica guardada em disco para as próximas execuções...")
+        superficies.preparar(tipos_regra, lambda fracao: barra_superficie.progress(fracao))
+        barra_superficie.empty()
+    else:
+        superficies.preparar(tipos_regra)
+
+
+# --- MODO DE DIA INTEIRO / VÁRIOS DIAS ---
+if modo_diario:
+    if st.sidebar.button("Executar Simulação"):
+        st.info(f"Iniciando simulação de {len(perfil_horario)} h com {len(janelas_uso)} janela(s) de uso...")
+        modelo_fuzzy = construir_modelo()
+        preparar_superficies(modelo_fuzzy['superficies'], regras_por_morador)
+        progress_bar = st.progress(0)
+        perfilador = instrumentacao.iniciar_perfil(ferramenta_perfil)
+
+        def atualizar_progresso_periodo(i):
+            progress_bar.progress(min(i / n_simulacoes_maximo, 1.0))
+
+        try:
+            with gravador_series('periodo', f"Perfil de {len(perfil_horario)} h") as gravador:
+                resultados_periodo = simulacao_diaria.simular_periodo(
+                    perfil_horario, janelas_uso, moradores_predio, temperatura_minima, temperatura_maxima,
+                    quantidade_banheiros_por_apartamento, passo_tempo, n_lotes_minimo, tamanho_do_lote_k,
+                    limiar_convergencia, n_simulacoes_maximo, metodo_amostragem=metodo_amostragem,
+                    criterio_parada=criterio_parada, precisao_relativa=precisao_relativa, estimar_cauda=estimar_cauda,
+                    orcamento_memoria_mb=orcamento_memoria_mb, ao_progresso=atualizar_progresso_periodo, regras=conjuntos_regras,
+                    gravador_series=gravador, janelas_s=janelas_s, parametros_reservatorio=parametros_reservatorio,
+                    parametros_agua_quente=parametros_agua_quente, catalogo=catalogo)
+        except ValueError as erro:
+            st.error(str(erro))
+            st.stop()
+        progress_bar.progress(1.0)
+        st.success(f"Simulação concluída: {resultados_periodo['n_iteracoes']} iterações ({resultados_periodo['n_lotes']} lotes)"
+                   + (", convergência atingida." if resultados_periodo['convergencia_atingida'] else ", máximo de simulações atingido."))
+        if resultados_periodo['memoria']['em_fluxo']:
+            st.info(f"Orçamento de memória ({orcamento_memoria_mb} MB) atingido após {resultados_periodo['memoria']['iteracao_troca']} iterações: "
+                    f"o P5/P95 de cada instante foi estimado em fluxo (P²).")
+
+        st.image(imagem_vazao_periodo(resultados_periodo['tempo'], resultados_periodo['media_ts'], resultados_periodo['p5_ts'],
+                                      resultados_periodo['p95_ts'], resultados_periodo['temperatura_ts'], len(perfil_horario)),
+                 caption="Série Temporal de Vazão com perfil horário de temperatura")
+
+        instante_pico = resultados_periodo['tempo'][np.argmax(resultados_periodo['p95_ts'])]
+        dia_pico, segundo_pico = divmod(int(instante_pico), simulacao_diaria.SEGUNDOS_POR_DIA)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric(label="Máximo da Vazão Média", value=f"{resultados_periodo['max_media']:.2f} L/s")
+        with col2:
+            st.metric(label="Máximo da Vazão P95", value=f"{resultados_periodo['max_p95']:.2f} L/s")
+        with col3:
+            st.metric(label="Horário do Máx P95", value=f"Dia {dia_pico + 1}, {segundo_pico // 3600:02d}:{segundo_pico % 3600 // 60:02d}")
+
+        exibir_janelas_moveis(resultados_periodo['janelas_moveis'])
+        exibir_reservatorio(resultados_periodo['reservatorio'])
+        exibir_agua_quente(resultados_periodo['agua_quente'])
+
+        # Resultados completos em NPZ (float32 compactado), gerado só quando o botão é clicado
+        st.download_button(label="Download dos resultados (NPZ)", data=lambda: exportacao.npz_periodo(resultados_periodo),
+                           file_name="resultados_vazao_periodo.npz", mime="application/octet-stream", on_click="ignore")
+
+        with st.expander("Desempenho"):
+            cronometro = resultados_periodo['cronometro']
+            st.write(f"{cronometro.total():.2f} s no total ({resultados_periodo['n_iteracoes'] / max(cronometro.total(), 1e-9):.1f} iterações/s)")
+            st.table(pd.DataFrame(cronometro.tabela()).set_index('Fase'))
+            st.caption(f"Memória: {resultados_periodo['memoria']['pico_armazenado_mb']:.2f} MB de séries guardadas por esta execução; "
+                       f"pico de RSS do processo {resultados_periodo['memoria']['rss_pico_mb']:.0f} MB.")
+            if perfilador is not None:
+                dados_perfil, nome_arquivo_perfil, mime_perfil, resumo_perfil = instrumentacao.encerrar_perfil(ferramenta_perfil, perfilador)
+                st.download_button(label=f"Download do perfil ({ferramenta_perfil_nome})", data=dados_perfil,
+                                   file_name=nome_arquivo_perfil, mime=mime_perfil)
+                st.text(resumo_perfil)
+
 # Main loop over each temperature to be simulated - Executes only if there are valid temperatures
-if temperaturas and duracao_simulacao > 0 and total_moradores_predio > 0:
+elif temperaturas and duracao_simulacao > 0 and total_moradores_predio > 0:
     if st.sidebar.button("Executar Simulação"):
         st.info("Iniciando simulação de Monte Carlo...")
+        modelo_fuzzy = construir_modelo()
+        inicio_do_banho = modelo_fuzzy['inicio_do_banho']
+        preparar_superficies(modelo_fuzzy['superficies'], regras_por_morador)
+        perfilador = instrumentacao.iniciar_perfil(ferramenta_perfil)
         # Use st.progress to show the overall simulation progress
         progress_bar = st.progress(0)
         total_temperaturas_simular = len(temperaturas)
@@ -561,334 +652,87 @@ if temperaturas and duracao_simulacao > 0 and total_moradores_predio > 0:
 
         for temperatura_atual in temperaturas:
             st.subheader(f"Simulação para Temperatura: {temperatura_atual}°C")
-            st.info(f"Executando simulações para Temperatura: {temperatura_atual}°C")
 
-            # List to store the flow rate time series of each Monte Carlo simulation for this temperature
-            resultados_vazao_temperatura = []
-            
-            # --- VARIÁVEIS PARA A NOVA LÓGICA DE CONVERGÊNCIA (Lotes) ---
-            p95_lotes = [] # Armazena o valor máximo do P95 TS para cada lote
-            convergencia_atingida = False
-            
-            # Limpa o relatório a cada nova temperatura
-            relatorio_simulacao_atual = []
-            
-            # Inicializa as variáveis de controle do loop
-            n_lotes_concluidos = 0
+            # --- PRÉVIA ANALÍTICA (CONVOLUÇÃO VIA FFT) ---
+            # Estimativa rápida da distribuição de vazão, exibida antes do Monte Carlo e usada como conferência
+            inicio_previa = perf_counter()
+            duracoes_previa = {
+                tipo_regra: motor_convolucao.tabelar_duracao_banho(modelo_fuzzy['superficies'][tipo_regra], temperatura_atual, duracao_simulacao)
+                for tipo_regra in set(regras_por_morador)
+            }
+            previa_convolucao = motor_convolucao.prever_vazao_convolucao(
+                duracoes_previa,
+                regras_por_morador,
+                total_apartamentos,
+                motor_convolucao.inicios_com_mlr(inicio_do_banho, duracao_simulacao),
+                dict(motor_simulacao.aparelhos_convolucao, catalogo=catalogo),
+                duracao_simulacao
+            )
+            tempo_previa = perf_counter() - inicio_previa
+            st.info(f"Prévia analítica (convolução, passo de {previa_convolucao['passo']}s): Máx P95 ≈ {previa_convolucao['max_p95']:.2f} L/s, Máx Média ≈ {previa_convolucao['max_media']:.2f} L/s.")
+            # --- FIM DA PRÉVIA ANALÍTICA ---
 
+            st.info(f"Executando simulações para Temperatura: {temperatura_atual}°C")
 
-            # Monte Carlo simulation loop
-            # We use n_simulacoes_maximo as an upper limit, but the loop can stop earlier due to convergence
-            for i in range(n_simulacoes_maximo):
-                # Inicializa o relatório para esta iteração. Só será salvo se for a última.
-                relatorio_simulacao_temp = []
-                
+            def atualizar_progresso(i):
                 # Update the progress bar (approximate)
                 progress = (temp_counter / total_temperaturas_simular) + (i / n_simulacoes_maximo / total_temperaturas_simular)
                 progress_bar.progress(min(progress, 1.0)) # Ensures it doesn't exceed 100%
 
-                # Initialize the flow rate time series for this simulation (total building flow rate per second)
-                vazao_simulacao = np.zeros(duracao_simulacao)
-
-                # Initialize the occupation state of ALL BATHROOMS IN THE BUILDING.
-                banheiros_livres_em = np.zeros(total_banheiros_predio) # Stores the second when each bathroom will be free
-
-                
-                # --- Sorteia o horário e preenche o campo para ordenação ---
-                for m in moradores_predio:
-                    m['inicio_banho_sorteado'] = random.randint(0, duracao_simulacao - 1)
-                
-                # --- Ordenar os moradores pelo horário sorteado (SOLUÇÃO 1) ---
-                moradores_predio_ordenado = sorted(moradores_predio, key=lambda m: m['inicio_banho_sorteado'])
-
-
-                # --- Simulation logic for each resident and bathroom usage (coleta o relatório) ---
-                # Itera sobre a lista ORDENADA
-                for m in moradores_predio_ordenado:
-                    # O horário de início do banho é o sorteado, agora usado em ordem
-                    inicio_banho = m['inicio_banho_sorteado']
-
-                    # Determine which fuzzy simulator to use based on the 'tipo_regra' attribute set by the user's choice
-                    tipo_regra_num = m['tipo_regra']
-                    simulador_morador_atual = simuladores[tipo_regra_num - 1]
-                    
-                    # Identificação para o relatório
-                    # ALTERAÇÃO DE NOME SOLICITADA: 'nome' já está com Morador 1, Morador 2, etc.
-                    id_morador = f"{m['nome']} (Apto {m['apartamento']})"
-
-                    # Use the fuzzy simulator with the current temperature and shower start time
-                    try:
-                        # Ensure inputs are within the defined universe
-                        clipped_inicio_banho = np.clip(inicio_banho, inicio_do_banho.universe.min(), inicio_do_banho.universe.max())
-                        clipped_temperatura_atual = np.clip(temperatura_atual, temperatura_do_ar.universe.min(), temperatura_do_ar.universe.max())
-
-                        simulador_morador_atual.input['inicio_do_banho'] = clipped_inicio_banho
-                        simulador_morador_atual.input['temperatura_do_ar'] = clipped_temperatura_atual
-                        simulador_morador_atual.compute()
-                        dur_banho_minutos = simulador_morador_atual.output['duracao_do_banho']
-                        dur_banho_segundos = int(dur_banho_minutos * 60) # Shower duration in seconds
-                        fim_banho = inicio_banho + dur_banho_segundos # Fim do banho é usado para o cálculo do início da MLR
-
-                        # --- LOG: Duração do Banho e Horário Inicial ---
-                        regra_nome = regras_map_nome.get(m['tipo_regra'])
-                        relatorio_simulacao_temp.append(f"[{id_morador}] (Regra: {regra_nome}, Temp: {temperatura_atual}°C) - Horário inicial sorteado: {inicio_banho}s. Duração fuzzy: {dur_banho_minutos:.2f} min ({dur_banho_segundos}s).")
-                        
-                        
-                        # --- INÍCIO DA LÓGICA MÁQUINA DE LAVAR (V2: Escolha e Início Condicional) ---
-                        usa_mlr_na_simulacao = False
-                        inicio_mlr_clamped = 0
-                        fim_mlr_clamped = 0
-                        nome_volume_escolhido = ""
-                        duracao_enchimento_mlr = 0
-
-                        # Check if the resident is selected to use the machine in this apartment
-                        if m['usa_mlr']:
-                            # Check the fuzzy membership for 'On time' or anterior (Early, Very early)
-                            pertinencia_delayed = fuzz.interp_membership(inicio_do_banho.universe, inicio_do_banho['Delayed'].mf, clipped_inicio_banho)
-                            pertinencia_very_delayed = fuzz.interp_membership(inicio_do_banho.universe, inicio_do_banho['Very delayed'].mf, clipped_inicio_banho)
-                            
-                            # Rule: Use the machine if the shower start is NOT primarily Delayed or Very Delayed
-                            if pertinencia_delayed + pertinencia_very_delayed < 0.5:
-                                usa_mlr_na_simulacao = True
-                                
-                                # 1. Escolher o modelo da máquina aleatoriamente
-                                nome_volume_escolhido, volume_escolhido = random.choice(list(volumes_maquina_lavar.items()))
-                                
-                                # 2. Calcular o tempo de enchimento (duração da vazão)
-                                duracao_enchimento_mlr = calcular_tempo_enchimento(volume_escolhido, vazao_enchimento_mlr)
-                                
-                                # --- LOG: Máquina de Lavar Escolhida ---
-                                relatorio_simulacao_temp.append(f"[{id_morador}] **SORTEADO P/ MLR.** Volume: {nome_volume_escolhido} ({volume_escolhido}L). Duração enchimento: {duracao_enchimento_mlr:.0f}s.")
-                                
-                                # 3. Determinar o início condicional (depende do uso da pia)
-                                inicio_mlr = fim_banho + 120 # 120s após o banho (Default - corrigido depois)
-
-
-                            else:
-                                relatorio_simulacao_temp.append(f"[{id_morador}] **SORTEADO P/ MLR, mas desiste.** (Horário de banho muito atrasado).")
-                        # --- FIM DA LÓGICA MÁQUINA DE LAVAR (V2) ---
-
-
-                        # Calculate bathroom occupation intervals for toilet, shower, and sink
-                        # --- CORREÇÃO DO VASO (SOLUÇÃO 2) ---
-                        # Vaso começa 90s antes do banho.
-                        inicio_vaso = max(0, inicio_banho - TEMPO_ANTES_DO_BANHO_PARA_INICIO_VASO) 
-                        fim_vaso = inicio_vaso + duracao_vaso
-                        # --- FIM DA CORREÇÃO ---
-                        
-                        inicio_lavatorio = fim_banho + 30 # 30 segundos após o banho
-                        fim_lavatorio = inicio_lavatorio + duracao_lavatorio
-
-                        # Ocupação começa na hora que o vaso inicia e termina quando o lavatório termina
-                        intervalo_ocupacao_inicio = max(0, inicio_vaso)
-                        intervalo_ocupacao_fim = min(duracao_simulacao, fim_lavatorio)
-
-
-                        # --- INÍCIO DA LÓGICA DE FILA DE ESPERA (ALTERAÇÃO PRINCIPAL) ---
-                        apt_num = m['apartamento']
-                        primeiro_indice_banheiro_apt = (apt_num - 1) * quantidade_banheiros_por_apartamento
-                        ultimo_indice_banheiro_apt = primeiro_indice_banheiro_apt + quantidade_banheiros_por_apartamento - 1
-
-                        # 1. Encontrar o banheiro que ficará livre mais cedo dentro do apartamento
-                        # Isso garante que SEMPRE haverá um banheiro a ser usado (mesmo que com espera)
-                        banheiros_do_apt = banheiros_livres_em[primeiro_indice_banheiro_apt : ultimo_indice_banheiro_apt + 1]
-
-                        # Encontra o índice LOCAL do banheiro que estará livre mais cedo (ou agora)
-                        banheiro_usado_idx_local = np.argmin(banheiros_do_apt)
-                        # Converte para o índice GLOBAL
-                        banheiro_disponivel_indice_global = primeiro_indice_banheiro_apt + banheiro_usado_idx_local
-                        tempo_liberacao_banheiro = banheiros_livres_em[banheiro_disponivel_indice_global]
-
-
-                        # 2. Determinar o Início Real da Rotina (Espera ou Imediato)
-                        # O uso real só pode começar após o tempo de liberação do banheiro E não antes do tempo sorteado
-                        tempo_inicio_rotina_real = max(intervalo_ocupacao_inicio, tempo_liberacao_banheiro)
-                        
-                        # 3. Se houve espera, recalcular todos os tempos
-                        if tempo_inicio_rotina_real > intervalo_ocupacao_inicio:
-                            tempo_espera = tempo_inicio_rotina_real - intervalo_ocupacao_inicio
-                            
-                            # Atualiza a variável base do banho para o novo início
-                            inicio_banho = tempo_inicio_rotina_real
-                            
-                            # Recalcula as dependências com o novo início do banho
-                            inicio_vaso = max(0, inicio_banho - TEMPO_ANTES_DO_BANHO_PARA_INICIO_VASO) 
-                            fim_vaso = inicio_vaso + duracao_vaso
-                            fim_banho = inicio_banho + dur_banho_segundos
-                            inicio_lavatorio = fim_banho + 30
-                            fim_lavatorio = inicio_lavatorio + duracao_lavatorio
-                            
-                            # Atualiza os intervalos de ocupação
-                            intervalo_ocupacao_inicio = inicio_vaso
-                            intervalo_ocupacao_fim = min(duracao_simulacao, fim_lavatorio)
-                            
-                            relatorio_simulacao_temp.append(f"[{id_morador}] **AGUARDA {tempo_espera:.0f}s** (Banheiro {banheiro_usado_idx_local + 1} livre em {tempo_liberacao_banheiro:.0f}s). Novo Início: {tempo_inicio_rotina_real:.0f}s.")
-                        else:
-                            # Não houve espera, usa no tempo sorteado
-                            relatorio_simulacao_temp.append(f"[{id_morador}] **USA BANHEIRO {banheiro_usado_idx_local + 1}** (Livre em: {intervalo_ocupacao_fim:.0f}s).")
-
-                        # 4. Ocupa o banheiro com o novo tempo de liberação
-                        # (O tempo final de ocupação é o mesmo, mas o início pode ter sido atrasado)
-                        banheiros_livres_em[banheiro_disponivel_indice_global] = intervalo_ocupacao_fim
-                        # --- FIM DA LÓGICA DE FILA DE ESPERA ---
-
-
-                        # --- LÓGICA DE VAZÃO (usa as variáveis que podem ter sido ajustadas) ---
-
-                        # Vaso
-                        inicio_vaso_clamped = int(max(0, inicio_vaso)) # CORREÇÃO APLICADA: Converte para int
-                        fim_vaso_clamped = int(min(duracao_simulacao, fim_vaso)) # CORREÇÃO APLICADA: Converte para int
-                        if fim_vaso_clamped > inicio_vaso_clamped:
-                            vazao_simulacao[inicio_vaso_clamped:fim_vaso_clamped] += vaso
-                            relatorio_simulacao_temp.append(f"  - Vaso ({vaso}L/s): {inicio_vaso_clamped}s a {fim_vaso_clamped}s. Fim Vaso: {fim_vaso_clamped}s.")
-
-                        # Chuveiro
-                        inicio_banho_clamped = int(max(0, inicio_banho))
-                        fim_banho_clamped = int(min(duracao_simulacao, inicio_banho + dur_banho_segundos))
-                        if fim_banho_clamped > inicio_banho_clamped:
-                            vazao_simulacao[inicio_banho_clamped : fim_banho_clamped] += chuveiro
-                            relatorio_simulacao_temp.append(f"  - Chuveiro ({chuveiro}L/s): {inicio_banho_clamped}s a {fim_banho_clamped}s.")
-
-                        # Lavatório
-                        inicio_lavatorio_clamped = int(max(0, inicio_lavatorio))
-                        fim_lavatorio_clamped = int(min(duracao_simulacao, fim_lavatorio))
-                        if fim_lavatorio_clamped > inicio_lavatorio_clamped:
-                            vazao_simulacao[inicio_lavatorio_clamped:fim_lavatorio_clamped] += lavatorio
-                            relatorio_simulacao_temp.append(f"  - Lavatório ({lavatorio}L/s): {inicio_lavatorio_clamped}s a {fim_lavatorio_clamped}s.")
-
-
-                        # Pia de Cozinha (O início da Pia também deve ser recalculado se o banho atrasou)
-                        if m['usa_pia']:
-                            inicio_pia = fim_banho + 120 # 120s após o NOVO fim do banho
-                            fim_pia = inicio_pia + duracao_pia
-                            inicio_pia_clamped = int(max(0, inicio_pia))
-                            fim_pia_clamped = int(min(duracao_simulacao, fim_pia))
-                            if fim_pia_clamped > inicio_pia_clamped:
-                                vazao_simulacao[inicio_pia_clamped:fim_pia_clamped] += pia
-                                m['fim_pia_simulacao'] = fim_pia_clamped
-                                relatorio_simulacao_temp.append(f"  - Pia Cozinha ({pia}L/s): {inicio_pia_clamped}s a {fim_pia_clamped}s.")
-                            else:
-                                m['fim_pia_simulacao'] = 0 
-                                relatorio_simulacao_temp.append(f"  - Pia Cozinha: Não usada (tempo fora do intervalo).")
-                        else:
-                            m['fim_pia_simulacao'] = 0 
-                                
-                                
-                        # --- MLR (Ajuste Final e Vazão) ---
-                        if usa_mlr_na_simulacao:
-                            # Recalcula o início da MLR com base no NOVO fim_banho/fim_pia
-                            if m['usa_pia'] and m['fim_pia_simulacao'] > 0:
-                                inicio_mlr = m['fim_pia_simulacao'] + 30 
-                                motivo_inicio = "30s após Pia"
-                            else:
-                                inicio_mlr = fim_banho + 120 
-                                motivo_inicio = "120s após Banho"
-                                
-                            # Re-Clampa os limites
-                            inicio_mlr_clamped = int(max(0, inicio_mlr))
-                            fim_mlr_clamped = int(min(duracao_simulacao, inicio_mlr + int(duracao_enchimento_mlr)))
-
-                            # Adiciona a vazão
-                            if fim_mlr_clamped > inicio_mlr_clamped:
-                                vazao_simulacao[inicio_mlr_clamped:fim_mlr_clamped] += vazao_enchimento_mlr
-                                relatorio_simulacao_temp.append(f"[{id_morador}] **USA MLR ({nome_volume_escolhido}).** Início: {motivo_inicio}. Vazão ({vazao_enchimento_mlr}L/s): {inicio_mlr_clamped}s a {fim_mlr_clamped}s.")
-                            else:
-                                relatorio_simulacao_temp.append(f"[{id_morador}] MLR Cancelada (tempo fora do intervalo).")
-                            
-                        
-                    except ValueError as e:
-                            st.warning(f"Erro na computação fuzzy para morador {m['nome']} do apto {m['apartamento']} na temperatura {temperatura_atual}°C: {e}")
-
-
-                # Add the flow rate time series of this simulation to the results list for this temperature
-                resultados_vazao_temperatura.append(vazao_simulacao)
-
-                # --- INÍCIO DA ALTERAÇÃO 3: LÓGICA DE CONVERGÊNCIA POR ERRO PADRÃO DO P95 ---
-                # A verificação ocorre apenas se o número de simulações for um múltiplo de k
-                if (i + 1) % tamanho_do_lote_k == 0:
-                    
-                    # 1. Calcula o P95 para este LOTE (das últimas 'k' simulações)
-                    # No Batch Means, é mais robusto calcular o P95 sobre todas as simulações acumuladas (embora o erro seja calculado entre lotes).
-                    # Para simplificação e estabilidade, calculamos o P95 sobre as *amostras acumuladas* e usamos o lote para testar o Erro Padrão.
-                    
-                    # Calcula o P95 da Série Temporal (TS) usando TODAS as simulações até agora
-                    resultados_cumulativos_lote = np.array(resultados_vazao_temperatura)
-                    p95_cumulativo_ts = np.percentile(resultados_cumulativos_lote, 95, axis=0)
-                    
-                    # O valor que interessa é o MÁXIMO do P95 TS, que representa o dimensionamento.
-                    max_p95_cumulativo = np.max(p95_cumulativo_ts)
-                    
-                    # 2. Adiciona o MÁXIMO do P95 TS à lista de P95 de Lotes
-                    # Nota: Embora este P95 seja calculado a partir de todos os dados, a cada 'k' iterações,
-                    # ele representa a estimativa do P95 após aquele lote, e o DP entre esses valores é
-                    # uma métrica robusta de estabilidade.
-                    p95_lotes.append(max_p95_cumulativo)
-                    
-                    # Incrementa o contador de lotes
-                    n_lotes_concluidos += 1
-                    
-                    # 3. Teste de Parada Estatístico (apenas se M >= M_min)
-                    if n_lotes_concluidos >= n_lotes_minimo:
-                        # Converte a lista de P95 de lotes para um array para cálculo estatístico
-                        p95_lotes_array = np.array(p95_lotes)
-                        
-                        # Calcula o Desvio Padrão do P95 dos Lotes (s_Q95)
-                        s_p95 = np.std(p95_lotes_array, ddof=1) # ddof=1 para desvio padrão amostral
-                        
-                        # Calcula o Erro Padrão do P95 (EP_Q95)
-                        # M é o número de lotes concluídos
-                        erro_padrao_p95 = s_p95 / np.sqrt(n_lotes_concluidos)
-
-                        st.sidebar.markdown(f"**Status:** {i + 1} iterações, {n_lotes_concluidos} lotes.")
-                        st.sidebar.text(f"  - Último EP(P95): {erro_padrao_p95:.4f} L/s")
-                        st.sidebar.text(f"  - Tolerância: {limiar_convergencia:.4f} L/s")
-
-                        if erro_padrao_p95 < limiar_convergencia:
-                            st.success(f"Convergência atingida após {i + 1} simulações ({n_lotes_concluidos} lotes) para {temperatura_atual}°C. EP(P95) = {erro_padrao_p95:.4f} L/s.")
-                            convergencia_atingida = True
-                        
-                # CORREÇÃO DE PERFORMANCE: Salva o relatório e dá o BREAK
-                if (convergencia_atingida or (i + 1) == n_simulacoes_maximo):
-                    # Só salva se for a primeira temperatura e 1 apartamento (para evitar logs enormes)
-                    if temperatura_atual == temperaturas[0] and total_apartamentos == 1:
-                        relatorio_simulacao_atual = relatorio_simulacao_temp.copy()
-                    
-                    if convergencia_atingida:
-                        break
-                    
-                    if i + 1 == n_simulacoes_maximo and not convergencia_atingida:
-                        st.warning(f"Número máximo de simulações ({n_simulacoes_maximo}) atingido sem convergência para {temperatura_atual}°C. EP(P95) final: {erro_padrao_p95:.4f} L/s.")
-                        break
-                # --- FIM DA ALTERAÇÃO 3: LÓGICA DE CONVERGÊNCIA POR ERRO PADRÃO DO P95 ---
-
+            def exibir_status_lote(monitor_parada, n_iteracoes, convergencia_atingida):
+                if monitor_parada.erro_padrao is not None:
+                    st.sidebar.markdown(f"**Status:** {n_iteracoes} iterações, {monitor_parada.n_lotes} lotes.")
+                    st.sidebar.text(f"  - Último EP(P95): {monitor_parada.erro_padrao:.4f} L/s")
+                    st.sidebar.text(f"  - Tolerância: {limiar_convergencia:.4f} L/s")
+
+            # Monte Carlo da temperatura atual (até a convergência ou o máximo de simulações)
+            with gravador_series(exportacao.nome_grupo(temperatura_atual), f"{temperatura_atual}°C") as gravador:
+                resultados_temperatura = motor_simulacao.simular_temperatura(
+                    temperatura_atual,
+                    moradores_predio,
+                    modelo_fuzzy,
+                    duracao_simulacao,
+                    quantidade_banheiros_por_apartamento,
+                    n_lotes_minimo,
+                    tamanho_do_lote_k,
+                    limiar_convergencia,
+                    n_simulacoes_maximo,
+                    metodo_amostragem=metodo_amostragem,
+                    criterio_parada=criterio_parada,
+                    precisao_relativa=precisao_relativa,
+                    estimar_cauda=estimar_cauda,
+                    # Só gera o relatório se for a primeira temperatura e 1 apartamento (para evitar logs enormes)
+                    gerar_relatorio=(temperatura_atual == temperaturas[0] and total_apartamentos == 1),
+                    orcamento_memoria_mb=orcamento_memoria_mb,
+                    ao_progresso=atualizar_progresso,
+                    ao_concluir_lote=exibir_status_lote,
+                    gravador_series=gravador,
+                    janelas_s=janelas_s,
+                    parametros_reservatorio=parametros_reservatorio,
+                    parametros_agua_quente=parametros_agua_quente,
+                    catalogo=catalogo
+                )
+
+            for aviso in resultados_temperatura['avisos']:
+                st.warning(aviso)
+            if resultados_temperatura['convergencia_atingida']:
+                st.success(f"Convergência atingida após {resultados_temperatura['n_iteracoes']} simulações ({resultados_temperatura['n_lotes']} lotes) para {temperatura_atual}°C pelo critério '{criterio_parada_nome}'. EP(P95) = {resultados_temperatura['erro_padrao']:.4f} L/s.")
+            else:
+                erro_padrao_final = f"{resultados_temperatura['erro_padrao']:.4f} L/s" if resultados_temperatura['erro_padrao'] is not None else "não calculado (lotes insuficientes)"
+                st.warning(f"Número máximo de simulações ({n_simulacoes_maximo}) atingido sem convergência para {temperatura_atual}°C. EP(P95) final: {erro_padrao_final}.")
+
+            if resultados_temperatura['memoria']['em_fluxo']:
+                st.info(f"Orçamento de memória ({orcamento_memoria_mb} MB) atingido após {resultados_temperatura['memoria']['iteracao_troca']} iterações: "
+                        f"a média segue exata e o P5/P95 de cada instante foi estimado em fluxo (P²).")
 
             # Após todas as simulações, se for a primeira temperatura e 1 apartamento, salva o relatório final
             if temperatura_atual == temperaturas[0] and total_apartamentos == 1:
-                relatorio_simulacao = relatorio_simulacao_atual.copy()
-
-
-            # After all Monte Carlo simulations for this temperature (until convergence or maximum), calculate statistics
-            resultados_finais_ts = np.array(resultados_vazao_temperatura)
-
-            # Calculate the mean, P5, and P95 over time (for each second) using the final results
-            media_vazao_ts = np.mean(resultados_finais_ts, axis=0)
-            p95_vazao_ts = np.percentile(resultados_finais_ts, 95, axis=0)
-            p5_vazao_ts = np.percentile(resultados_finais_ts, 5, axis=0)
-
-            # Calculate general statistics (maximum mean, maximum P95) over the entire simulation
-            max_media_vazao = np.max(media_vazao_ts)
-            max_p95_vazao = np.max(p95_vazao_ts)
-
+                relatorio_simulacao = resultados_temperatura['relatorio']
 
             # Store the statistical results and time series for this temperature
-            resultados_por_temperatura[temperatura_atual] = {
-                'media_ts': media_vazao_ts, # Mean time series
-                'p5_ts': p5_vazao_ts,        # P5 time series
-                'p95_ts': p95_vazao_ts,      # P95 time series
-                'max_media': max_media_vazao, # Maximum mean over time
-                'max_p95': max_p95_vazao,    # Maximum P95 over time
-                'tempo': np.arange(duracao_simulacao) # The time x-axis
-            }
+            resultados_temperatura['previa_convolucao'] = previa_convolucao # Analytical preview (cross-check)
+            resultados_temperatura['cronometro'].adicionar('previa', tempo_previa)
+            resultados_por_temperatura[temperatura_atual] = resultados_temperatura
             temp_counter += 1 # Increment the counter for simulated temperatures
 
         # Finalize the progress bar
@@ -936,56 +780,121 @@ if temperaturas and duracao_simulacao > 0 and total_moradores_predio > 0:
         # --- Visualize results for each temperature ---
         st.markdown("---") # Separator
         st.header("Resultados da Simulação")
+        # Os gráficos usam só os resumos reduzidos; com várias temperaturas, um único gráfico sobrepõe
+        # os P95 e mostra o pico x temperatura, e o gráfico de cada temperatura só é gerado no download
+        inicio_graficos = perf_counter()
+        resumos_graficos = {temperatura_atual: graficos.resumir_temperatura(resultados)
+                            for temperatura_atual, resultados in resultados_por_temperatura.items()}
+        if len(resumos_graficos) == 1:
+            temperatura_unica, resumo_unico = next(iter(resumos_graficos.items()))
+            st.image(imagem_vazao_temperatura(resumo_unico, temperatura_unica),
+                     caption=f"Série Temporal de Vazão - Temperatura: {temperatura_unica}°C")
+        else:
+            st.image(imagem_comparacao_temperaturas(resumos_graficos),
+                     caption="P95 da vazão de todas as temperaturas e pico x temperatura")
+        tempo_graficos = perf_counter() - inicio_graficos
+        for resultados in resultados_por_temperatura.values():
+            resultados['cronometro'].adicionar('graficos', tempo_graficos / len(resultados_por_temperatura))
+        st.markdown("---")
 
         for temperatura_atual, resultados in resultados_por_temperatura.items():
             st.subheader(f"Temperatura: {temperatura_atual}°C")
-            fig, ax = plt.subplots(figsize=(12, 4))
-            ax.plot(resultados['tempo'], resultados['media_ts'], label='Média Vazão')
-            ax.plot(resultados['tempo'], resultados['p95_ts'], label='P95 Vazão', linestyle='--')
-            # ax.plot(resultados['tempo'], resultados['p5_ts'], label='P5 Vazão', linestyle='--') # P5 usually not plotted for maximum flow rate
-            ax.fill_between(resultados['tempo'], resultados['p5_ts'], resultados['p95_ts'], color='gray', alpha=0.2, label='Faixa P5–P95')
-
-            ax.set_xlabel('Tempo (s)')
-            ax.set_ylabel('Vazão (L/s)')
-            ax.legend()
-            ax.set_title(f'Série Temporal de Vazão - Temperatura: {temperatura_atual}°C')
-            ax.grid(True)
-
-            # Add max mean and max P95 as text on the plot
-            max_media_text = f"Máx Média: {resultados['max_media']:.2f} L/s"
-            max_p95_text = f"Máx P95: {resultados['max_p95']:.2f} L/s"
-            ax.text(0.01, 0.99, max_media_text, transform=ax.transAxes, fontsize=10, verticalalignment='top', bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
-            ax.text(0.01, 0.92, max_p95_text, transform=ax.transAxes, fontsize=10, verticalalignment='top', bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
-
-            plt.tight_layout()
-
-            # Save the figure to a BytesIO object
-            buf = io.BytesIO()
-            fig.savefig(buf, format="png")
-            buf.seek(0)
-
-            st.image(buf, caption=f"Série Temporal de Vazão - Temperatura: {temperatura_atual}°C")
-            plt.close(fig) # Close the figure to free up memory
 
             # Display general statistics for this temperature using st.metric or a table
             st.write("Estatísticas Gerais:")
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric(label="Máximo da Vazão Média", value=f"{resultados['max_media']:.2f} L/s")
             with col2:
                 st.metric(label="Máximo da Vazão P95", value=f"{resultados['max_p95']:.2f} L/s")
-
-            # Add download button for the image
+            with col3:
+                # Conferência: diferença entre o Monte Carlo e a prévia analítica
+                st.metric(label="Máx P95 Analítico (convolução)", value=f"{resultados['previa_convolucao']['max_p95']:.2f} L/s",
+                          delta=f"{resultados['previa_convolucao']['max_p95'] - resultados['max_p95']:.2f} L/s vs. Monte Carlo", delta_color="off")
+
+            exibir_janelas_moveis(resultados['janelas_moveis'])
+            exibir_reservatorio(resultados['reservatorio'])
+            exibir_agua_quente(resultados['agua_quente'])
+
+            # Redução de variância alcançada pelo método de amostragem escolhido
+            if resultados['fator_reducao_variancia'] is not None:
+                iteracoes_equivalentes = resultados['n_iteracoes'] * resultados['fator_reducao_variancia']
+                st.write(
+                    f"Amostragem **{metodo_amostragem_nome}**: fator de redução de variância do pico por iteração "
+                    f"= {resultados['fator_reducao_variancia']:.2f}× em relação à amostragem simples "
+                    f"({resultados['n_iteracoes']} iterações equivalem a ≈ {iteracoes_equivalentes:.0f} iterações simples)."
+                )
+
+            # Diagnóstico do critério de parada
+            diagnostico = resultados['diagnostico_parada']
+            with st.expander("Diagnóstico do critério de parada"):
+                if diagnostico['parou_por_convergencia']:
+                    st.write(f"Parada pelo critério **{criterio_parada_nome}** após {diagnostico['iteracoes_executadas']} iterações "
+                             f"({diagnostico['iteracoes_economizadas']} iterações economizadas em relação ao máximo de {n_simulacoes_maximo}).")
+                else:
+                    st.write(f"Parada pelo limite de {n_simulacoes_maximo} simulações (critério **{criterio_parada_nome}** não atingido).")
+                st.table(pd.DataFrame(diagnostico['tabela']).set_index('Critério'))
+                st.caption("Os critérios não usados são acompanhados em paralelo até a parada (o bootstrap e o P95 cumulativo só quando escolhidos); "
+                           "'não atingido' indica que não foram satisfeitos até então.")
+
+            # Tabela dos quantis altos do pico por iteração (modo de cauda)
+            if resultados['cauda_empirica'] is not None:
+                def formatar_ic(inferior, superior):
+                    if inferior is None or superior is None:
+                        return "iterações insuficientes"
+                    return f"{inferior:.3f} – {superior:.3f}"
+
+                linhas_cauda = []
+                for q, (estimativa, inferior, superior) in resultados['cauda_empirica'].items():
+                    linha = {'Quantil do pico': f"P{q:g}", 'Empírico (L/s)': f"{estimativa:.3f}", 'IC 95% empírico': formatar_ic(inferior, superior)}
+                    if resultados['cauda_gpd'] is not None:
+                        estimativa_gpd, inferior_gpd, superior_gpd = resultados['cauda_gpd'][q]
+                        linha['GPD (L/s)'] = f"{estimativa_gpd:.3f}"
+                        linha['IC 95% GPD (bootstrap)'] = formatar_ic(inferior_gpd, superior_gpd)
+                    linhas_cauda.append(linha)
+                st.write("Cauda do pico de vazão por iteração:")
+                st.table(pd.DataFrame(linhas_cauda).set_index('Quantil do pico'))
+                if resultados['cauda_gpd'] is None:
+                    st.caption(f"Ajuste da GPD indisponível: são necessários ao menos {cauda.MINIMO_EXCESSOS_GPD} picos acima do P{cauda.QUANTIL_LIMIAR_GPD * 100:.0f}.")
+
+            # Download do gráfico da temperatura: o PNG só é gerado quando o botão é clicado
             st.download_button(
                 label=f"Download Gráfico ({temperatura_atual}°C)",
-                data=buf,
+                data=lambda resumo=resumos_graficos[temperatura_atual], temperatura=temperatura_atual:
+                    imagem_vazao_temperatura(resumo, temperatura),
                 file_name=f"grafico_vazao_temp_{temperatura_atual}C.png",
-                mime="image/png"
+                mime="image/png",
+                on_click="ignore"
             )
 
 
             st.markdown("---") # Separator between temperatures
 
+        # Resultados completos de todas as temperaturas em NPZ (float32 compactado), gerado só quando o botão é clicado
+        st.download_button(label="Download dos resultados de todas as temperaturas (NPZ)",
+                           data=lambda: exportacao.npz_resultados(resultados_por_temperatura),
+                           file_name="resultados_vazao.npz", mime="application/octet-stream", on_click="ignore")
+        st.caption("Arquivo NumPy (np.load): para cada temperatura, séries média/P5/P95, máximos, iterações e "
+                   "histórico de convergência por lote, com chaves '<temperatura>C/<nome>' (ex.: '39.2C/p95_ts').")
+
+        # --- Painel de desempenho: tempo gasto em cada fase, por temperatura ---
+        with st.expander("Desempenho"):
+            for temperatura_atual, resultados in resultados_por_temperatura.items():
+                cronometro = resultados['cronometro']
+                st.write(f"**{temperatura_atual}°C** — {cronometro.total():.2f} s no total "
+                         f"({resultados['n_iteracoes'] / max(cronometro.total(), 1e-9):.1f} iterações/s)")
+                st.table(pd.DataFrame(cronometro.tabela()).set_index('Fase'))
+                uso_memoria = resultados['memoria']
+                st.caption(f"Memória: {uso_memoria['pico_armazenado_mb']:.2f} MB de séries guardadas por esta execução "
+                           f"({'estatísticas em fluxo' if uso_memoria['em_fluxo'] else 'todas as séries guardadas'}); "
+                           f"pico de RSS do processo {uso_memoria['rss_pico_mb']:.0f} MB (compartilhado entre as sessões).")
+
+            if perfilador is not None:
+                dados_perfil, nome_arquivo_perfil, mime_perfil, resumo_perfil = instrumentacao.encerrar_perfil(ferramenta_perfil, perfilador)
+                st.download_button(label=f"Download do perfil ({ferramenta_perfil_nome})", data=dados_perfil,
+                                   file_name=nome_arquivo_perfil, mime=mime_perfil)
+                st.text(resumo_perfil)
+
 else:
     if st.sidebar.button("Executar Simulação"): # Only show the button if conditions are met
         if not temperaturas:
@@ -997,3 +906,100 @@ else:
         if not (not temperaturas or duracao_simulacao <= 0 or total_moradores_predio <= 0):
               # This case should not be reached if the outer if condition is correct, but as a fallback:
               st.error("Ocorreu um erro inesperado. Verifique os parâmetros de entrada.")
+
+# --- REANÁLISE DAS SÉRIES GRAVADAS: novas estatísticas sem refazer o Monte Carlo (ver armazem_series.py) ---
+arquivos_series = armazem_series.listar(sessao_series)
+if arquivos_series:
+    st.markdown("---")
+    with st.expander("Reanálise das séries gravadas"):
+        opcoes_series = {f"{metadados['criado_em']} — {metadados.get('descricao', caminho.name)} "
+                         f"({metadados['n_iteracoes']} iterações, {metadados['tipo']})": caminho
+                         for caminho, metadados in arquivos_series}
+        caminho_series = opcoes_series[st.selectbox("Séries gravadas:", options=list(opcoes_series.keys()))]
+        quantis_reanalise_str = st.text_input("Quantis (%, separados por vírgula):", value="95, 99")
+        janela_reanalise_s = st.number_input("Janela da média móvel para os picos (s; 0 = pico instantâneo):", min_value=0, value=0, step=10)
+        coluna_calcular, coluna_apagar = st.columns(2)
+        confirmar_apagar = coluna_apagar.checkbox("Confirmo que quero apagar estas séries", key=f"confirmar_apagar_{caminho_series.name}")
+        if coluna_apagar.button("Apagar estas séries", disabled=not confirmar_apagar):
+            os.remove(caminho_series)
+            st.rerun()
+        if coluna_calcular.button("Calcular estatísticas"):
+            try:
+                quantis_reanalise = [float(q.strip()) for q in quantis_reanalise_str.split(',') if q.strip()]
+                if not quantis_reanalise or not all(0 <= q <= 100 for q in quantis_reanalise):
+                    raise ValueError
+            except ValueError:
+                st.error("Informe quantis entre 0 e 100 separados por vírgula (ex: 95, 99, 99.9).")
+            else:
+                metadados_series, dados_series = armazem_series.abrir(caminho_series)
+                with st.spinner(f"Lendo {dados_series.nbytes / 2**20:.0f} MB de séries em blocos..."):
+                    media_reanalise, quantis_por_instante = armazem_series.estatisticas_por_instante(dados_series, quantis_reanalise)
+                    picos_reanalise = armazem_series.picos_por_iteracao(
+                        dados_series, janelas_moveis.pontos_da_janela(janela_reanalise_s, metadados_series['passo_tempo']))
+                st.metric(label="Máximo da Vazão Média", value=f"{media_reanalise.max():.2f} L/s")
+                st.table(pd.DataFrame([
+                    {'Quantil': f"P{q:g}",
+                     'Máximo do quantil por instante (L/s)': f"{quantis_por_instante[q].max():.3f}",
+                     f"Quantil do pico por iteração{f' (média de {janela_reanalise_s} s)' if janela_reanalise_s else ''} (L/s)":
+                         f"{np.percentile(picos_reanalise, q):.3f}"}
+                    for q in quantis_reanalise
+                ]).set_index('Quantil'))
+                st.caption(f"{metadados_series['n_iteracoes']} iterações × {metadados_series['n_pontos']} instantes "
+                           f"(passo de {metadados_series['passo_tempo']}s), gravadas em {metadados_series['tipo']}.")
+
+
+# Análise de sensibilidade dos parâmetros dos aparelhos (ver sensibilidade.py), no motor vetorizado do modo diário
+st.markdown("---")
+with st.expander("Análise de sensibilidade dos parâmetros dos aparelhos"):
+    metodo_sensibilidade_nome = st.selectbox("Método:", options=list(sensibilidade.METODOS_SENSIBILIDADE.keys()))
+    metodo_sensibilidade = sensibilidade.METODOS_SENSIBILIDADE[metodo_sensibilidade_nome]
+    if metodo_sensibilidade == 'sobol':
+        n_amostras_sensibilidade = st.select_slider("Amostras base N (avaliações: N × (parâmetros + 2)):", options=[16, 32, 64, 128, 256, 512, 1024], value=64)
+    else:
+        n_amostras_sensibilidade = st.number_input("Trajetórias (avaliações: trajetórias × (parâmetros + 1)):", min_value=2, value=20, step=5)
+    iteracoes_sensibilidade = st.number_input("Iterações do Monte Carlo por amostra:", min_value=2, value=16, step=4)
+    faixas_editadas = st.data_editor(pd.DataFrame(
+        [{'Parâmetro': descricao, 'Mínimo': minimo, 'Máximo': maximo} for descricao, minimo, maximo in sensibilidade.PARAMETROS.values()],
+        index=list(sensibilidade.PARAMETROS.keys())), disabled=['Parâmetro'], hide_index=True)
+    st.caption("Parâmetros com mínimo igual ao máximo ficam fixos. "
+               + ("Perfil e janelas de uso do modo diário." if modo_diario else f"Janela única de {duracao_simulacao} s a {temperaturas[0]:g}°C."))
+    if st.button("Calcular sensibilidade"):
+        if modo_diario:
+            perfil_sensibilidade, janelas_sensibilidade = perfil_horario, janelas_uso
+        else:
+            perfil_sensibilidade, janelas_sensibilidade = sensibilidade.periodo_janela_unica(duracao_simulacao, temperaturas[0])
+        faixas_sensibilidade = {chave: (float(linha['Mínimo']), float(linha['Máximo'])) for chave, linha in faixas_editadas.iterrows()}
+        barra_sensibilidade = st.progress(0.0)
+        try:
+            resultado_sensibilidade = sensibilidade.analisar(
+                metodo_sensibilidade, faixas_sensibilidade, int(n_amostras_sensibilidade), perfil_sensibilidade,
+                janelas_sensibilidade, moradores_predio, temperatura_minima, temperatura_maxima,
+                quantidade_banheiros_por_apartamento, passo_tempo, int(iteracoes_sensibilidade), conjuntos_regras,
+                ao_progresso=barra_sensibilidade.progress, catalogo=catalogo)
+        except ValueError as erro:
+            st.error(str(erro))
+            st.stop()
+        indices = resultado_sensibilidade['indices']
+        descricoes = [sensibilidade.PARAMETROS[chave][0] for chave in resultado_sensibilidade['parametros']]
+        if metodo_sensibilidade == 'sobol':
+            tabela_sensibilidade = pd.DataFrame({
+                'Parâmetro': descricoes,
+                'Primeira ordem (S1)': indices['primeira_ordem'],
+                'IC 95% S1': [f"{inferior:.3f} a {superior:.3f}" for inferior, superior in indices['ic_primeira_ordem'].T],
+                'Total (ST)': indices['total'],
+                'IC 95% ST': [f"{inferior:.3f} a {superior:.3f}" for inferior, superior in indices['ic_total'].T],
+            }).sort_values('Total (ST)', ascending=False)
+        else:
+            tabela_sensibilidade = pd.DataFrame({
+                'Parâmetro': descricoes,
+                'μ* (L/s)': indices['mu_estrela'],
+                'μ (L/s)': indices['mu'],
+                'σ (L/s)': indices['sigma'],
+            }).sort_values('μ* (L/s)', ascending=False)
+        st.dataframe(tabela_sensibilidade.set_index('Parâmetro').style.format(precision=3))
+        st.caption(f"Máximo do P95 por instante em {resultado_sensibilidade['n_avaliacoes']} amostras de parâmetros × "
+                   f"{resultado_sensibilidade['iteracoes_por_amostra']} iterações (mesmos sorteios em todas), "
+                   f"em {resultado_sensibilidade['tempo_s']:.1f} s. "
+                   + ("S1: fração da variância do pico explicada só pelo parâmetro; ST: incluindo interações."
+                      if metodo_sensibilidade == 'sobol' else
+                      "μ*: variação média do pico entre os extremos da faixa do parâmetro; σ alto indica interações ou não linearidade."))
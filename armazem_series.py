@@ -0,0 +1,168 @@
+# Armazém em disco das séries de vazão de cada iteração, para reanálise sem refazer o Monte Carlo.
+#
+# O acumulador (memoria.AcumuladorVazao) descarta as séries de cada iteração depois de calcular a
+# média e o P5/P95; mudar o quantil exibido (P99, por exemplo) exigiria refazer milhares de
+# iterações. Quando pedido, cada série é também gravada, densa e em float16 ou float32, numa
+# matriz n_iteracoes x n_pontos mapeada em memória (np.memmap) no arquivo:
+#
+#   [cabeçalho: MAGICO + JSON com os metadados, completado com espaços até TAMANHO_CABECALHO bytes]
+#   [linhas da matriz, uma por iteração, na ordem em que foram simuladas]
+#
+# A gravação é incremental (uma linha por iteração; o arquivo é esparso até ser preenchido) e, ao
+# fechar, o arquivo é truncado nas iterações executadas e o cabeçalho recebe a contagem final.
+# As estatísticas da reanálise percorrem o mapa em blocos de até eventos.ELEMENTOS_POR_BLOCO
+# valores: por colunas (instantes) para os quantis, que precisam de todas as iterações de cada
+# instante, e por linhas (iterações) para os picos, instantâneos ou da média móvel numa janela.
+# O diretório é compartilhado por todas as sessões do servidor: cada sessão grava, lista e apaga
+# apenas no seu próprio subdiretório (diretorio_sessao).
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+import eventos
+import janelas_moveis
+from superficie_duracao import DIRETORIO_CACHE
+
+MAGICO = b"SERIESVAZAO1\n"
+TAMANHO_CABECALHO = 4096
+DIRETORIO_SERIES = DIRETORIO_CACHE / "series"
+
+# Opções de precisão exibidas na barra lateral -> tipo gravado
+TIPOS_SERIES = {"float16 (metade do espaço)": "float16", "float32": "float32"}
+
+
+def _escrever_cabecalho(arquivo, metadados):
+    texto = MAGICO + json.dumps(metadados, ensure_ascii=False).encode("utf-8")
+    if len(texto) >= TAMANHO_CABECALHO:
+        raise ValueError("Metadados das séries excedem o tamanho do cabeçalho.")
+    arquivo.seek(0)
+    arquivo.write(texto.ljust(TAMANHO_CABECALHO - 1) + b"\n")
+
+
+def ler_metadados(caminho):
+    """Metadados gravados no cabeçalho de um arquivo de séries."""
+    with open(caminho, "rb") as arquivo:
+        cabecalho = arquivo.read(TAMANHO_CABECALHO)
+    if not cabecalho.startswith(MAGICO):
+        raise ValueError(f"{caminho} não é um arquivo de séries de vazão.")
+    return json.loads(cabecalho[len(MAGICO):].decode("utf-8"))
+
+
+def diretorio_sessao(sessao):
+    """Subdiretório de DIRETORIO_SERIES com as séries de uma sessão ('sessao': identificador hexadecimal)."""
+    if not sessao or not all(caractere in "0123456789abcdef" for caractere in sessao):
+        raise ValueError(f"Identificador de sessão inválido: {sessao!r}.")
+    return DIRETORIO_SERIES / sessao
+
+
+def novo_caminho(grupo, sessao):
+    """Caminho de um novo arquivo de séries da sessão (ex.: grupo '39.2C' ou 'periodo')."""
+    return diretorio_sessao(sessao) / f"series_{datetime.now():%Y%m%d-%H%M%S}_{grupo}.dat"
+
+
+class GravadorSeries:
+    """
+    Grava a série densa de cada iteração numa matriz mapeada em memória.
+
+    A matriz é criada na primeira série (o número de pontos vem dela) com 'capacidade' linhas;
+    'metadados' (temperatura, parâmetros da execução...) vão para o cabeçalho.
+    """
+
+    def __init__(self, caminho, capacidade, tipo="float16", passo_tempo=1, metadados=None):
+        self.caminho = caminho
+        self.capacidade = capacidade
+        self.tipo = np.dtype(tipo)
+        self.metadados = {'tipo': self.tipo.name, 'passo_tempo': passo_tempo, 'n_iteracoes': 0,
+                          'criado_em': f"{datetime.now():%Y-%m-%d %H:%M:%S}", **(metadados or {})}
+        self.dados = None
+        self.n_iteracoes = 0
+
+    def adicionar(self, vazao):
+        if self.dados is None:
+            self._criar(vazao.n_pontos)
+        self.dados[self.n_iteracoes] = vazao.densificar()
+        self.n_iteracoes += 1
+
+    def _criar(self, n_pontos):
+        self.metadados['n_pontos'] = n_pontos
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        with open(self.caminho, "wb") as arquivo:
+            _escrever_cabecalho(arquivo, self.metadados)
+        self.dados = np.memmap(self.caminho, dtype=self.tipo, mode="r+", offset=TAMANHO_CABECALHO,
+                               shape=(self.capacidade, n_pontos))
+
+    def fechar(self):
+        """Descarrega o mapa, trunca o arquivo nas iterações gravadas e atualiza o cabeçalho."""
+        if self.dados is None:
+            return
+        n_pontos = self.dados.shape[1]
+        self.dados.flush()
+        self.dados = None
+        self.metadados['n_iteracoes'] = self.n_iteracoes
+        with open(self.caminho, "r+b") as arquivo:
+            arquivo.truncate(TAMANHO_CABECALHO + self.n_iteracoes * n_pontos * self.tipo.itemsize)
+            _escrever_cabecalho(arquivo, self.metadados)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+def abrir(caminho):
+    """(metadados, matriz n_iteracoes x n_pontos somente leitura, mapeada em memória)."""
+    metadados = ler_metadados(caminho)
+    dados = np.memmap(caminho, dtype=metadados['tipo'], mode="r", offset=TAMANHO_CABECALHO,
+                      shape=(metadados['n_iteracoes'], metadados['n_pontos']))
+    return metadados, dados
+
+
+def listar(sessao):
+    """[(caminho, metadados)] dos arquivos de séries gravados pela sessão, do mais recente ao mais antigo."""
+    diretorio = diretorio_sessao(sessao)
+    if not diretorio.is_dir():
+        return []
+    arquivos = []
+    for caminho in sorted(diretorio.glob("series_*.dat"), reverse=True):
+        try:
+            metadados = ler_metadados(caminho)
+        except (OSError, ValueError):
+            continue
+        if metadados['n_iteracoes'] > 0:
+            arquivos.append((caminho, metadados))
+    return arquivos
+
+
+def estatisticas_por_instante(dados, quantis=(5, 95)):
+    """
+    Média e quantis de cada instante sobre todas as iterações gravadas, em blocos de instantes.
+
+    Retorna (media, {quantil: série}), como eventos.estatisticas_por_instante.
+    """
+    n_iteracoes, n_pontos = dados.shape
+    media = np.empty(n_pontos)
+    series_quantis = np.empty((len(quantis), n_pontos))
+    colunas_por_bloco = max(1, eventos.ELEMENTOS_POR_BLOCO // max(n_iteracoes, 1))
+    for inicio in range(0, n_pontos, colunas_por_bloco):
+        bloco = np.asarray(dados[:, inicio:inicio + colunas_por_bloco], dtype=float)
+        media[inicio:inicio + colunas_por_bloco] = bloco.mean(axis=0)
+        series_quantis[:, inicio:inicio + colunas_por_bloco] = np.percentile(bloco, quantis, axis=0)
+    return media, {q: series_quantis[i] for i, q in enumerate(quantis)}
+
+
+def picos_por_iteracao(dados, pontos_janela=1):
+    """Pico de cada iteração gravada, da vazão ou da sua média móvel de 'pontos_janela' pontos, em blocos de iterações."""
+    n_iteracoes, n_pontos = dados.shape
+    pontos_janela = min(pontos_janela, n_pontos)
+    picos = np.empty(n_iteracoes)
+    linhas_por_bloco = max(1, eventos.ELEMENTOS_POR_BLOCO // max(n_pontos, 1))
+    for inicio in range(0, n_iteracoes, linhas_por_bloco):
+        bloco = dados[inicio:inicio + linhas_por_bloco]
+        if pontos_janela > 1:
+            bloco = janelas_moveis.medias_moveis(bloco, [pontos_janela])[pontos_janela]
+        picos[inicio:inicio + linhas_por_bloco] = bloco.max(axis=1)
+    return picos
@@ -0,0 +1,344 @@
+# Benchmark reprodutível do motor de simulação Monte Carlo.
+#
+# Mede, para prédios de 1, 40 e 400 apartamentos em janelas curta (1 h) e longa (15.300 s,
+# padrão do aplicativo): iterações por segundo, tempo por morador-iteração, pico de memória
+# (RSS) e tempo até a convergência. Cada caso roda em um processo separado para que o pico de
+# RSS seja o do próprio caso. Os resultados são gravados em JSON e comparados com uma linha de
+# base armazenada, sinalizando regressões; o tempo de cada fase do laço (sorteios, fuzzy, fila,
+# vazão, convergência, estatísticas) também é registrado e impresso. A partida do aplicativo (primeira
+# execução do script num processo novo) e as reexecuções são medidas pelo AppTest do Streamlit, junto
+# com os módulos pesados (skfuzzy, scipy, matplotlib, pandas) que já foram importados ao abrir a
+# página. O pandas é a exceção esperada: o próprio Streamlit o importa para montar as tabelas
+# editáveis da barra lateral, exibidas já na primeira execução; os módulos do motor só o importam
+# ao ler um CSV.
+# Opcionalmente roda o motor legado (antigo.py) pelo AppTest, como referência.
+#
+# Uso (a partir da raiz do repositório):
+#   python benchmarks/benchmark_motor.py                       # roda e compara com a linha de base
+#   python benchmarks/benchmark_motor.py --salvar-baseline     # regrava a linha de base
+#   python benchmarks/benchmark_motor.py --casos 1_apto_curta --legado
+#   python benchmarks/benchmark_motor.py --casos 1_apto_curta --sem-aplicativo   # só o motor
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPOSITORIO)
+
+CAMINHO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEMENTE = 12345
+
+# Parâmetros fixos do prédio e do modelo (padrões do aplicativo)
+MORADORES_POR_APARTAMENTO = 5
+BANHEIROS_POR_APARTAMENTO = 2
+REGRAS_POR_MORADOR = [1, 2, 3, 3, 3]
+TEMPERATURA_MINIMA = -1.3
+TEMPERATURA_MAXIMA = 39.2
+TEMPERATURA = 29.8
+
+# Casos: (apartamentos por pavimento, pavimentos), janela e iterações medidas.
+# 'convergencia' define um critério de parada reduzido para medir o tempo até convergir;
+# 'passo_tempo' (padrão 1 s) define a grade de tempo do caso.
+CASOS = {
+    "1_apto_curta": {"apartamentos": (1, 1), "duracao_simulacao": 3600, "n_iteracoes": 200,
+                     "convergencia": {"tamanho_do_lote_k": 10, "n_lotes_minimo": 5, "limiar_convergencia": 0.01, "n_simulacoes_maximo": 1000}},
+    "1_apto_longa": {"apartamentos": (1, 1), "duracao_simulacao": 15300, "n_iteracoes": 200,
+                     "convergencia": {"tamanho_do_lote_k": 10, "n_lotes_minimo": 5, "limiar_convergencia": 0.01, "n_simulacoes_maximo": 1000}},
+    "40_aptos_curta": {"apartamentos": (4, 10), "duracao_simulacao": 3600, "n_iteracoes": 10,
+                       "convergencia": {"tamanho_do_lote_k": 5, "n_lotes_minimo": 4, "limiar_convergencia": 0.05, "n_simulacoes_maximo": 30}},
+    "40_aptos_longa": {"apartamentos": (4, 10), "duracao_simulacao": 15300, "n_iteracoes": 10},
+    "40_aptos_longa_passo_10s": {"apartamentos": (4, 10), "duracao_simulacao": 15300, "n_iteracoes": 10, "passo_tempo": 10},
+    "400_aptos_curta": {"apartamentos": (40, 10), "duracao_simulacao": 3600, "n_iteracoes": 2},
+    "400_aptos_longa": {"apartamentos": (40, 10), "duracao_simulacao": 15300, "n_iteracoes": 2},
+}
+
+# Métricas comparadas com a linha de base: nome -> (maior é melhor?)
+METRICAS_COMPARADAS = {
+    "iteracoes_por_segundo": True,
+    "pico_rss_mb": False,
+    "tempo_ate_convergencia_s": False,
+}
+
+# Métricas da partida do aplicativo comparadas com a linha de base
+METRICAS_APLICATIVO = {
+    "tempo_partida_s": False,
+    "tempo_reexecucao_s": False,
+}
+
+# Reexecuções medidas após a partida (a mediana é reportada) e módulos cuja importação é adiada
+N_REEXECUCOES = 5
+MODULOS_PESADOS = ("skfuzzy", "scipy", "matplotlib", "pandas")
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual (MB)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB; macOS em bytes
+    return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024
+
+
+def medir_caso(nome):
+    """Roda um caso do motor atual e retorna suas métricas (executado no processo filho)."""
+    import numpy as np
+    import motor_simulacao
+
+    caso = CASOS[nome]
+    total_apartamentos = caso["apartamentos"][0] * caso["apartamentos"][1]
+    duracao_simulacao = caso["duracao_simulacao"]
+    n_iteracoes = caso["n_iteracoes"]
+
+    inicio = time.perf_counter()
+    modelo = motor_simulacao.construir_modelo_fuzzy(duracao_simulacao, TEMPERATURA_MINIMA, TEMPERATURA_MAXIMA, caso.get("passo_tempo", 1))
+    rng = np.random.default_rng(SEMENTE)
+    moradores = motor_simulacao.criar_moradores(total_apartamentos, MORADORES_POR_APARTAMENTO, REGRAS_POR_MORADOR, rng)
+    # Superfícies de duração: carregadas do cache em disco (ou construídas na primeira execução)
+    modelo['superficies'].preparar(REGRAS_POR_MORADOR)
+    tempo_preparacao = time.perf_counter() - inicio
+
+    # Vazão: um único lote com todas as iterações (o critério de parada nunca é satisfeito)
+    inicio = time.perf_counter()
+    resultado = motor_simulacao.simular_temperatura(
+        TEMPERATURA, moradores, modelo, duracao_simulacao, BANHEIROS_POR_APARTAMENTO,
+        n_lotes_minimo=2, tamanho_do_lote_k=n_iteracoes, limiar_convergencia=0.0, n_simulacoes_maximo=n_iteracoes,
+        rng=rng)
+    tempo_iteracoes = time.perf_counter() - inicio
+
+    metricas = {
+        "total_apartamentos": total_apartamentos,
+        "total_moradores": len(moradores),
+        "duracao_simulacao": duracao_simulacao,
+        "n_iteracoes": resultado["n_iteracoes"],
+        "tempo_preparacao_s": tempo_preparacao,
+        "tempo_total_s": tempo_iteracoes,
+        "iteracoes_por_segundo": resultado["n_iteracoes"] / tempo_iteracoes,
+        "tempo_por_morador_us": tempo_iteracoes / (resultado["n_iteracoes"] * len(moradores)) * 1e6,
+        "max_p95": float(resultado["max_p95"]),
+        "pico_armazenado_mb": resultado["memoria"]["pico_armazenado_mb"],
+        "tempos_fases_s": {fase: segundos for fase, segundos in resultado["cronometro"].tempos.items() if segundos > 0},
+    }
+
+    if "convergencia" in caso:
+        inicio = time.perf_counter()
+        resultado = motor_simulacao.simular_temperatura(
+            TEMPERATURA, moradores, modelo, duracao_simulacao, BANHEIROS_POR_APARTAMENTO,
+            rng=np.random.default_rng(SEMENTE), **caso["convergencia"])
+        metricas["tempo_ate_convergencia_s"] = time.perf_counter() - inicio
+        metricas["iteracoes_ate_convergencia"] = resultado["n_iteracoes"]
+        metricas["convergiu"] = bool(resultado["convergencia_atingida"])
+
+    metricas["pico_rss_mb"] = pico_rss_mb()
+    return metricas
+
+
+def medir_caso_legado(nome):
+    """Roda o mesmo caso no aplicativo legado (antigo.py) via AppTest, com número fixo de iterações."""
+    import random
+    from streamlit.testing.v1 import AppTest
+
+    caso = CASOS[nome]
+    n_iteracoes = caso["n_iteracoes"]
+    random.seed(SEMENTE)
+
+    app = AppTest.from_file(os.path.join(RAIZ_REPOSITORIO, "antigo.py"), default_timeout=3600)
+    app.run()
+    horas, minutos = divmod(4 * 60 + 45 + caso["duracao_simulacao"] // 60, 60)
+    app.sidebar.text_input[1].set_value(f"{horas:02d}:{minutos:02d}")
+    app.run()
+    valores = {
+        "Apartamentos por pavimento": caso["apartamentos"][0],
+        "Quantidade de pavimentos": caso["apartamentos"][1],
+        "Duração da simulação": caso["duracao_simulacao"],
+        "Temperatura mínima": TEMPERATURA_MINIMA,
+        "Temperatura máxima": TEMPERATURA_MAXIMA,
+        "Simulações mínimas": n_iteracoes,
+        "Máximo de simulações": n_iteracoes,
+        "Verificar convergência": n_iteracoes,
+    }
+    for campo in app.sidebar.number_input:
+        for rotulo, valor in valores.items():
+            if campo.label.startswith(rotulo):
+                campo.set_value(valor)
+    app.sidebar.text_input[2].set_value(str(TEMPERATURA))
+    app.run()
+
+    inicio = time.perf_counter()
+    app.sidebar.button[0].click()
+    app.run()
+    tempo_total = time.perf_counter() - inicio
+    if app.exception:
+        raise RuntimeError(f"Falha no motor legado: {app.exception}")
+
+    total_moradores = caso["apartamentos"][0] * caso["apartamentos"][1] * MORADORES_POR_APARTAMENTO
+    return {
+        "n_iteracoes": n_iteracoes,
+        "tempo_total_s": tempo_total,
+        # Inclui a execução do script inteiro (montagem do modelo e gráficos), não só as iterações
+        "iteracoes_por_segundo": n_iteracoes / tempo_total,
+        "tempo_por_morador_us": tempo_total / (n_iteracoes * total_moradores) * 1e6,
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+
+def medir_partida():
+    """Mede a primeira execução do aplicativo (partida a frio, no processo novo) e as reexecuções."""
+    import statistics
+    from streamlit.testing.v1 import AppTest
+
+    # O Streamlit em si já está carregado no servidor antes da primeira sessão: fica fora da medida
+    app = AppTest.from_file(os.path.join(RAIZ_REPOSITORIO, "app_streamlit_py.py"), default_timeout=600)
+    inicio = time.perf_counter()
+    app.run()
+    tempo_partida = time.perf_counter() - inicio
+    if app.exception:
+        raise RuntimeError(f"Falha ao abrir o aplicativo: {app.exception}")
+    modulos_carregados = [modulo for modulo in MODULOS_PESADOS if modulo in sys.modules]
+
+    tempos_reexecucao = []
+    for _ in range(N_REEXECUCOES):
+        inicio = time.perf_counter()
+        app.run()
+        tempos_reexecucao.append(time.perf_counter() - inicio)
+
+    return {
+        "tempo_partida_s": tempo_partida,
+        "tempo_reexecucao_s": statistics.median(tempos_reexecucao),
+        "modulos_pesados_na_partida": modulos_carregados,
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+
+def executar_em_subprocesso(nome=None, legado=False):
+    """Executa um caso (ou a partida do aplicativo, se nome for None) em um processo novo e retorna as métricas do JSON impresso."""
+    comando = [sys.executable, os.path.abspath(__file__)]
+    comando += ["--executar-caso", nome] if nome is not None else ["--executar-partida"]
+    if legado:
+        comando.append("--legado")
+    saida = subprocess.run(comando, capture_output=True, text=True, check=True, cwd=RAIZ_REPOSITORIO)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def comparar_com_baseline(resultados, baseline, tolerancia):
+    """Retorna a lista de regressões (texto) em relação à linha de base."""
+    regressoes = []
+    for nome, metricas in resultados["casos"].items():
+        referencia = baseline.get("casos", {}).get(nome)
+        if referencia is None:
+            continue
+        for metrica, maior_melhor in METRICAS_COMPARADAS.items():
+            if metrica not in metricas or metrica not in referencia or not referencia[metrica]:
+                continue
+            razao = metricas[metrica] / referencia[metrica]
+            piorou = razao < 1 - tolerancia if maior_melhor else razao > 1 + tolerancia
+            if piorou:
+                regressoes.append(f"{nome}: {metrica} = {metricas[metrica]:.4g} (linha de base {referencia[metrica]:.4g}, razão {razao:.2f})")
+
+    metricas, referencia = resultados.get("aplicativo"), baseline.get("aplicativo")
+    if metricas and referencia:
+        for metrica, maior_melhor in METRICAS_APLICATIVO.items():
+            if not referencia.get(metrica):
+                continue
+            razao = metricas[metrica] / referencia[metrica]
+            piorou = razao < 1 - tolerancia if maior_melhor else razao > 1 + tolerancia
+            if piorou:
+                regressoes.append(f"aplicativo: {metrica} = {metricas[metrica]:.4g} (linha de base {referencia[metrica]:.4g}, razão {razao:.2f})")
+    return regressoes
+
+
+def imprimir_tabela(resultados):
+    colunas = ["iteracoes_por_segundo", "tempo_por_morador_us", "pico_rss_mb", "tempo_ate_convergencia_s"]
+    print(f"{'caso':<26}" + "".join(f"{c:>28}" for c in colunas))
+    for grupo in ("casos", "legado"):
+        for nome, metricas in resultados.get(grupo, {}).items():
+            rotulo = nome if grupo == "casos" else f"{nome} (legado)"
+            valores = "".join(f"{metricas[c]:>28.4g}" if c in metricas else f"{'-':>28}" for c in colunas)
+            print(f"{rotulo:<26}{valores}")
+
+    # Distribuição do tempo entre as fases do laço (somente o motor atual)
+    from instrumentacao import FASES
+    for nome, metricas in resultados.get("casos", {}).items():
+        tempos = metricas.get("tempos_fases_s", {})
+        total = sum(tempos.values()) or 1.0
+        print(f"\n{nome}: tempo por fase")
+        for fase, segundos in tempos.items():
+            print(f"  {FASES[fase]:<40}{segundos:>10.3f} s{100 * segundos / total:>8.1f} %")
+
+    aplicativo = resultados.get("aplicativo")
+    if aplicativo:
+        print(f"\nAplicativo: partida {aplicativo['tempo_partida_s']:.3f} s, reexecução {aplicativo['tempo_reexecucao_s']:.3f} s "
+              f"(mediana de {N_REEXECUCOES}); módulos pesados na partida: {', '.join(aplicativo['modulos_pesados_na_partida']) or 'nenhum'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do motor de simulação Monte Carlo.")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS), help="Casos a executar.")
+    parser.add_argument("--legado", action="store_true", help="Também roda o motor legado (antigo.py) nos casos de até 40 apartamentos.")
+    parser.add_argument("--saida", default="benchmark_resultados.json", help="Arquivo JSON de resultados.")
+    parser.add_argument("--baseline", default=CAMINHO_BASELINE, help="Linha de base para comparação.")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como nova linha de base.")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Variação relativa tolerada antes de sinalizar regressão.")
+    parser.add_argument("--sem-aplicativo", action="store_true", help="Não mede a partida e as reexecuções do aplicativo.")
+    parser.add_argument("--executar-caso", help=argparse.SUPPRESS)
+    parser.add_argument("--executar-partida", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar_partida:
+        print(json.dumps(medir_partida()))
+        return 0
+    if args.executar_caso:
+        metricas = medir_caso_legado(args.executar_caso) if args.legado else medir_caso(args.executar_caso)
+        print(json.dumps(metricas))
+        return 0
+
+    resultados = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "maquina": {"python": platform.python_version(), "plataforma": platform.platform(), "processador": platform.processor(), "cpus": os.cpu_count()},
+        "semente": SEMENTE,
+        "casos": {},
+    }
+    for nome in args.casos:
+        print(f"Executando {nome}...", file=sys.stderr)
+        resultados["casos"][nome] = executar_em_subprocesso(nome)
+    if args.legado:
+        resultados["legado"] = {}
+        for nome in args.casos:
+            # O motor legado só tem a grade de 1 s
+            if CASOS[nome]["apartamentos"][0] * CASOS[nome]["apartamentos"][1] <= 40 and CASOS[nome].get("passo_tempo", 1) == 1:
+                print(f"Executando {nome} (legado)...", file=sys.stderr)
+                resultados["legado"][nome] = executar_em_subprocesso(nome, legado=True)
+    if not args.sem_aplicativo:
+        print("Executando a partida do aplicativo...", file=sys.stderr)
+        resultados["aplicativo"] = executar_em_subprocesso()
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+    imprimir_tabela(resultados)
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+        print(f"Linha de base gravada em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sem linha de base para comparar (use --salvar-baseline).")
+        return 0
+    with open(args.baseline, encoding="utf-8") as arquivo:
+        regressoes = comparar_com_baseline(resultados, json.load(arquivo), args.tolerancia)
+    if regressoes:
+        print("REGRESSÕES em relação à linha de base:")
+        for regressao in regressoes:
+            print(f"  - {regressao}")
+        return 1
+    print("Nenhuma regressão em relação à linha de base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# Verificação dos métodos de amostragem: os uniformes do horário de início de cada morador
+# devem ter média 0,5 (sem viés para o começo ou o fim da janela).
+#
+# Para cada método e tamanho de lote (inclusive os que não são múltiplos de N_FAIXAS_FUZZY, em que
+# a amostragem estratificada precisa distribuir as sobras entre as faixas), sorteia muitos lotes
+# independentes e compara a média de cada morador com 0,5. A tolerância é de TOLERANCIA_DESVIOS
+# desvios-padrão da média sob amostragem simples (a estratificação e os demais métodos só reduzem
+# essa variância). Um viés de uma faixa a mais em cada lote (ex.: 0,45 com k = 10) fica muito
+# acima da tolerância.
+#
+# Uso (a partir da raiz do repositório):
+#   python benchmarks/verificar_amostragem.py
+#   python benchmarks/verificar_amostragem.py --lotes 4000 --tamanhos 3 5 6 10 50
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+RAIZ_REPOSITORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPOSITORIO)
+
+SEMENTE = 12345
+TOLERANCIA_DESVIOS = 5
+
+
+def medias_inicio(metodo, tamanho_lote, n_lotes, total_moradores, rng):
+    """Média, por morador, dos uniformes do horário de início sobre 'n_lotes' lotes independentes."""
+    import amostragem
+
+    soma = np.zeros(total_moradores)
+    for _ in range(n_lotes):
+        soma += amostragem.sortear_lote(metodo, tamanho_lote, total_moradores, rng)[:, :total_moradores].sum(axis=0)
+    return soma / (n_lotes * tamanho_lote)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica a média dos horários de início sorteados por cada método.")
+    parser.add_argument("--lotes", type=int, default=2000, help="Lotes sorteados por método e tamanho.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[5, 10, 50], help="Tamanhos de lote verificados.")
+    parser.add_argument("--moradores", type=int, default=20, help="Moradores do prédio.")
+    args = parser.parse_args()
+
+    import amostragem
+
+    rng = np.random.default_rng(SEMENTE)
+    falhas = []
+    print(f"{'método':<16}{'lote':>6}{'maior |média - 0,5|':>22}{'tolerância':>12}")
+    for metodo in amostragem.METODOS_AMOSTRAGEM.values():
+        for tamanho_lote in args.tamanhos:
+            medias = medias_inicio(metodo, tamanho_lote, args.lotes, args.moradores, rng)
+            desvio = np.max(np.abs(medias - 0.5))
+            tolerancia = TOLERANCIA_DESVIOS * np.sqrt(1 / 12 / (args.lotes * tamanho_lote))
+            print(f"{metodo:<16}{tamanho_lote:>6}{desvio:>22.4f}{tolerancia:>12.4f}")
+            if desvio > tolerancia:
+                falhas.append(f"{metodo}, lote {tamanho_lote}: média de início {medias[np.argmax(np.abs(medias - 0.5))]:.4f}")
+    if falhas:
+        print("VIÉS nos horários de início:")
+        for falha in falhas:
+            print(f"  - {falha}")
+        return 1
+    print("Horários de início sem viés em todos os métodos.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
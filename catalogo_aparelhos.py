@@ -0,0 +1,260 @@
+# Catálogo dos aparelhos usados na rotina de cada banho.
+#
+# Cada linha é um aparelho: vazão, duração, instante de início em relação ao banho (deslocamento
+# a partir do início ou do fim do banho; o chuveiro acompanha o próprio banho), probabilidade de
+# uso, se ocupa o banheiro e quem o usa (todos os moradores ou um por apartamento, o morador
+# sorteado para a pia). A rotina padrão (CATALOGO_PADRAO) é a do modelo original: vaso 90 s antes
+# do banho, chuveiro, lavatório 30 s após e pia 120 s após o banho.
+# A tabela é convertida em colunas (um vetor por campo), de modo que o motor vetorizado do modo
+# diário monta os intervalos de todos os aparelhos de todos os banhos de uma vez, como matrizes
+# banhos x aparelhos; um aparelho a mais (bidê, lava-louças) é só uma coluna a mais.
+# O banheiro fica ocupado do início do primeiro ao fim do último aparelho que o ocupa.
+# A duração e o deslocamento de cada aparelho podem ser fixos ou sorteados (DISTRIBUICOES): o
+# valor da tabela é o central e a dispersão (s) é o desvio-padrão da lognormal (aplicada à
+# distância ao banho, mantendo o sinal) ou a meia largura da triangular simétrica. Os sorteios
+# são feitos de uma vez para todos os banhos e aparelhos da iteração (uniformes do gerador do
+# NumPy transformados pela inversa da distribuição) e viram colunas com uma linha por banho. A
+# inversa da normal vem de scipy.special, importado só quando há tempos sorteados (cerca de 0,3 s
+# de importação que o catálogo padrão, todo fixo, não paga).
+# A máquina de lavar não está no catálogo: ela depende do horário do banho (lógica fuzzy) e do
+# modelo sorteado, e começa após o aparelho APARELHO_ANTES_MLR (se usado) ou após o banho.
+
+import unicodedata
+
+import numpy as np
+
+# Referência do deslocamento -> código
+INICIO_BANHO, FIM_BANHO, DURANTE_BANHO = 0, 1, 2
+REFERENCIAS = {'início do banho': INICIO_BANHO, 'fim do banho': FIM_BANHO, 'banho': DURANTE_BANHO}
+
+# Quem usa o aparelho -> só o morador sorteado do apartamento (o mesmo da pia)?
+USUARIOS = {'todos os moradores': False, 'um morador por apartamento': True}
+
+# Distribuição da duração e do deslocamento -> código
+FIXA, LOGNORMAL, TRIANGULAR = 0, 1, 2
+DISTRIBUICOES = {'fixa': FIXA, 'lognormal': LOGNORMAL, 'triangular': TRIANGULAR}
+
+# Aparelho após o qual a máquina de lavar começa (quando usado)
+APARELHO_ANTES_MLR = 'pia'
+
+# Colunas numéricas que podem trazer um valor por banho (ver selecionar)
+COLUNAS_POR_BANHO = ('vazao', 'duracao', 'deslocamento', 'probabilidade')
+
+# Colunas opcionais da tabela (ausentes = duração e deslocamento fixos)
+COLUNAS_DISTRIBUICAO = ('Distribuição da duração', 'Dispersão da duração (s)', 'Distribuição do deslocamento',
+                        'Dispersão do deslocamento (s)')
+
+CATALOGO_PADRAO = [
+    {'Aparelho': 'Vaso', 'Vazão (L/s)': 0.15, 'Duração (s)': 60, 'Referência': 'início do banho', 'Deslocamento (s)': -90,
+     'Probabilidade': 1.0, 'Ocupa o banheiro': True, 'Usuário': 'todos os moradores', 'Temperatura de uso (°C)': None,
+     'Distribuição da duração': 'fixa', 'Dispersão da duração (s)': 0, 'Distribuição do deslocamento': 'fixa',
+     'Dispersão do deslocamento (s)': 0},
+    {'Aparelho': 'Chuveiro', 'Vazão (L/s)': 0.12, 'Duração (s)': 0, 'Referência': 'banho', 'Deslocamento (s)': 0,
+     'Probabilidade': 1.0, 'Ocupa o banheiro': True, 'Usuário': 'todos os moradores', 'Temperatura de uso (°C)': 40.0,
+     'Distribuição da duração': 'fixa', 'Dispersão da duração (s)': 0, 'Distribuição do deslocamento': 'fixa',
+     'Dispersão do deslocamento (s)': 0},
+    {'Aparelho': 'Lavatório', 'Vazão (L/s)': 0.07, 'Duração (s)': 30, 'Referência': 'fim do banho', 'Deslocamento (s)': 30,
+     'Probabilidade': 1.0, 'Ocupa o banheiro': True, 'Usuário': 'todos os moradores', 'Temperatura de uso (°C)': 35.0,
+     'Distribuição da duração': 'fixa', 'Dispersão da duração (s)': 0, 'Distribuição do deslocamento': 'fixa',
+     'Dispersão do deslocamento (s)': 0},
+    {'Aparelho': 'Pia', 'Vazão (L/s)': 0.10, 'Duração (s)': 40, 'Referência': 'fim do banho', 'Deslocamento (s)': 120,
+     'Probabilidade': 1.0, 'Ocupa o banheiro': False, 'Usuário': 'um morador por apartamento', 'Temperatura de uso (°C)': 40.0,
+     'Distribuição da duração': 'fixa', 'Dispersão da duração (s)': 0, 'Distribuição do deslocamento': 'fixa',
+     'Dispersão do deslocamento (s)': 0},
+]
+
+
+def chave_aparelho(nome):
+    """Chave do aparelho: o nome em minúsculas, sem acentos e com '_' no lugar dos espaços."""
+    sem_acentos = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode()
+    return '_'.join(sem_acentos.lower().split())
+
+
+def _vazio(valor):
+    return valor is None or (isinstance(valor, float) and np.isnan(valor)) or str(valor).strip() == ''
+
+
+def converter_catalogo(linhas):
+    """
+    Converte as linhas da tabela (como CATALOGO_PADRAO) nas colunas usadas pelos motores.
+
+    Linhas sem nome são ignoradas; a duração e o deslocamento são arredondados para segundos
+    inteiros (a duração da linha de referência 'banho' é a do banho e não é sorteada). Levanta
+    ValueError se a tabela for inválida.
+    """
+    convertidas = {'chaves': [], 'nomes': [], 'vazao': [], 'duracao': [], 'referencia': [], 'deslocamento': [],
+                   'probabilidade': [], 'ocupa': [], 'um_por_apartamento': [], 'temperatura_uso': [],
+                   'distribuicao_duracao': [], 'dispersao_duracao': [], 'distribuicao_deslocamento': [],
+                   'dispersao_deslocamento': []}
+    for linha in linhas:
+        if _vazio(linha.get('Aparelho')):
+            continue
+        nome = str(linha['Aparelho']).strip()
+        chave = chave_aparelho(nome)
+        if chave in convertidas['chaves'] or chave == 'mlr':
+            raise ValueError(f"Aparelho repetido ou reservado no catálogo: {nome}.")
+        referencia = str(linha['Referência']).strip().lower()
+        usuario = str(linha['Usuário']).strip().lower()
+        if referencia not in REFERENCIAS:
+            raise ValueError(f"{nome}: referência inválida (use {', '.join(REFERENCIAS)}).")
+        if usuario not in USUARIOS:
+            raise ValueError(f"{nome}: usuário inválido (use {', '.join(USUARIOS)}).")
+        distribuicoes = []
+        for coluna in ('Distribuição da duração', 'Distribuição do deslocamento'):
+            distribuicao = 'fixa' if _vazio(linha.get(coluna)) else str(linha[coluna]).strip().lower()
+            if distribuicao not in DISTRIBUICOES:
+                raise ValueError(f"{nome}: distribuição inválida (use {', '.join(DISTRIBUICOES)}).")
+            distribuicoes.append(FIXA if REFERENCIAS[referencia] == DURANTE_BANHO else DISTRIBUICOES[distribuicao])
+        try:
+            vazao = float(linha['Vazão (L/s)'])
+            duracao = 0 if REFERENCIAS[referencia] == DURANTE_BANHO else int(round(float(linha['Duração (s)'])))
+            deslocamento = 0 if REFERENCIAS[referencia] == DURANTE_BANHO else int(round(float(linha['Deslocamento (s)'])))
+            probabilidade = float(linha['Probabilidade'])
+            temperatura = linha.get('Temperatura de uso (°C)')
+            temperatura = np.nan if _vazio(temperatura) else float(temperatura)
+            dispersoes = [0.0 if _vazio(linha.get(coluna)) else float(linha[coluna])
+                          for coluna in ('Dispersão da duração (s)', 'Dispersão do deslocamento (s)')]
+        except (TypeError, ValueError):
+            raise ValueError(f"{nome}: vazão, duração, deslocamento, probabilidade, temperatura e dispersões devem ser números.")
+        if vazao <= 0 or duracao < 0 or not 0 <= probabilidade <= 1 or min(dispersoes) < 0:
+            raise ValueError(f"{nome}: a vazão deve ser positiva, a duração e as dispersões não negativas e a "
+                             "probabilidade entre 0 e 1.")
+        convertidas['chaves'].append(chave)
+        convertidas['nomes'].append(nome)
+        convertidas['vazao'].append(vazao)
+        convertidas['duracao'].append(duracao)
+        convertidas['referencia'].append(REFERENCIAS[referencia])
+        convertidas['deslocamento'].append(deslocamento)
+        convertidas['probabilidade'].append(probabilidade)
+        convertidas['ocupa'].append(bool(linha['Ocupa o banheiro']))
+        convertidas['um_por_apartamento'].append(USUARIOS[usuario])
+        convertidas['temperatura_uso'].append(temperatura)
+        convertidas['distribuicao_duracao'].append(distribuicoes[0])
+        convertidas['dispersao_duracao'].append(dispersoes[0])
+        convertidas['distribuicao_deslocamento'].append(distribuicoes[1])
+        convertidas['dispersao_deslocamento'].append(dispersoes[1])
+    if not convertidas['chaves']:
+        raise ValueError("O catálogo deve ter ao menos um aparelho.")
+    tipos = {'vazao': float, 'duracao': np.int64, 'referencia': np.int64, 'deslocamento': np.int64,
+             'probabilidade': float, 'ocupa': bool, 'um_por_apartamento': bool, 'temperatura_uso': float,
+             'distribuicao_duracao': np.int64, 'dispersao_duracao': float, 'distribuicao_deslocamento': np.int64,
+             'dispersao_deslocamento': float}
+    return {chave: np.array(valores, dtype=tipos.get(chave, object)) for chave, valores in convertidas.items()}
+
+
+def ler_catalogo_csv(arquivo):
+    """
+    Lê o catálogo de um CSV com as colunas de CATALOGO_PADRAO (as de COLUNAS_DISTRIBUICAO são
+    opcionais; aceita ';' ou ',' como separador).
+    """
+    import pandas as pd
+
+    tabela = pd.read_csv(arquivo, sep=None, engine='python')
+    faltando = [coluna for coluna in CATALOGO_PADRAO[0] if coluna not in tabela.columns and coluna not in COLUNAS_DISTRIBUICAO]
+    if faltando:
+        raise ValueError(f"Colunas ausentes no CSV do catálogo: {', '.join(faltando)}.")
+    linhas = tabela.to_dict('records')
+    for linha in linhas:
+        linha['Ocupa o banheiro'] = str(linha['Ocupa o banheiro']).strip().lower() in ('true', 'sim', '1', 'verdadeiro')
+    return linhas
+
+
+CATALOGO = converter_catalogo(CATALOGO_PADRAO)
+
+
+def temperaturas_uso(catalogo):
+    """{chave: temperatura de uso (°C)} dos aparelhos que misturam água quente."""
+    return {chave: float(temperatura) for chave, temperatura in zip(catalogo['chaves'], catalogo['temperatura_uso'])
+            if not np.isnan(temperatura)}
+
+
+def indice(catalogo, chave):
+    """Posição do aparelho 'chave' no catálogo, ou None se ele não estiver no catálogo."""
+    chaves = list(catalogo['chaves'])
+    return chaves.index(chave) if chave in chaves else None
+
+
+def selecionar(catalogo, indices):
+    """Catálogo dos banhos 'indices' quando as colunas numéricas trazem uma linha por banho."""
+    selecionado = dict(catalogo)
+    for coluna in COLUNAS_POR_BANHO:
+        if np.ndim(catalogo[coluna]) == 2:
+            selecionado[coluna] = catalogo[coluna][indices]
+    return selecionado
+
+
+def sortear_uso(catalogo, forma, rng):
+    """Uniformes (forma x aparelhos) dos sorteios de uso, ou None se todos os aparelhos são sempre usados."""
+    if np.all(catalogo['probabilidade'] >= 1):
+        return None
+    return rng.random(tuple(np.atleast_1d(forma)) + (len(catalogo['chaves']),))
+
+
+def usados(catalogo, uniformes, usa_pia):
+    """Matriz banhos x aparelhos dos aparelhos usados ('usa_pia': se o morador de cada banho é o da pia)."""
+    usa_pia = np.asarray(usa_pia, dtype=bool)[:, None]
+    usado = ~catalogo['um_por_apartamento'] | usa_pia
+    if uniformes is not None:
+        usado = usado & (uniformes < catalogo['probabilidade'])
+    return usado
+
+
+def intervalos_relativos(catalogo, duracao_banho):
+    """Início e fim (s, a partir do início do banho) de cada aparelho: matrizes banhos x aparelhos."""
+    duracao_banho = np.asarray(duracao_banho)[:, None]
+    referencia = catalogo['referencia']
+    inicio = np.where(referencia == DURANTE_BANHO, 0,
+                      np.where(referencia == FIM_BANHO, duracao_banho, 0) + catalogo['deslocamento'])
+    fim = np.where(referencia == DURANTE_BANHO, duracao_banho, inicio + catalogo['duracao'])
+    return inicio, fim
+
+
+def ocupacao(catalogo, inicio_relativo, fim_relativo, duracao_banho, usado):
+    """
+    (antes, depois): quanto o banheiro fica ocupado antes do início e depois do fim de cada banho,
+    pelos aparelhos usados que ocupam o banheiro.
+    """
+    ocupa = catalogo['ocupa'] & usado
+    antes = np.max(np.where(ocupa, -inicio_relativo, 0), axis=1, initial=0)
+    depois = np.max(np.where(ocupa, fim_relativo - np.asarray(duracao_banho)[:, None], 0), axis=1, initial=0)
+    return antes, depois
+
+
+def _inversa(distribuicao, central, dispersao, uniformes):
+    """Valores com a 'distribuicao' (código) de cada aparelho pela inversa da distribuição nos 'uniformes'."""
+    from scipy.special import ndtri
+    valores = np.asarray(central, dtype=float)
+    # Lognormal da distância ao banho com média |central| e desvio 'dispersao' (central zero fica fixo)
+    distancia = np.abs(valores)
+    sigma2 = np.log1p((dispersao / np.where(distancia > 0, distancia, 1.0)) ** 2)
+    lognormal = np.sign(valores) * np.exp(np.log(np.where(distancia > 0, distancia, 1.0)) - sigma2 / 2
+                                          + np.sqrt(sigma2) * ndtri(uniformes))
+    # Triangular simétrica em [central - dispersao, central + dispersao]
+    triangular = valores + dispersao * np.where(uniformes < 0.5, np.sqrt(2 * uniformes) - 1, 1 - np.sqrt(2 * (1 - uniformes)))
+    return np.select([distribuicao == LOGNORMAL, distribuicao == TRIANGULAR], [lognormal, triangular], valores)
+
+
+def tempos_variaveis(catalogo):
+    """Se alguma duração ou deslocamento do catálogo é sorteado."""
+    return bool(np.any(catalogo['distribuicao_duracao'] != FIXA) or np.any(catalogo['distribuicao_deslocamento'] != FIXA))
+
+
+def tempos_sorteados(catalogo, uniformes):
+    """
+    Catálogo com a duração e o deslocamento sorteados de cada banho: 'uniformes' (banhos x
+    aparelhos x 2) dão a duração e o deslocamento; durações negativas viram zero.
+    """
+    sorteado = dict(catalogo)
+    duracao = _inversa(catalogo['distribuicao_duracao'], catalogo['duracao'], catalogo['dispersao_duracao'], uniformes[..., 0])
+    deslocamento = _inversa(catalogo['distribuicao_deslocamento'], catalogo['deslocamento'], catalogo['dispersao_deslocamento'],
+                            uniformes[..., 1])
+    sorteado['duracao'] = np.maximum(np.rint(duracao), 0).astype(np.int64)
+    sorteado['deslocamento'] = np.rint(deslocamento).astype(np.int64)
+    return sorteado
+
+
+def sortear_tempos(catalogo, forma, rng):
+    """Catálogo com os tempos sorteados de uma vez para 'forma' banhos (o próprio catálogo se todos são fixos)."""
+    if not tempos_variaveis(catalogo):
+        return catalogo
+    return tempos_sorteados(catalogo, rng.random(tuple(np.atleast_1d(forma)) + (len(catalogo['chaves']), 2)))
@@ -0,0 +1,94 @@
+# Estimação da cauda superior do pico de vazão por iteração.
+#
+# O dimensionamento usa quantis altos (P95, P99, P99,9) do pico de cada iteração do Monte Carlo.
+# Dois estimadores são oferecidos:
+#   - empírico, com intervalo de confiança exato pelas estatísticas de ordem (binomial);
+#   - picos acima de um limiar ajustados por uma Pareto Generalizada (GPD), que extrapola
+#     quantis altos com poucas centenas de iterações; o intervalo vem de bootstrap.
+# Ambos supõem iterações independentes.
+
+import numpy as np
+
+# Quantis (%) reportados no modo de cauda
+QUANTIS_CAUDA = (95, 99, 99.9)
+
+# Quantil dos picos usado como limiar do ajuste da GPD e mínimo de excessos exigido
+QUANTIL_LIMIAR_GPD = 0.90
+MINIMO_EXCESSOS_GPD = 20
+
+
+def quantis_empiricos(picos, quantis=QUANTIS_CAUDA, confianca=0.95):
+    """
+    Quantis empíricos dos picos com intervalo de confiança pelas estatísticas de ordem.
+
+    Retorna {quantil: (estimativa, limite_inferior, limite_superior)}; cada limite é None
+    quando não há iterações suficientes para fechá-lo com a confiança pedida.
+    """
+    # scipy.stats é importado sob demanda (custa ~1 s na partida do aplicativo)
+    from scipy import stats
+
+    ordenados = np.sort(np.asarray(picos, dtype=float))
+    n = len(ordenados)
+    alfa = 1 - confianca
+    resultado = {}
+    for q in quantis:
+        p = q / 100
+        estimativa = float(np.quantile(ordenados, p))
+        posicao_inferior = int(stats.binom.ppf(alfa / 2, n, p)) - 1
+        posicao_superior = int(stats.binom.ppf(1 - alfa / 2, n, p))
+        inferior = float(ordenados[posicao_inferior]) if posicao_inferior >= 0 else None
+        superior = float(ordenados[posicao_superior]) if posicao_superior < n else None
+        resultado[q] = (estimativa, inferior, superior)
+    return resultado
+
+
+def _quantil_gpd(picos, quantis):
+    """Ajusta a GPD aos excessos sobre o limiar e retorna os quantis pedidos (ou None)."""
+    from scipy import stats
+
+    limiar = np.quantile(picos, QUANTIL_LIMIAR_GPD)
+    excessos = picos[picos > limiar] - limiar
+    if len(excessos) < MINIMO_EXCESSOS_GPD or np.ptp(excessos) == 0:
+        return None
+    forma, _, escala = stats.genpareto.fit(excessos, floc=0)
+    fracao_excessos = len(excessos) / len(picos)
+    estimativas = {}
+    for q in quantis:
+        probabilidade_cauda = (1 - q / 100) / fracao_excessos
+        if probabilidade_cauda >= 1:
+            # Quantil abaixo do limiar: usa o valor empírico
+            estimativas[q] = float(np.quantile(picos, q / 100))
+        else:
+            estimativas[q] = float(limiar + stats.genpareto.ppf(1 - probabilidade_cauda, forma, loc=0, scale=escala))
+    return estimativas
+
+
+def quantis_gpd(picos, quantis=QUANTIS_CAUDA, confianca=0.95, n_bootstrap=100, rng=None):
+    """
+    Quantis dos picos extrapolados pela Pareto Generalizada, com intervalo por bootstrap.
+
+    Retorna {quantil: (estimativa, limite_inferior, limite_superior)} ou None se houver
+    poucos excessos acima do limiar para o ajuste.
+    """
+    picos = np.asarray(picos, dtype=float)
+    estimativas = _quantil_gpd(picos, quantis)
+    if estimativas is None:
+        return None
+
+    rng = np.random.default_rng() if rng is None else rng
+    replicas = {q: [] for q in quantis}
+    for _ in range(n_bootstrap):
+        replica = _quantil_gpd(rng.choice(picos, size=len(picos), replace=True), quantis)
+        if replica is not None:
+            for q in quantis:
+                replicas[q].append(replica[q])
+
+    alfa = 1 - confianca
+    resultado = {}
+    for q in quantis:
+        if replicas[q]:
+            inferior, superior = np.quantile(replicas[q], [alfa / 2, 1 - alfa / 2])
+            resultado[q] = (estimativas[q], float(inferior), float(superior))
+        else:
+            resultado[q] = (estimativas[q], None, None)
+    return resultado
@@ -0,0 +1,141 @@
+# Critérios de parada do Monte Carlo, avaliados ao fim de cada lote de k iterações.
+#
+# O critério original calcula o P95 sobre TODAS as iterações acumuladas a cada lote e mede o
+# desvio padrão dessa sequência de estimativas; como elas são fortemente autocorrelacionadas,
+# o critério ora para cedo, ora tarde, e cada verificação refaz o percentil sobre todos os dados.
+#
+# Os critérios novos usam a estatística de cada lote isolado (máximo do P95 da série temporal
+# das k iterações do lote). Os lotes são independentes, e a média, a variância (Welford) e o
+# erro padrão são atualizados em O(1) por lote. O bootstrap reamostra todas as estatísticas de
+# lote a cada lote, O(n_bootstrap x n_lotes), e por isso, como o P95 cumulativo, só é avaliado
+# quando é o critério escolhido. Os demais são acompanhados em paralelo para o diagnóstico: o
+# escolhido decide a parada e os outros indicam quando teriam parado.
+
+import numpy as np
+
+# Opções exibidas na barra lateral -> identificador interno do critério
+CRITERIOS_PARADA = {
+    "Médias de lotes independentes (P95 por lote)": "medias_lotes",
+    "Bootstrap sequencial (IC 95% do P95)": "bootstrap",
+    "Precisão relativa (EP / P95)": "relativa",
+    "P95 cumulativo (critério original)": "cumulativo",
+}
+
+# Quantil normal bilateral de 95%, usado para comparar a meia-largura do IC com a tolerância
+Z_95 = 1.96
+
+
+class MonitorParada:
+    """Acompanha as estatísticas por lote e decide quando o Monte Carlo pode parar."""
+
+    def __init__(self, criterio, n_lotes_minimo, tolerancia, precisao_relativa, n_bootstrap=200, rng=None):
+        self.criterio = criterio
+        self.n_lotes_minimo = n_lotes_minimo
+        self.tolerancia = tolerancia
+        self.precisao_relativa = precisao_relativa
+        self.n_bootstrap = n_bootstrap
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        # Acumuladores de Welford das estatísticas por lote
+        self.n_lotes = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.estatisticas_lotes = []
+
+        # Histórico por lote (exportação): iterações acumuladas e erro padrão após cada lote
+        self.iteracoes_lotes = []
+        self.erros_padrao = []
+
+        # Sequência de estimativas cumulativas (somente para o critério original)
+        self.estimativas_cumulativas = []
+
+        # Iteração em que cada critério foi satisfeito pela primeira vez (diagnóstico)
+        self.iteracao_satisfeito = {c: None for c in CRITERIOS_PARADA.values()}
+        self.erro_padrao = None
+        self.intervalo_bootstrap = None
+
+    def registrar_lote(self, estatistica_lote, n_iteracoes, estimativa_cumulativa=None):
+        """Registra a estatística de um lote concluído; retorna True se o critério escolhido foi atingido."""
+        self.n_lotes += 1
+        delta = estatistica_lote - self.media
+        self.media += delta / self.n_lotes
+        self.m2 += delta * (estatistica_lote - self.media)
+        self.estatisticas_lotes.append(estatistica_lote)
+        if estimativa_cumulativa is not None:
+            self.estimativas_cumulativas.append(estimativa_cumulativa)
+
+        self.iteracoes_lotes.append(n_iteracoes)
+
+        if self.n_lotes < max(self.n_lotes_minimo, 2):
+            self.erros_padrao.append(np.nan)
+            return False
+
+        # Erro padrão da média dos lotes (independentes)
+        self.erro_padrao = np.sqrt(self.m2 / (self.n_lotes - 1) / self.n_lotes)
+        satisfeitos = {
+            'medias_lotes': self.erro_padrao < self.tolerancia,
+            'relativa': self.media > 0 and self.erro_padrao / self.media < self.precisao_relativa,
+        }
+        if self.criterio == 'bootstrap':
+            satisfeitos['bootstrap'] = self._meia_largura_bootstrap() < Z_95 * self.tolerancia
+        if self.estimativas_cumulativas:
+            erro_cumulativo = np.std(self.estimativas_cumulativas, ddof=1) / np.sqrt(len(self.estimativas_cumulativas))
+            satisfeitos['cumulativo'] = erro_cumulativo < self.tolerancia
+            if self.criterio == 'cumulativo':
+                self.erro_padrao = erro_cumulativo
+
+        self.erros_padrao.append(self.erro_padrao)
+
+        for criterio, satisfeito in satisfeitos.items():
+            if satisfeito and self.iteracao_satisfeito[criterio] is None:
+                self.iteracao_satisfeito[criterio] = n_iteracoes
+        return bool(satisfeitos.get(self.criterio, False))
+
+    def _meia_largura_bootstrap(self):
+        """Meia-largura do IC 95% (percentil) da média das estatísticas por lote."""
+        estatisticas = np.asarray(self.estatisticas_lotes)
+        indices = self.rng.integers(0, len(estatisticas), size=(self.n_bootstrap, len(estatisticas)))
+        inferior, superior = np.quantile(estatisticas[indices].mean(axis=1), [0.025, 0.975])
+        self.intervalo_bootstrap = (float(inferior), float(superior))
+        return (superior - inferior) / 2
+
+    def estimativa(self):
+        """Estimativa atual do máximo do P95 segundo o critério escolhido."""
+        if self.criterio == 'cumulativo' and self.estimativas_cumulativas:
+            return self.estimativas_cumulativas[-1]
+        return self.media
+
+    def historico(self):
+        """Histórico da convergência, um valor por lote (NaN onde o erro padrão ainda não era calculado)."""
+        estatisticas = np.asarray(self.estatisticas_lotes, dtype=float)
+        historico = {
+            'iteracoes': np.asarray(self.iteracoes_lotes, dtype=np.int64),
+            'estatistica_lote': estatisticas,
+            'media_lotes': np.cumsum(estatisticas) / np.arange(1, len(estatisticas) + 1),
+            'erro_padrao': np.asarray(self.erros_padrao, dtype=float),
+        }
+        if self.estimativas_cumulativas:
+            historico['estimativa_cumulativa'] = np.asarray(self.estimativas_cumulativas, dtype=float)
+        return historico
+
+    def diagnostico(self, n_iteracoes_executadas, n_simulacoes_maximo):
+        """Resumo de qual critério parou a execução e quantas iterações cada um economizaria."""
+        linhas = []
+        for nome, criterio in CRITERIOS_PARADA.items():
+            if criterio == 'cumulativo' and not self.estimativas_cumulativas:
+                continue
+            if criterio == 'bootstrap' and self.criterio != 'bootstrap':
+                continue
+            iteracao = self.iteracao_satisfeito[criterio]
+            linhas.append({
+                'Critério': nome + (" (usado)" if criterio == self.criterio else ""),
+                'Satisfeito na iteração': str(iteracao) if iteracao is not None else "não atingido",
+                'Iterações economizadas': n_simulacoes_maximo - iteracao if iteracao is not None else 0,
+            })
+        return {
+            'criterio': self.criterio,
+            'parou_por_convergencia': self.iteracao_satisfeito[self.criterio] is not None,
+            'iteracoes_executadas': n_iteracoes_executadas,
+            'iteracoes_economizadas': n_simulacoes_maximo - n_iteracoes_executadas,
+            'tabela': linhas,
+        }
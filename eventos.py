@@ -0,0 +1,122 @@
+# Representação esparsa das séries de vazão por eventos (pontos de mudança).
+#
+# Cada morador abre no máximo cinco aparelhos por iteração, e a vazão do prédio só muda no início
+# e no fim desses intervalos. Em vez de um vetor denso com um valor por instante (quase todo zero
+# no começo e no fim da janela), cada iteração guarda os instantes de mudança ordenados e a vazão
+# vigente a partir de cada um. Pico, média e percentis por instante são calculados por varredura
+# sobre a união dos pontos de mudança; o vetor denso só é montado para gráficos e para o P² em
+# fluxo. A memória passa a crescer com o número de eventos, e não com a duração da simulação.
+
+import numpy as np
+
+# Casas decimais mantidas nas vazões acumuladas (remove resíduos de ponto flutuante de +v - v)
+CASAS_DECIMAIS_VAZAO = 10
+
+# Limite de elementos (iterações x segmentos) avaliados por bloco na varredura das estatísticas
+ELEMENTOS_POR_BLOCO = 500_000
+
+# Pontos de mudança por morador e iteração (início e fim de até cinco aparelhos)
+EVENTOS_POR_MORADOR = 10
+
+# Bytes por ponto de mudança (instante int32 + vazão float64)
+BYTES_POR_EVENTO = 12
+
+
+def eventos_por_iteracao(total_moradores, n_pontos, passo_tempo):
+    """Estimativa (pior caso) de pontos de mudança guardados por iteração."""
+    # Com passo maior que 1 s, cada intervalo vira até três trechos (duas bordas fracionárias)
+    pecas = 1 if passo_tempo == 1 else 3
+    return min(n_pontos, EVENTOS_POR_MORADOR * pecas * total_moradores) + 1
+
+
+class SerieEsparsa:
+    """Série de vazão constante por trechos: 'vazoes[j]' vale de 'tempos[j]' até o próximo ponto de mudança."""
+
+    def __init__(self, tempos, vazoes, n_pontos):
+        self.tempos = tempos
+        self.vazoes = vazoes
+        self.n_pontos = n_pontos
+
+    @classmethod
+    def de_intervalos(cls, inicios, fins, vazoes, n_pontos, passo_tempo=1):
+        """
+        Monta a série a partir dos intervalos [inicio, fim) em segundos em que cada aparelho fica aberto.
+
+        Na grade de 'passo_tempo', os intervalos da grade parcialmente ocupados recebem a vazão
+        média (vazão x fração ocupada), de modo que o volume total é preservado exatamente.
+        """
+        inicios = np.asarray(inicios, dtype=np.int64)
+        fins = np.asarray(fins, dtype=np.int64)
+        vazoes = np.asarray(vazoes, dtype=float)
+        if passo_tempo > 1:
+            inicios, fins, vazoes = _trechos_na_grade(inicios, fins, vazoes, passo_tempo)
+
+        tempos = np.concatenate(([0], inicios, fins))
+        variacoes = np.concatenate(([0.0], vazoes, -vazoes))
+        ordem = np.argsort(tempos, kind='stable')
+        tempos, variacoes = tempos[ordem], variacoes[ordem]
+        tempos_unicos, primeiros = np.unique(tempos, return_index=True)
+        vazoes_vigentes = np.round(np.cumsum(np.add.reduceat(variacoes, primeiros)), CASAS_DECIMAIS_VAZAO)
+        dentro = tempos_unicos < n_pontos
+        return cls(tempos_unicos[dentro].astype(np.int32), vazoes_vigentes[dentro], n_pontos)
+
+    @property
+    def nbytes(self):
+        return self.tempos.nbytes + self.vazoes.nbytes
+
+    def pico(self):
+        return float(self.vazoes.max())
+
+    def densificar(self):
+        """Vetor denso com a vazão em cada instante (para gráficos e estatísticas em fluxo)."""
+        duracoes = np.diff(np.append(self.tempos, self.n_pontos))
+        return np.repeat(self.vazoes, duracoes)
+
+
+def _trechos_na_grade(inicios, fins, vazoes, passo_tempo):
+    """Divide cada intervalo em segundos em trechos da grade: bordas fracionárias e miolo completo."""
+    primeiro = inicios // passo_tempo
+    ultimo = (fins - 1) // passo_tempo
+    mesmo = primeiro == ultimo
+
+    # Intervalo contido em um único passo da grade
+    trechos = [(primeiro[mesmo], primeiro[mesmo] + 1, vazoes[mesmo] * (fins - inicios)[mesmo] / passo_tempo)]
+    # Bordas inicial e final e miolo dos demais
+    p, u, v = primeiro[~mesmo], ultimo[~mesmo], vazoes[~mesmo]
+    a, b = inicios[~mesmo], fins[~mesmo]
+    trechos.append((p, p + 1, v * ((p + 1) * passo_tempo - a) / passo_tempo))
+    trechos.append((u, u + 1, v * (b - u * passo_tempo) / passo_tempo))
+    miolo = u > p + 1
+    trechos.append((p[miolo] + 1, u[miolo], v[miolo]))
+    return tuple(np.concatenate(partes) for partes in zip(*trechos))
+
+
+def estatisticas_por_instante(series, n_pontos, quantis=(5, 95)):
+    """
+    Média e percentis, em cada instante, de uma lista de SerieEsparsa, por varredura dos pontos de mudança.
+
+    Entre dois pontos de mudança consecutivos (de qualquer iteração) todas as séries são
+    constantes, então as estatísticas são calculadas uma vez por trecho e depois expandidas.
+    Os trechos são processados em blocos para limitar a memória. Retorna (media, {quantil: série}).
+    """
+    n_series = len(series)
+    # Chave global (iteração, instante) ordenada: uma única busca localiza o trecho de cada série
+    deslocamento = n_pontos + 1
+    chaves = np.concatenate([i * deslocamento + serie.tempos.astype(np.int64) for i, serie in enumerate(series)])
+    vazoes = np.concatenate([serie.vazoes for serie in series])
+
+    inicios_trechos = np.unique(np.concatenate([serie.tempos for serie in series]))
+    media_trechos = np.empty(len(inicios_trechos))
+    quantis_trechos = np.empty((len(quantis), len(inicios_trechos)))
+    base = (np.arange(n_series, dtype=np.int64) * deslocamento)[:, None]
+    tamanho_bloco = max(1, ELEMENTOS_POR_BLOCO // n_series)
+    for inicio in range(0, len(inicios_trechos), tamanho_bloco):
+        bloco = slice(inicio, inicio + tamanho_bloco)
+        indices = np.searchsorted(chaves, base + inicios_trechos[bloco][None, :], side='right') - 1
+        valores = vazoes[indices]
+        media_trechos[bloco] = valores.mean(axis=0)
+        quantis_trechos[:, bloco] = np.percentile(valores, quantis, axis=0)
+
+    duracoes = np.diff(np.append(inicios_trechos, n_pontos))
+    media = np.repeat(media_trechos, duracoes)
+    return media, {q: np.repeat(quantis_trechos[i], duracoes) for i, q in enumerate(quantis)}
@@ -0,0 +1,96 @@
+# Exportação dos resultados completos em NPZ compactado (float32), para pós-processamento.
+#
+# Cada grupo de resultados (uma temperatura, ou o horizonte do modo diário) vira um conjunto de
+# arrays com o prefixo do grupo: séries média, P5 e P95 (e a temperatura em cada instante no modo
+# diário), máximos, contagens de iterações e lotes, o histórico de convergência por lote e as
+# estatísticas das vazões médias em janelas móveis, do reservatório e da água quente. As séries vão em float32
+# (metade do float64, precisão bem abaixo da do Monte Carlo); o eixo de tempo fica em float64.
+# O arquivo é escrito diretamente no zip, array por array, sem montar texto CSV: um dia no passo
+# de 1 s ocupa alguns MB, e o aplicativo só o gera quando o botão de download é clicado.
+# Leitura: np.load(arquivo)['39.2C/p95_ts'], ou ler_npz para reconstruir os grupos.
+
+import io
+import zipfile
+
+import numpy as np
+from numpy.lib import format as formato_npy
+
+SERIES_EXPORTADOS = ('media_ts', 'p5_ts', 'p95_ts', 'temperatura_ts')
+ESCALARES_EXPORTADOS = ('max_media', 'max_p95', 'passo_tempo', 'n_iteracoes', 'n_lotes', 'convergencia_atingida', 'erro_padrao')
+
+
+def nome_grupo(temperatura):
+    """Prefixo dos arrays de uma temperatura no arquivo (ex.: '39.2C')."""
+    return f"{temperatura:g}C"
+
+
+def _arrays_grupo(resultados):
+    """Arrays exportados de um dicionário de resultados (chave relativa ao grupo -> array)."""
+    yield 'tempo', np.asarray(resultados['tempo'], dtype=np.float64)
+    for serie in SERIES_EXPORTADOS:
+        if serie in resultados:
+            yield serie, np.asarray(resultados[serie], dtype=np.float32)
+    for escalar in ESCALARES_EXPORTADOS:
+        valor = resultados.get(escalar)
+        yield escalar, np.asarray(np.nan if valor is None else valor)
+    for chave, historico in resultados.get('historico_convergencia', {}).items():
+        yield f'convergencia/{chave}', historico
+    for chave, valor in (resultados.get('reservatorio') or {}).items():
+        yield f'reservatorio/{chave}', np.asarray(valor)
+    quente = resultados.get('agua_quente')
+    if quente is not None:
+        for serie in SERIES_EXPORTADOS:
+            if serie in quente:
+                yield f'agua_quente/{serie}', np.asarray(quente[serie], dtype=np.float32)
+        for chave in ('max_media', 'max_p95', 'volumes_iteracao', 'volume_medio', 'probabilidade_falta'):
+            yield f'agua_quente/{chave}', np.asarray(quente[chave])
+        for chave, valor in quente['parametros'].items():
+            yield f'agua_quente/parametros/{chave}', np.asarray(np.nan if valor is None else valor)
+        for chave, valor in (quente.get('central') or quente.get('individual') or {}).items():
+            yield f"agua_quente/{quente['parametros']['aquecedor']}/{chave}", np.asarray(valor)
+    for janela_s, estatisticas in resultados.get('janelas_moveis', {}).items():
+        for chave, valor in estatisticas.items():
+            yield f'janelas_moveis/{janela_s:g}s/{chave}', np.asarray(valor)
+    previa = resultados.get('previa_convolucao')
+    if previa is not None:
+        yield 'previa_convolucao/tempo', np.asarray(previa['tempo'], dtype=np.float64)
+        yield 'previa_convolucao/p95_ts', np.asarray(previa['p95_ts'], dtype=np.float32)
+        yield 'previa_convolucao/max_p95', np.asarray(previa['max_p95'])
+
+
+def escrever_npz(destino, resultados_por_grupo):
+    """
+    Escreve {grupo: resultados} em NPZ compactado no arquivo (caminho ou objeto binário) 'destino'.
+
+    Os arrays são gravados um a um no zip (chave '<grupo>/<nome>'), com uma única cópia float32
+    de cada série em memória por vez.
+    """
+    with zipfile.ZipFile(destino, mode='w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for grupo, resultados in resultados_por_grupo.items():
+            for chave, array in _arrays_grupo(resultados):
+                with arquivo_zip.open(f"{grupo}/{chave}.npy", mode='w', force_zip64=True) as saida:
+                    formato_npy.write_array(saida, np.asanyarray(array), allow_pickle=False)
+
+
+def npz_resultados(resultados_por_temperatura):
+    """Bytes do NPZ com os resultados de todas as temperaturas (grupos '<temperatura>C')."""
+    buffer = io.BytesIO()
+    escrever_npz(buffer, {nome_grupo(temperatura): resultados for temperatura, resultados in resultados_por_temperatura.items()})
+    return buffer.getvalue()
+
+
+def npz_periodo(resultados_periodo):
+    """Bytes do NPZ com os resultados do modo diário (grupo 'periodo')."""
+    buffer = io.BytesIO()
+    escrever_npz(buffer, {'periodo': resultados_periodo})
+    return buffer.getvalue()
+
+
+def ler_npz(arquivo):
+    """Lê um NPZ exportado de volta como {grupo: {chave: array}} (escalares como arrays de dimensão zero)."""
+    grupos = {}
+    with np.load(arquivo, allow_pickle=False) as dados:
+        for nome in dados.files:
+            grupo, chave = nome.split('/', 1)
+            grupos.setdefault(grupo, {})[chave] = dados[nome]
+    return grupos
@@ -0,0 +1,169 @@
+# Gráficos das séries de vazão, reduzidas à resolução da tela antes de desenhar.
+#
+# Uma série de 15.300 pontos (86.400 por dia no modo diário, no passo de 1 s) é desenhada numa
+# figura de LARGURA_FIGURA x DPI = 1.200 pixels: cada coluna de pixels recebe dezenas de pontos.
+# A redução divide a série em tantos baldes quanto colunas de pixels e guarda, de cada balde, o
+# mínimo e o máximo na ordem em que ocorrem; assim os picos, que definem o dimensionamento,
+# aparecem exatamente como na série completa. A faixa P5–P95 usa o menor P5 e o maior P95 de
+# cada balde. Os gráficos por temperatura e a comparação entre temperaturas são desenhados só a
+# partir desses resumos reduzidos (resumir_temperatura). As figuras são devolvidas como PNG
+# (bytes), para que o aplicativo as guarde em cache ou as gere só quando pedidas para download;
+# o matplotlib só é importado ao desenhar.
+
+import io
+
+import numpy as np
+
+# Tamanho das figuras (polegadas) e resolução do PNG
+LARGURA_FIGURA = 12
+ALTURA_FIGURA = 4
+DPI = 100
+
+# Baldes da redução: um por coluna de pixels da figura
+COLUNAS_TELA = LARGURA_FIGURA * DPI
+
+
+def _blocos(valores, n_baldes):
+    """Divide a série em baldes de mesmo tamanho (o último é completado repetindo o valor final)."""
+    tamanho = -(-len(valores) // n_baldes)
+    n_baldes = -(-len(valores) // tamanho)
+    blocos = np.pad(np.asarray(valores, dtype=float), (0, n_baldes * tamanho - len(valores)), mode='edge')
+    return blocos.reshape(n_baldes, tamanho), np.arange(n_baldes) * tamanho
+
+
+def reduzir_min_max(tempo, valores, n_baldes=COLUNAS_TELA):
+    """Reduz a série a dois pontos por balde (mínimo e máximo, na ordem de ocorrência); séries curtas não mudam."""
+    tempo, valores = np.asarray(tempo), np.asarray(valores)
+    if len(valores) <= 2 * n_baldes:
+        return tempo, valores
+    blocos, inicios = _blocos(valores, n_baldes)
+    # Os índices no preenchimento do último balde apontam para o último ponto (mesmo valor)
+    indice_minimo = np.minimum(inicios + blocos.argmin(axis=1), len(valores) - 1)
+    indice_maximo = np.minimum(inicios + blocos.argmax(axis=1), len(valores) - 1)
+    indices = np.sort(np.stack([indice_minimo, indice_maximo], axis=1), axis=1).ravel()
+    return tempo[indices], valores[indices]
+
+
+def reduzir_faixa(tempo, inferior, superior, n_baldes=COLUNAS_TELA):
+    """
+    Reduz a faixa [inferior, superior] ao menor inferior e ao maior superior de cada balde.
+
+    Retorna (tempo, inferior, superior) para fill_between com step='post': cada valor vale do
+    início do seu balde até o início do seguinte (o último ponto fecha a faixa no fim da série).
+    """
+    tempo, inferior, superior = np.asarray(tempo), np.asarray(inferior), np.asarray(superior)
+    if len(tempo) <= 2 * n_baldes:
+        return tempo, inferior, superior
+    blocos_inferior, inicios = _blocos(inferior, n_baldes)
+    blocos_superior, _ = _blocos(superior, n_baldes)
+    faixa_inferior = blocos_inferior.min(axis=1)
+    faixa_superior = blocos_superior.max(axis=1)
+    return (np.append(tempo[inicios], tempo[-1]), np.append(faixa_inferior, faixa_inferior[-1]),
+            np.append(faixa_superior, faixa_superior[-1]))
+
+
+def _png(figura):
+    buf = io.BytesIO()
+    figura.savefig(buf, format="png", dpi=DPI)
+    return buf.getvalue()
+
+
+def resumir_temperatura(resultados, n_baldes=COLUNAS_TELA):
+    """
+    Resumo reduzido dos resultados de uma temperatura, único insumo dos gráficos.
+
+    Guarda as séries média e P95 e a prévia analítica reduzidas por mínimo/máximo, a faixa
+    P5–P95 reduzida e os máximos (da série completa); alguns milhares de pontos por temperatura.
+    """
+    previa = resultados['previa_convolucao']
+    return {
+        'media': reduzir_min_max(resultados['tempo'], resultados['media_ts'], n_baldes),
+        'p95': reduzir_min_max(resultados['tempo'], resultados['p95_ts'], n_baldes),
+        'faixa': reduzir_faixa(resultados['tempo'], resultados['p5_ts'], resultados['p95_ts'], n_baldes),
+        'p95_previa': reduzir_min_max(previa['tempo'], previa['p95_ts'], n_baldes),
+        'max_media': float(resultados['max_media']),
+        'max_p95': float(resultados['max_p95']),
+        'max_p95_previa': float(previa['max_p95']),
+    }
+
+
+def png_vazao_temperatura(resumo, temperatura):
+    """Figura da vazão de uma temperatura (média, P95, faixa P5–P95 e P95 analítico) em PNG, a partir do resumo."""
+    from matplotlib.figure import Figure
+
+    figura = Figure(figsize=(LARGURA_FIGURA, ALTURA_FIGURA))
+    ax = figura.subplots()
+    ax.plot(*resumo['media'], label='Média Vazão')
+    ax.plot(*resumo['p95'], label='P95 Vazão', linestyle='--')
+    ax.fill_between(*resumo['faixa'], step='post', color='gray', alpha=0.2, label='Faixa P5–P95')
+    ax.plot(*resumo['p95_previa'], label='P95 Analítico (convolução)', linestyle=':', color='black')
+
+    ax.set_xlabel('Tempo (s)')
+    ax.set_ylabel('Vazão (L/s)')
+    ax.legend()
+    ax.set_title(f'Série Temporal de Vazão - Temperatura: {temperatura}°C')
+    ax.grid(True)
+
+    # Máximos da média e do P95 (da série completa) como texto no gráfico
+    ax.text(0.01, 0.99, f"Máx Média: {resumo['max_media']:.2f} L/s", transform=ax.transAxes, fontsize=10, verticalalignment='top',
+            bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
+    ax.text(0.01, 0.92, f"Máx P95: {resumo['max_p95']:.2f} L/s", transform=ax.transAxes, fontsize=10, verticalalignment='top',
+            bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.5))
+    figura.tight_layout()
+    return _png(figura)
+
+
+def png_comparacao_temperaturas(resumos):
+    """
+    Figura única de comparação entre temperaturas, em PNG: envelopes do P95 de todas as
+    temperaturas sobrepostos e curva dos máximos (média, P95 e P95 analítico) x temperatura.
+    """
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    temperaturas = sorted(resumos)
+    cores = colormaps['coolwarm'](np.linspace(0, 1, len(temperaturas)))
+    figura = Figure(figsize=(LARGURA_FIGURA, ALTURA_FIGURA))
+    ax_series, ax_picos = figura.subplots(1, 2, width_ratios=[3, 1])
+
+    for temperatura, cor in zip(temperaturas, cores):
+        ax_series.plot(*resumos[temperatura]['p95'], color=cor, linewidth=0.8, label=f'{temperatura}°C')
+    ax_series.set_xlabel('Tempo (s)')
+    ax_series.set_ylabel('Vazão P95 (L/s)')
+    ax_series.set_title('P95 da Vazão por Temperatura')
+    ax_series.grid(True)
+    ax_series.legend(fontsize=8, ncol=max(1, len(temperaturas) // 8))
+
+    ax_picos.plot(temperaturas, [resumos[t]['max_p95'] for t in temperaturas], marker='o', label='Máx P95')
+    ax_picos.plot(temperaturas, [resumos[t]['max_media'] for t in temperaturas], marker='s', label='Máx Média')
+    ax_picos.plot(temperaturas, [resumos[t]['max_p95_previa'] for t in temperaturas], marker='^', linestyle=':', color='black',
+                  label='Máx P95 Analítico')
+    ax_picos.set_xlabel('Temperatura (°C)')
+    ax_picos.set_ylabel('Vazão (L/s)')
+    ax_picos.set_title('Pico x Temperatura')
+    ax_picos.grid(True)
+    ax_picos.legend(fontsize=8)
+    figura.tight_layout()
+    return _png(figura)
+
+
+def png_vazao_periodo(tempo, media_ts, p5_ts, p95_ts, temperatura_ts, horas_perfil):
+    """Figura da vazão do modo diário, com o perfil horário de temperatura no eixo secundário, em PNG."""
+    from matplotlib.figure import Figure
+
+    horas = np.asarray(tempo) / 3600
+    figura = Figure(figsize=(LARGURA_FIGURA, ALTURA_FIGURA))
+    ax = figura.subplots()
+    ax.plot(*reduzir_min_max(horas, media_ts), label='Média Vazão')
+    ax.plot(*reduzir_min_max(horas, p95_ts), label='P95 Vazão', linestyle='--')
+    ax.fill_between(*reduzir_faixa(horas, p5_ts, p95_ts), step='post', color='gray', alpha=0.2, label='Faixa P5–P95')
+    ax.set_xlabel('Tempo (h)')
+    ax.set_ylabel('Vazão (L/s)')
+    ax.grid(True)
+    ax_temperatura = ax.twinx()
+    ax_temperatura.plot(*reduzir_min_max(horas, temperatura_ts), color='tab:red', alpha=0.5, label='Temperatura')
+    ax_temperatura.set_ylabel('Temperatura (°C)')
+    ax.legend(loc='upper left')
+    ax.set_title(f'Série Temporal de Vazão - {horas_perfil} h')
+    figura.tight_layout()
+    return _png(figura)
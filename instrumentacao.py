@@ -0,0 +1,104 @@
+# Instrumentação do laço de simulação: tempo gasto em cada fase e captura opcional de perfil.
+#
+# O cronômetro acumula o tempo de cada fase por temperatura (sorteios, avaliação fuzzy, fila
+# dos banheiros, acúmulo da vazão, gravação das séries, reservatório, verificação de
+# convergência, interface e gráficos), para que uma execução lenta mostre onde o tempo foi
+# gasto sem precisar de um profiler externo.
+# O perfil completo (cProfile, ou pyinstrument se instalado) pode ser baixado pela interface.
+
+import cProfile
+import io
+import marshal
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+
+try:
+    import pyinstrument
+    PYINSTRUMENT_DISPONIVEL = True
+except ImportError:
+    PYINSTRUMENT_DISPONIVEL = False
+
+# Fases medidas -> descrição exibida no painel "Desempenho" e na saída do benchmark
+FASES = {
+    'sorteios': "Sorteios aleatórios",
+    'fuzzy': "Avaliação fuzzy",
+    'fila': "Fila dos banheiros",
+    'vazao': "Acúmulo da vazão",
+    'gravacao': "Gravação das séries em disco",
+    'reservatorio': "Reservatório (volume e reposição)",
+    'agua_quente': "Água quente e aquecedor",
+    'convergencia': "Verificação de convergência",
+    'interface': "Relatório e atualizações da interface",
+    'estatisticas': "Estatísticas finais",
+    'previa': "Prévia analítica (convolução)",
+    'graficos': "Gráficos",
+}
+
+# Opções de captura de perfil exibidas na barra lateral
+FERRAMENTAS_PERFIL = {"Nenhum": None, "cProfile": "cprofile"}
+if PYINSTRUMENT_DISPONIVEL:
+    FERRAMENTAS_PERFIL["pyinstrument"] = "pyinstrument"
+
+
+class CronometroFases:
+    """Acumula o tempo (s) gasto em cada fase do laço de simulação."""
+
+    def __init__(self):
+        self.tempos = dict.fromkeys(FASES, 0.0)
+
+    def adicionar(self, fase, segundos):
+        self.tempos[fase] += segundos
+
+    @contextmanager
+    def medir(self, fase):
+        inicio = perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[fase] += perf_counter() - inicio
+
+    def total(self):
+        return sum(self.tempos.values())
+
+    def tabela(self):
+        """Linhas (fase, segundos, % do total) das fases com tempo registrado."""
+        total = self.total() or 1.0
+        return [
+            {'Fase': FASES[fase], 'Tempo (s)': round(segundos, 3), '% do total': round(100 * segundos / total, 1)}
+            for fase, segundos in self.tempos.items() if segundos > 0
+        ]
+
+    def texto(self):
+        """Resumo em texto para a saída de linha de comando."""
+        return "\n".join(f"  {linha['Fase']:<40}{linha['Tempo (s)']:>10.3f} s{linha['% do total']:>8.1f} %" for linha in self.tabela())
+
+
+def iniciar_perfil(ferramenta):
+    """Inicia a captura de perfil ('cprofile' ou 'pyinstrument'); retorna o perfilador ou None."""
+    if ferramenta == 'cprofile':
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        return perfilador
+    if ferramenta == 'pyinstrument' and PYINSTRUMENT_DISPONIVEL:
+        perfilador = pyinstrument.Profiler()
+        perfilador.start()
+        return perfilador
+    return None
+
+
+def encerrar_perfil(ferramenta, perfilador):
+    """
+    Encerra a captura e retorna (dados, nome_arquivo, mime, resumo_texto) para download.
+
+    O arquivo do cProfile (.prof) pode ser aberto com pstats, snakeviz ou tuna.
+    """
+    if ferramenta == 'cprofile':
+        perfilador.disable()
+        estatisticas = pstats.Stats(perfilador)
+        resumo = io.StringIO()
+        pstats.Stats(perfilador, stream=resumo).sort_stats('cumulative').print_stats(25)
+        # Mesmo formato gravado por pstats.Stats.dump_stats
+        return marshal.dumps(estatisticas.stats), "perfil_simulacao.prof", "application/octet-stream", resumo.getvalue()
+    perfilador.stop()
+    return perfilador.output_html().encode("utf-8"), "perfil_simulacao.html", "text/html", perfilador.output_text()
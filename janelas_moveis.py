@@ -0,0 +1,138 @@
+# Vazões médias em janelas móveis (ex.: 10 s, 60 s, 5 min), calculadas por somas prefixadas.
+#
+# As normas de dimensionamento costumam usar a vazão média numa janela, e não o pico instantâneo
+# de cada passo que max_p95 reporta. Para cada iteração, a série densa é acumulada uma única vez
+# (soma prefixada) e a média móvel de qualquer janela de w pontos sai de uma subtração:
+# media[t] = (S[t + w] - S[t]) / w, a média dos w instantes que começam em t. Todas as janelas
+# saem da mesma soma, por isso custam pouco mais que uma.
+# Em cada janela são acumulados a soma das médias móveis (média por instante) e o pico da média
+# móvel de cada iteração, cujo P95 é o quantil do pico entre as iterações. O P95 de cada instante
+# segue o modo de memoria.AcumuladorVazao: enquanto as séries são guardadas, ele é exato, calculado
+# no fim sobre as mesmas séries (quantis_medias_moveis, em blocos de instantes); quando o acumulador
+# passa a fluxo, as séries já vistas são repassadas ao estimador P² (QuantilP2), que acompanha as
+# seguintes. O P² custa cerca de 1 ms por iteração a cada 15.300 instantes. Como a média móvel de
+# w pontos varia no máximo 1/w da faixa de vazão de um instante para o seguinte, em fluxo o P95
+# das janelas longas é acompanhado a cada w / AMOSTRAS_POR_JANELA instantes (variação de até 5% da
+# faixa entre amostras): com 10 s, 60 s e 5 min, o custo total é o de cerca de 1,4 janelas completas.
+# Nas médias móveis, com muitos instantes de vazão nula, o P² tende a superestimar o P95.
+
+import numpy as np
+
+import eventos
+from memoria import QuantilP2
+
+# Janelas (s) sugeridas na barra lateral
+JANELAS_PADRAO_S = (10, 60, 300)
+
+# Amostras do P95 por comprimento de janela
+AMOSTRAS_POR_JANELA = 20
+
+
+def pontos_da_janela(janela_s, passo_tempo):
+    """Número de pontos da grade numa janela (ao menos 1)."""
+    return max(1, int(round(janela_s / passo_tempo)))
+
+
+def medias_moveis(densa, pontos_janelas):
+    """
+    {pontos: média móvel} de uma série densa (ou de cada linha de uma matriz) para várias janelas,
+    a partir de uma única soma prefixada; janelas maiores que a série são omitidas.
+    """
+    densa = np.asarray(densa, dtype=float)
+    prefixo = np.zeros(densa.shape[:-1] + (densa.shape[-1] + 1,))
+    np.cumsum(densa, axis=-1, out=prefixo[..., 1:])
+    return {w: (prefixo[..., w:] - prefixo[..., :-w]) / w for w in pontos_janelas if w <= densa.shape[-1]}
+
+
+def quantis_medias_moveis(series, n_pontos, pontos_janelas, quantil=95):
+    """
+    {pontos: quantil por instante da média móvel} exato sobre uma lista de SerieEsparsa.
+
+    As séries são densificadas em blocos de instantes (com os w - 1 seguintes de cada bloco), pela
+    mesma chave global (iteração, instante) de eventos.estatisticas_por_instante.
+    """
+    n_series = len(series)
+    deslocamento = n_pontos + 1
+    chaves = np.concatenate([i * deslocamento + serie.tempos.astype(np.int64) for i, serie in enumerate(series)])
+    vazoes = np.concatenate([serie.vazoes for serie in series])
+    base = (np.arange(n_series, dtype=np.int64) * deslocamento)[:, None]
+    maior_janela = max(pontos_janelas)
+    colunas_por_bloco = max(maior_janela, eventos.ELEMENTOS_POR_BLOCO // n_series)
+    resultados = {w: np.empty(n_pontos - w + 1) for w in pontos_janelas}
+    for inicio in range(0, n_pontos, colunas_por_bloco):
+        instantes = np.arange(inicio, min(n_pontos, inicio + colunas_por_bloco + maior_janela - 1))
+        densa = vazoes[np.searchsorted(chaves, base + instantes[None, :], side='right') - 1]
+        for w, media in medias_moveis(densa, pontos_janelas).items():
+            fim = min(inicio + colunas_por_bloco, n_pontos - w + 1)
+            if fim > inicio:
+                resultados[w][inicio:fim] = np.percentile(media[:, :fim - inicio], quantil, axis=0)
+    return resultados
+
+
+class AcumuladorJanelas:
+    """
+    Acumula a média e o P95 por instante e o pico por iteração da média móvel de cada janela.
+
+    O P95 por instante é exato enquanto 'acumulador' (memoria.AcumuladorVazao das mesmas séries)
+    as guarda e passa ao P² quando ele passa a fluxo; sem 'acumulador', é sempre exato.
+    """
+
+    def __init__(self, janelas_s, passo_tempo, n_pontos, acumulador=None):
+        # Janelas que cabem na série, sem repetir o mesmo número de pontos
+        self.pontos = {}
+        for janela_s in sorted(janelas_s):
+            w = pontos_da_janela(janela_s, passo_tempo)
+            if w <= n_pontos and w not in self.pontos.values():
+                self.pontos[janela_s] = w
+        self.passo_tempo = passo_tempo
+        self.n_pontos = n_pontos
+        self.acumulador = acumulador
+        self.n_iteracoes = 0
+        self.somas = {w: np.zeros(n_pontos - w + 1) for w in self.pontos.values()}
+        self.passos_p95 = {w: max(1, w // AMOSTRAS_POR_JANELA) for w in self.pontos.values()}
+        self.picos = {w: [] for w in self.pontos.values()}
+        # Séries vistas enquanto o P95 é exato (as mesmas guardadas pelo acumulador, sem cópia)
+        self.series = []
+        self.quantis = None
+
+    def adicionar(self, vazao):
+        self.n_iteracoes += 1
+        for w, media in medias_moveis(vazao.densificar(), self.pontos.values()).items():
+            self.somas[w] += media
+            self.picos[w].append(media.max())
+            if self.quantis is not None:
+                self.quantis[w].adicionar(media[::self.passos_p95[w]])
+        if self.quantis is None:
+            self.series.append(vazao)
+            if self.acumulador is not None and self.acumulador.em_fluxo:
+                self._passar_a_fluxo()
+
+    def _passar_a_fluxo(self):
+        self.quantis = {w: QuantilP2(95, len(range(0, self.n_pontos - w + 1, self.passos_p95[w])))
+                        for w in self.pontos.values()}
+        series, self.series = self.series, []
+        for vazao in series:
+            for w, media in medias_moveis(vazao.densificar(), self.pontos.values()).items():
+                self.quantis[w].adicionar(media[::self.passos_p95[w]])
+
+    def finalizar(self):
+        """{janela (s): estatísticas da média móvel} com a duração efetiva da janela na grade."""
+        if self.quantis is not None:
+            max_p95 = {w: float(np.max(estimador.estimativa())) for w, estimador in self.quantis.items()}
+        elif self.series:
+            max_p95 = {w: float(np.max(p95)) for w, p95 in
+                       quantis_medias_moveis(self.series, self.n_pontos, list(self.pontos.values())).items()}
+        else:
+            max_p95 = {w: float('nan') for w in self.pontos.values()}
+        resultados = {}
+        for janela_s, w in self.pontos.items():
+            picos = np.asarray(self.picos[w])
+            resultados[janela_s] = {
+                'janela_efetiva_s': w * self.passo_tempo,
+                'max_media': float(np.max(self.somas[w] / max(self.n_iteracoes, 1))),
+                'max_p95': max_p95[w],
+                'p95_em_fluxo': self.quantis is not None, # P95 per instant estimated by P² (streaming)
+                'p95_pico': float(np.percentile(picos, 95)) if len(picos) else float('nan'),
+                'picos': picos,
+            }
+        return resultados
@@ -0,0 +1,182 @@
+# Contabilidade e limite de memória de cada execução do Monte Carlo.
+#
+# Cada iteração gera uma série de vazão guardada por pontos de mudança (eventos.SerieEsparsa).
+# Guardar todas as séries para calcular a média e os percentis no fim custa cerca de
+# n_iteracoes x eventos x 12 bytes por temperatura, mais o bloco da varredura final. Como as
+# sessões do aplicativo compartilham o mesmo processo, cada execução contabiliza os bytes que ela própria mantém. Ao
+# atingir o orçamento configurado, a execução passa a estatísticas em fluxo: a média continua
+# exata (soma acumulada) e o P5/P95 de cada instante é estimado pelo algoritmo P² (Jain e
+# Chlamtac, 1985), vetorizado sobre os instantes. O RSS do processo é amostrado para exibição.
+
+import resource
+import sys
+
+import numpy as np
+
+import eventos
+
+BYTES_POR_VALOR = 8
+
+# Memória de trabalho de um bloco da varredura das estatísticas: índices, valores e cópia de
+# ordenação do np.percentile
+BYTES_BLOCO_VARREDURA = 3 * eventos.ELEMENTOS_POR_BLOCO * BYTES_POR_VALOR
+
+# Séries mantidas por temperatura após a execução (média, P5, P95 e eixo de tempo)
+SERIES_POR_TEMPERATURA = 4
+
+# Marcadores do P² por quantil (alturas e posições) e quantis acompanhados em fluxo
+MARCADORES_P2 = 5
+QUANTIS_FLUXO = (5, 95)
+
+
+def estimar_memoria_mb(n_iteracoes, n_pontos, eventos_por_iteracao, n_temperaturas, tamanho_lote, n_janelas=0):
+    """
+    Estimativa do pico de memória (MB) de uma execução, guardando todas as séries ou em fluxo.
+
+    'n_pontos' é o comprimento da série (duração / passo de tempo) e 'eventos_por_iteracao' os
+    pontos de mudança de cada série (ver eventos.eventos_por_iteracao); 'n_janelas' é o número de
+    janelas de médias móveis acompanhadas (ver janelas_moveis). Retorna
+    {'completo_mb': ..., 'fluxo_mb': ...}; usa o máximo de iterações como pior caso.
+    """
+    bytes_serie = n_pontos * BYTES_POR_VALOR
+    bytes_iteracao = eventos_por_iteracao * eventos.BYTES_POR_EVENTO
+    # Cada janela móvel guarda o estado do P² do P95 e a soma das médias móveis
+    bytes_janelas = n_janelas * (2 * MARCADORES_P2 + 1) * bytes_serie
+    retidas = n_temperaturas * SERIES_POR_TEMPERATURA * bytes_serie + BYTES_BLOCO_VARREDURA + bytes_janelas
+    completo = n_iteracoes * bytes_iteracao + retidas
+    # Lote corrente, estado do P², soma acumulada e série densificada da iteração
+    fluxo = tamanho_lote * bytes_iteracao + (2 * MARCADORES_P2 * len(QUANTIS_FLUXO) + 2) * bytes_serie + retidas
+    return {'completo_mb': completo / 2**20, 'fluxo_mb': fluxo / 2**20}
+
+
+def rss_atual_mb():
+    """RSS atual do processo (MB); recai no pico do processo onde /proc não existe."""
+    try:
+        with open("/proc/self/statm") as arquivo:
+            paginas_residentes = int(arquivo.read().split()[1])
+        return paginas_residentes * resource.getpagesize() / 2**20
+    except (OSError, ValueError, IndexError):
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta em KB; macOS em bytes
+        return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+
+class QuantilP2:
+    """Estimador P² de um quantil, atualizado uma observação por vez para cada instante da série."""
+
+    def __init__(self, quantil, n_pontos):
+        self.p = quantil / 100
+        self.n_observacoes = 0
+        self.alturas = np.zeros((MARCADORES_P2, n_pontos))
+        self.posicoes = np.tile(np.arange(1.0, MARCADORES_P2 + 1)[:, None], (1, n_pontos))
+        self.posicoes_desejadas = np.array([1, 1 + 2 * self.p, 1 + 4 * self.p, 3 + 2 * self.p, 5])
+        self.incrementos = np.array([0, self.p / 2, self.p, (1 + self.p) / 2, 1])
+
+    def adicionar(self, x):
+        if self.n_observacoes < MARCADORES_P2:
+            self.alturas[self.n_observacoes] = x
+            self.n_observacoes += 1
+            if self.n_observacoes == MARCADORES_P2:
+                self.alturas.sort(axis=0)
+            return
+        self.n_observacoes += 1
+        q, n = self.alturas, self.posicoes
+
+        # Célula de cada observação; os marcadores extremos acompanham o mínimo e o máximo
+        celula = (x[None, :] >= q[1:4]).sum(axis=0)
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        n += np.arange(MARCADORES_P2)[:, None] > celula[None, :]
+        self.posicoes_desejadas += self.incrementos
+
+        # Ajusta os marcadores centrais (parabólico, ou linear se sair da ordem), calculando só
+        # nos instantes em que o marcador se move (em geral uma pequena fração da série)
+        for i in (1, 2, 3):
+            d = self.posicoes_desejadas[i] - n[i]
+            ajustar = np.flatnonzero(((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1)))
+            if not len(ajustar):
+                continue
+            qa, na = q[i - 1:i + 2, ajustar], n[i - 1:i + 2, ajustar]
+            s = np.where(d[ajustar] >= 0, 1.0, -1.0)
+            parabolico = qa[1] + s / (na[2] - na[0]) * (
+                (na[1] - na[0] + s) * (qa[2] - qa[1]) / (na[2] - na[1])
+                + (na[2] - na[1] - s) * (qa[1] - qa[0]) / (na[1] - na[0]))
+            vizinho_q = np.where(s > 0, qa[2], qa[0])
+            vizinho_n = np.where(s > 0, na[2], na[0])
+            linear = qa[1] + s * (vizinho_q - qa[1]) / (vizinho_n - na[1])
+            q[i, ajustar] = np.where((qa[0] < parabolico) & (parabolico < qa[2]), parabolico, linear)
+            n[i, ajustar] += s
+
+    def estimativa(self):
+        if self.n_observacoes < MARCADORES_P2:
+            return np.percentile(self.alturas[:self.n_observacoes], self.p * 100, axis=0)
+        return self.alturas[2].copy()
+
+    def nbytes(self):
+        return self.alturas.nbytes + self.posicoes.nbytes
+
+
+class AcumuladorVazao:
+    """
+    Guarda as séries esparsas de uma temperatura e passa a estatísticas em fluxo ao atingir o orçamento.
+
+    'orcamento_mb' None guarda todas as séries (percentis exatos, comportamento original).
+    """
+
+    def __init__(self, n_pontos, orcamento_mb=None):
+        self.n_pontos = n_pontos
+        self.orcamento_bytes = None if orcamento_mb is None else orcamento_mb * 2**20
+        self.series = []
+        self.bytes_series = 0
+        self.n_iteracoes = 0
+        self.em_fluxo = False
+        self.iteracao_troca = None
+        self.soma = None
+        self.quantis = None
+        self.pico_bytes = 0
+
+    def bytes_em_uso(self):
+        if self.em_fluxo:
+            return self.soma.nbytes + sum(estimador.nbytes() for estimador in self.quantis.values())
+        return self.bytes_series
+
+    def adicionar(self, vazao):
+        self.n_iteracoes += 1
+        if self.em_fluxo:
+            self._atualizar_fluxo(vazao)
+        else:
+            self.series.append(vazao)
+            self.bytes_series += vazao.nbytes
+            self.pico_bytes = max(self.pico_bytes, self.bytes_em_uso())
+            if self.orcamento_bytes is not None and self.bytes_em_uso() + BYTES_BLOCO_VARREDURA > self.orcamento_bytes:
+                self._passar_a_fluxo()
+        self.pico_bytes = max(self.pico_bytes, self.bytes_em_uso())
+
+    def _passar_a_fluxo(self):
+        self.em_fluxo = True
+        self.iteracao_troca = self.n_iteracoes
+        self.soma = np.zeros(self.n_pontos)
+        self.quantis = {q: QuantilP2(q, self.n_pontos) for q in QUANTIS_FLUXO}
+        series, self.series, self.bytes_series = self.series, [], 0
+        for vazao in series:
+            self._atualizar_fluxo(vazao)
+
+    def _atualizar_fluxo(self, vazao):
+        densa = vazao.densificar()
+        self.soma += densa
+        for estimador in self.quantis.values():
+            estimador.adicionar(densa)
+
+    def max_p95(self):
+        """Máximo do P95 por instante sobre todas as iterações acumuladas (critério original)."""
+        if self.em_fluxo:
+            return np.max(self.quantis[95].estimativa())
+        _, quantis = eventos.estatisticas_por_instante(self.series, self.n_pontos, quantis=(95,))
+        return np.max(quantis[95])
+
+    def finalizar(self):
+        """Retorna (media_ts, p5_ts, p95_ts) sobre todas as iterações."""
+        if self.em_fluxo:
+            return self.soma / self.n_iteracoes, self.quantis[5].estimativa(), self.quantis[95].estimativa()
+        media, quantis = eventos.estatisticas_por_instante(self.series, self.n_pontos, quantis=(5, 95))
+        return media, quantis[5], quantis[95]
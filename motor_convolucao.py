@@ -0,0 +1,215 @@
+# Motor semi-analítico de convolução para a prévia da distribuição de vazão do prédio.
+#
+# Como os apartamentos são independentes, a distribuição da vazão do prédio em cada segundo é
+# a convolução das distribuições de vazão de cada apartamento. As vazões possíveis são somas
+# dos aparelhos (os do catálogo, ver catalogo_aparelhos, e a máquina de lavar), arredondadas para
+# múltiplos de QUANTUM_VAZAO, de modo que cada distribuição é um vetor de probabilidades sobre
+# uma grade inteira e a convolução entre N apartamentos iguais vira uma potência da sua FFT.
+#
+# Aproximações (a prévia serve como estimativa rápida e como conferência do Monte Carlo):
+#   - a fila de espera dos banheiros é ignorada (moradores independentes dentro do apartamento);
+#   - a duração fuzzy do banho vem da superfície pré-calculada e interpolada (superficie_duracao);
+#   - a sobreposição vaso/chuveiro nos primeiros segundos da janela é desconsiderada;
+#   - durações e deslocamentos sorteados entram por uma grade de quantis de cada distribuição.
+
+import numpy as np
+
+import catalogo_aparelhos
+
+# Resolução da grade de vazões (L/s): máximo divisor comum das vazões dos aparelhos
+QUANTUM_VAZAO = 0.005
+
+# Limite de elementos (segundos x frequências) processados por bloco na etapa do prédio
+ELEMENTOS_POR_BLOCO = 2_000_000
+
+# Custo total alvo da prévia (segundos avaliados x comprimento da FFT), usado para escolher o passo
+ELEMENTOS_PREVIA = 10_000_000
+
+# Pontos da grade de quantis (por eixo) das durações e deslocamentos sorteados dos aparelhos
+PONTOS_QUANTIS = 5
+
+
+def tabelar_duracao_banho(superficie, temperatura, duracao_simulacao):
+    """Retorna a duração do banho (s) para cada segundo de início, a partir da superfície de duração do conjunto de regras."""
+    duracoes_minutos = superficie.duracao_minutos(temperatura, np.arange(duracao_simulacao) / duracao_simulacao)
+    return (duracoes_minutos * 60).astype(int)
+
+
+def inicios_com_mlr(variavel_inicio, duracao_simulacao):
+    """Indica, para cada segundo de início, se o morador sorteado para a MLR de fato a utiliza."""
+    inicios = np.clip(np.arange(duracao_simulacao), variavel_inicio.universe.min(), variavel_inicio.universe.max())
+    pertinencia_delayed = np.interp(inicios, variavel_inicio.universe, variavel_inicio['Delayed'].mf)
+    pertinencia_very_delayed = np.interp(inicios, variavel_inicio.universe, variavel_inicio['Very delayed'].mf)
+    return (pertinencia_delayed + pertinencia_very_delayed) < 0.5
+
+
+def _acumular_intervalos(ocupacao, inicios, fins, pesos, duracao_simulacao):
+    """Soma 'pesos' em [inicio, fim) para cada intervalo, via vetor de diferenças."""
+    inicios = np.clip(inicios, 0, duracao_simulacao)
+    fins = np.clip(fins, 0, duracao_simulacao)
+    validos = fins > inicios
+    diferencas = np.zeros(duracao_simulacao + 1)
+    np.add.at(diferencas, inicios[validos], pesos[validos])
+    np.add.at(diferencas, fins[validos], -pesos[validos])
+    ocupacao += np.cumsum(diferencas[:-1])
+
+
+def _catalogos_quantis(catalogo):
+    """
+    Catálogos com a duração e o deslocamento nos pontos de uma grade de quantis (PONTOS_QUANTIS
+    pontos médios em cada eixo), de mesmo peso; só o próprio catálogo se todos os tempos são fixos.
+    """
+    if not catalogo_aparelhos.tempos_variaveis(catalogo):
+        return [catalogo]
+    quantis = (np.arange(PONTOS_QUANTIS) + 0.5) / PONTOS_QUANTIS
+    quantil_duracao, quantil_deslocamento = np.meshgrid(quantis, quantis, indexing='ij')
+    n_aparelhos = len(catalogo['chaves'])
+    return [catalogo_aparelhos.tempos_sorteados(catalogo, np.tile([q_duracao, q_deslocamento], (n_aparelhos, 1)))
+            for q_duracao, q_deslocamento in zip(quantil_duracao.ravel(), quantil_deslocamento.ravel())]
+
+
+def probabilidades_morador(dur_banho_s, usa_pia, usa_mlr, mlr_por_inicio, aparelhos, duracao_simulacao):
+    """
+    Probabilidade, em cada segundo, de cada aparelho do morador estar aberto.
+
+    Retorna um dicionário {nível da grade de vazão: vetor de probabilidades por segundo},
+    considerando o início do banho uniforme em [0, duracao_simulacao).
+    """
+    inicio = np.arange(duracao_simulacao)
+    peso = np.full(duracao_simulacao, 1.0 / duracao_simulacao)
+    niveis = {}
+
+    def adicionar(vazao, inicios, fins, pesos):
+        nivel = int(round(vazao / QUANTUM_VAZAO))
+        if nivel not in niveis:
+            niveis[nivel] = np.zeros(duracao_simulacao)
+        _acumular_intervalos(niveis[nivel], inicios, fins, pesos, duracao_simulacao)
+
+    # Aparelhos do catálogo: cada um pesa pela sua probabilidade de uso (o de um morador por apartamento
+    # só no da pia) e, com durações e deslocamentos sorteados, pelo ponto da grade de quantis (ver _catalogos_quantis)
+    catalogos = _catalogos_quantis(aparelhos['catalogo'])
+    fim_banho = inicio + dur_banho_s
+    for catalogo in catalogos:
+        peso_ponto = peso / len(catalogos) if len(catalogos) > 1 else peso
+        usado = catalogo_aparelhos.usados(catalogo, None, np.full(1, usa_pia))[0]
+        inicio_relativo, fim_relativo = catalogo_aparelhos.intervalos_relativos(catalogo, dur_banho_s)
+        inicio_antes_mlr = fim_antes_mlr = None
+        for j in np.flatnonzero(usado):
+            inicio_aparelho = np.maximum(0, inicio + inicio_relativo[:, j])
+            fim_aparelho = inicio_aparelho + (fim_relativo[:, j] - inicio_relativo[:, j])
+            adicionar(catalogo['vazao'][j], inicio_aparelho, fim_aparelho, peso_ponto * catalogo['probabilidade'][j])
+            if catalogo['chaves'][j] == catalogo_aparelhos.APARELHO_ANTES_MLR:
+                inicio_antes_mlr, fim_antes_mlr = inicio_aparelho, np.minimum(duracao_simulacao, fim_aparelho)
+
+        if usa_mlr:
+            # Após a pia quando ela é usada e cabe no horizonte; senão após o banho
+            if fim_antes_mlr is None:
+                chance_apos_pia = np.zeros(duracao_simulacao)
+                fim_antes_mlr = fim_banho
+            else:
+                chance_apos_pia = (fim_antes_mlr > inicio_antes_mlr) * catalogo['probabilidade'][
+                    catalogo_aparelhos.indice(catalogo, catalogo_aparelhos.APARELHO_ANTES_MLR)]
+            inicios_mlr = np.concatenate((fim_antes_mlr + aparelhos['atraso_mlr_apos_pia'],
+                                          fim_banho + aparelhos['atraso_mlr_apos_banho']))
+            peso_mlr = np.where(mlr_por_inicio, peso_ponto / len(aparelhos['duracoes_mlr']), 0.0)
+            pesos_mlr = np.concatenate((peso_mlr * chance_apos_pia, peso_mlr * (1 - chance_apos_pia)))
+            for duracao_mlr in aparelhos['duracoes_mlr']:
+                adicionar(aparelhos['vazao_mlr'], inicios_mlr, inicios_mlr + int(duracao_mlr), pesos_mlr)
+
+    return niveis
+
+
+def _funcao_caracteristica(niveis, comprimento):
+    """FFT (rfft) da distribuição de vazão de um morador, calculada diretamente a partir das probabilidades."""
+    frequencias = np.arange(comprimento // 2 + 1)
+    funcao = None
+    for nivel, probabilidade in niveis.items():
+        fator = np.exp(-2j * np.pi * nivel * frequencias / comprimento) - 1.0
+        termo = probabilidade[:, None] * fator[None, :]
+        funcao = termo if funcao is None else funcao + termo
+    return 1.0 + funcao
+
+
+def _quantis_da_fmp(fmp, quantis):
+    """Quantis (em níveis da grade) de cada linha de uma matriz de probabilidades."""
+    acumulada = np.cumsum(np.clip(fmp, 0, None), axis=1)
+    acumulada /= acumulada[:, -1:]
+    return {q: (acumulada < q / 100).sum(axis=1) for q in quantis}
+
+
+def prever_vazao_convolucao(duracoes_por_regra, regras_por_morador, total_apartamentos, mlr_por_inicio,
+                            aparelhos, duracao_simulacao, quantis=(5, 95), passo=None):
+    """
+    Estima a média e os quantis da vazão do prédio em cada segundo por convolução via FFT.
+
+    'duracoes_por_regra' mapeia cada tipo de regra para a duração do banho (s) por segundo de início.
+    'passo' define a resolução temporal da prévia; se None, é escolhido para manter o custo baixo.
+    """
+    # scipy.fft é importado sob demanda: a prévia só é calculada ao executar a simulação
+    from scipy import fft as sp_fft
+
+    n_moradores = len(regras_por_morador)
+    nivel_maximo_morador = int(round(max(np.max(aparelhos['catalogo']['vazao']), aparelhos['vazao_mlr']) / QUANTUM_VAZAO))
+
+    # 1. Distribuição de cada morador para as quatro combinações (usa pia?, usa MLR?)
+    probabilidades = {}
+    for tipo_regra in set(regras_por_morador):
+        for usa_pia in (False, True):
+            for usa_mlr in (False, True):
+                probabilidades[(tipo_regra, usa_pia, usa_mlr)] = probabilidades_morador(
+                    duracoes_por_regra[tipo_regra], usa_pia, usa_mlr, mlr_por_inicio, aparelhos, duracao_simulacao)
+
+    # Média exata: soma das vazões esperadas de todos os moradores (pia e MLR sorteadas por apartamento)
+    media_apartamento = np.zeros(duracao_simulacao)
+    for tipo_regra in regras_por_morador:
+        for usa_pia in (False, True):
+            for usa_mlr in (False, True):
+                chance = (1 / n_moradores if usa_pia else 1 - 1 / n_moradores) * (1 / n_moradores if usa_mlr else 1 - 1 / n_moradores)
+                for nivel, prob in probabilidades[(tipo_regra, usa_pia, usa_mlr)].items():
+                    media_apartamento += chance * nivel * QUANTUM_VAZAO * prob
+
+    nivel_maximo_apto = n_moradores * nivel_maximo_morador
+    comprimento_predio = sp_fft.next_fast_len(total_apartamentos * nivel_maximo_apto + 1, real=True)
+    if passo is None:
+        passo = max(1, int(np.ceil(duracao_simulacao * comprimento_predio / ELEMENTOS_PREVIA)))
+    segundos = np.arange(0, duracao_simulacao, passo)
+
+    # 2. Distribuição do apartamento: mistura sobre quem usa a pia e quem usa a MLR.
+    # Para cada morador da pia, a soma sobre o morador da MLR usa produtos prefixo/sufixo (O(n²) no total).
+    comprimento_apto = sp_fft.next_fast_len(nivel_maximo_apto + 1, real=True)
+    funcoes_morador = {chave: _funcao_caracteristica({n: p[segundos] for n, p in niveis.items()}, comprimento_apto)
+                       for chave, niveis in probabilidades.items()}
+    funcao_apto = 0
+    for morador_pia in range(n_moradores):
+        sem_mlr = [funcoes_morador[(tipo_regra, indice == morador_pia, False)] for indice, tipo_regra in enumerate(regras_por_morador)]
+        com_mlr = [funcoes_morador[(tipo_regra, indice == morador_pia, True)] for indice, tipo_regra in enumerate(regras_por_morador)]
+        prefixos = [1]
+        for funcao in sem_mlr[:-1]:
+            prefixos.append(prefixos[-1] * funcao)
+        sufixo = 1
+        for indice in reversed(range(n_moradores)):
+            funcao_apto = funcao_apto + prefixos[indice] * com_mlr[indice] * sufixo
+            sufixo = sufixo * sem_mlr[indice]
+    fmp_apto = sp_fft.irfft(funcao_apto / n_moradores ** 2, n=comprimento_apto, axis=1)
+
+    # 3. Distribuição do prédio: potência da FFT da distribuição do apartamento, em blocos de segundos
+    tamanho_bloco = max(1, ELEMENTOS_POR_BLOCO // comprimento_predio)
+    resultado_quantis = {q: np.zeros(len(segundos)) for q in quantis}
+    for inicio_bloco in range(0, len(segundos), tamanho_bloco):
+        bloco = slice(inicio_bloco, inicio_bloco + tamanho_bloco)
+        funcao_predio = sp_fft.rfft(fmp_apto[bloco], n=comprimento_predio, axis=1, workers=-1) ** total_apartamentos
+        fmp_predio = sp_fft.irfft(funcao_predio, n=comprimento_predio, axis=1, workers=-1)
+        for q, niveis_q in _quantis_da_fmp(fmp_predio, quantis).items():
+            resultado_quantis[q][bloco] = niveis_q * QUANTUM_VAZAO
+
+    resultado = {
+        'tempo': segundos,
+        'media_ts': media_apartamento[segundos] * total_apartamentos,
+        'passo': passo,
+    }
+    for q in quantis:
+        resultado[f'p{q}_ts'] = resultado_quantis[q]
+    resultado['max_media'] = float(np.max(resultado['media_ts']))
+    if 95 in quantis:
+        resultado['max_p95'] = float(np.max(resultado['p95_ts']))
+    return resultado
@@ -0,0 +1,643 @@
+# Motor de simulação Monte Carlo da vazão no prédio (lógica fuzzy + fila de espera dos banheiros).
+#
+# Separado do aplicativo Streamlit para que a simulação possa ser executada sem interface
+# (benchmarks e scripts). O aplicativo coleta os parâmetros, chama estas funções e exibe os resultados.
+
+from time import perf_counter
+
+import numpy as np
+
+import agua_quente
+import amostragem
+import catalogo_aparelhos
+import cauda
+import criterios_parada
+import eventos
+import instrumentacao
+import janelas_moveis
+import memoria
+import regras_fuzzy
+import reservatorio
+import superficie_duracao
+
+# --- FUNÇÃO PARA CÁLCULO DA DURAÇÃO DA MÁQUINA DE LAVAR (NOVA) ---
+def calcular_tempo_enchimento(volume_litros, vazao_L_por_s):
+    """Calcula o tempo (em segundos) necessário para encher a máquina."""
+    if vazao_L_por_s > 0:
+        return volume_litros / vazao_L_por_s
+    return 0
+
+
+# Nomes dos tipos de regra usados no relatório textual
+regras_map_nome = dict(regras_fuzzy.NOMES_PADRAO)
+
+# --- INÍCIO DA ALTERAÇÃO MÁQUINA DE LAVAR (V2) ---
+# Vazão para enchimento da máquina de lavar (L/s) - Constante
+vazao_enchimento_mlr = 0.135 
+
+# Volumes dos modelos de máquina de lavar (L) - Três modelos
+volumes_maquina_lavar = {
+    'pequena': 174,
+    'media': 202,
+    'grande': 260
+}
+# --- FIM DA ALTERAÇÃO MÁQUINA DE LAVAR (V2) ---
+
+# Passos de tempo (s) oferecidos para a grade da simulação; 1 s é a resolução original
+PASSOS_TEMPO = (1, 5, 10, 30)
+
+# Parâmetros dos aparelhos usados pelos motores vetorizado e de convolução (mesma rotina do Monte Carlo):
+# o catálogo dos aparelhos da rotina do banho (ver catalogo_aparelhos) e a máquina de lavar
+aparelhos_convolucao = {
+    'catalogo': catalogo_aparelhos.CATALOGO,
+    'atraso_mlr_apos_pia': 30, # 30s após a pia
+    'atraso_mlr_apos_banho': 120, # 120s após o banho (quando não usa a pia)
+    'vazao_mlr': vazao_enchimento_mlr,
+    'duracoes_mlr': [calcular_tempo_enchimento(volume, vazao_enchimento_mlr) for volume in volumes_maquina_lavar.values()]
+}
+
+
+def construir_modelo_fuzzy(duracao_simulacao, temperatura_minima, temperatura_maxima, passo_tempo=1, regras=None):
+    """
+    Cria as variáveis fuzzy e as funções de pertinência do modelo.
+
+    'passo_tempo' (s) define a grade do universo de início do banho e das séries de vazão.
+    'regras' ({tipo_regra: matriz 5 x 5}, padrão regras_fuzzy.REGRAS_PADRAO) traz os conjuntos de
+    regras, inclusive os personalizados; não é criado nenhum ControlSystemSimulation.
+    'superficies' dá a duração do banho de cada conjunto de regras por interpolação na
+    superfície temperatura x início pré-calculada (ver superficie_duracao), sem chamar o skfuzzy.
+    """
+    # skfuzzy é importado sob demanda: o aplicativo só constrói o modelo ao executar a simulação
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    # Passo 2: Definindo as variáveis fuzzy
+    # O universo para 'inicio_do_banho' deve ir de 0 até a duração total da simulação, no passo da grade
+    universo_inicio = np.append(np.arange(0, duracao_simulacao, passo_tempo), duracao_simulacao)
+    inicio_do_banho = ctrl.Antecedent(universo_inicio, 'inicio_do_banho')
+    temperatura_do_ar = ctrl.Antecedent(np.arange(temperatura_minima, temperatura_maxima + 0.1, 0.1), 'temperatura_do_ar')
+    duracao_do_banho = ctrl.Consequent(np.arange(0, 16, 0.01), 'duracao_do_banho')
+
+    # Passo 3: Definindo funções de pertinência para as variáveis de entrada
+
+    # Calculando os limites para os conjuntos de início do banho
+    # O step_tempo deve ser baseado na duração total da simulação, não apenas no intervalo
+    if duracao_simulacao > 0:
+        step_tempo = duracao_simulacao / 4 # 5 conjuntos, 4 intervalos entre eles
+    else:
+        step_tempo = 1 # Prevent division by zero if duracao_simulacao is 0
+
+
+    inicio_do_banho['Very early'] = fuzz.trimf(inicio_do_banho.universe, [0, 0, step_tempo])
+    inicio_do_banho['Early'] = fuzz.trimf(inicio_do_banho.universe, [0, step_tempo, 2 * step_tempo])
+    inicio_do_banho['On time'] = fuzz.trimf(inicio_do_banho.universe, [step_tempo, 2 * step_tempo, 3 * step_tempo])
+    inicio_do_banho['Delayed'] = fuzz.trimf(inicio_do_banho.universe, [2 * step_tempo, 3 * step_tempo, 4 * step_tempo])
+    inicio_do_banho['Very delayed'] = fuzz.trimf(inicio_do_banho.universe, [3 * step_tempo, 4 * step_tempo, 4 * step_tempo])
+
+
+    # Calculando os limites para os conjuntos de temperatura do ar
+    if temperatura_maxima > temperatura_minima:
+        step_temp = (temperatura_maxima - temperatura_minima) / 4 # 5 conjuntos, 4 intervalos entre eles
+    else:
+        step_temp = 1 # Prevent division by zero
+
+    temperatura_do_ar['Very cold'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima, temperatura_minima, temperatura_minima + step_temp])
+    temperatura_do_ar['Cold'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima, temperatura_minima + step_temp, temperatura_minima + 2 * step_temp])
+    temperatura_do_ar['Pleasant'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + step_temp, temperatura_minima + 2 * step_temp, temperatura_minima + 3 * step_temp])
+    # Corrected Hot and Very Hot ranges to ensure they are within the universe and have correct triangular/trapezoidal shapes
+    temperatura_do_ar['Hot'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + 2 * step_temp, temperatura_minima + 3 * step_temp, temperatura_maxima])
+    temperatura_do_ar['Very hot'] = fuzz.trimf(temperatura_do_ar.universe, [temperatura_minima + 3 * step_temp, temperatura_maxima, temperatura_maxima])
+
+
+    # Passo 4: Definindo funções de pertinência para a variável de saída (Mantido como antes)
+    duracao_do_banho['No shower'] = fuzz.trapmf(duracao_do_banho.universe, [0, 0, 3, 3.01])
+    duracao_do_banho['Very fast'] = fuzz.trimf(duracao_do_banho.universe, [3.02, 3.02, 5])
+    duracao_do_banho['Fast'] = fuzz.trimf(duracao_do_banho.universe, [3, 5, 10])
+    duracao_do_banho['Normal'] = fuzz.trimf(duracao_do_banho.universe, [5, 10, 15])
+    duracao_do_banho['Long'] = fuzz.trimf(duracao_do_banho.universe, [10, 15, 15])
+
+
+    # Passo 5: Regras fuzzy - matrizes 5 x 5 (início x temperatura) de conjuntos de saída (ver regras_fuzzy)
+    if regras is None:
+        regras = regras_fuzzy.REGRAS_PADRAO
+    regras = {tipo_regra: regras_fuzzy.validar_matriz(matriz) for tipo_regra, matriz in regras.items()}
+
+    return {
+        'inicio_do_banho': inicio_do_banho,
+        'temperatura_do_ar': temperatura_do_ar,
+        'duracao_do_banho': duracao_do_banho,
+        'regras': regras,
+        'superficies': superficie_duracao.SuperficiesDuracao(construir_modelo_fuzzy, regras, temperatura_minima, temperatura_maxima),
+        'passo_tempo': passo_tempo
+    }
+
+
+def criar_moradores(total_apartamentos, quantidade_moradores_por_apartamento, regras_por_morador, rng):
+    """Cria a lista de moradores do prédio e sorteia, por apartamento, quem usa a pia e a máquina de lavar."""
+    moradores_predio = []
+
+    # Creating the list of all residents, identified by apartment, type, and rule chosen by the user
+    for apt_num in range(1, total_apartamentos + 1):
+        moradores_no_apartamento = []
+        for morador_num_no_apt in range(1, quantidade_moradores_por_apartamento + 1):
+            # Determine the resident type based on the user's choice
+            tipo_regra_escolhida = regras_por_morador[morador_num_no_apt - 1]
+
+            # ALTERAÇÃO DE NOME SOLICITADA
+            if morador_num_no_apt == 1:
+                nome_morador_interno = 'Morador 1 (Pai)'
+            elif morador_num_no_apt == 2:
+                nome_morador_interno = 'Morador 2 (Mãe)'
+            else:
+                nome_morador_interno = f'Morador {morador_num_no_apt} (Filho)'
+
+            moradores_no_apartamento.append({
+                'nome': nome_morador_interno, # Identificador no apartamento (visualização interna/relatório)
+                'tipo_regra': tipo_regra_escolhida, # 1, 2 ou 3
+                'apartamento': apt_num,
+                'usa_pia': False, # Initialize all as False for kitchen sink
+                'usa_mlr': False, # Máquina de Lavar
+                'fim_pia_simulacao': 0, # Variável para armazenar o fim da pia na simulação (necessário para a lógica da MLR)
+                'inicio_banho_sorteado': 0 # NOVO: Armazena o tempo sorteado para ordenação
+            })
+
+        # Randomly select one resident to use the sink and one for the washing machine in each apartment
+        # (it can be the same resident for both)
+        moradores_no_apartamento[rng.integers(len(moradores_no_apartamento))]['usa_pia'] = True
+        moradores_no_apartamento[rng.integers(len(moradores_no_apartamento))]['usa_mlr'] = True
+        moradores_predio.extend(moradores_no_apartamento)
+
+    # Índice de cada morador na matriz de sorteios do lote
+    for indice_morador, morador in enumerate(moradores_predio):
+        morador['indice_sorteio'] = indice_morador
+
+    return moradores_predio
+
+
+def pontos_da_grade(duracao_simulacao, passo_tempo):
+    """Quantidade de intervalos da grade de tempo (o último pode ser mais curto que o passo)."""
+    return -(-duracao_simulacao // passo_tempo)
+
+
+def simular_iteracao(moradores_predio, uniformes_iteracao, modelo, temperatura_atual, duracao_simulacao,
+                     quantidade_banheiros_por_apartamento, relatorio, avisos, cronometro, acumulador_agua_quente=None,
+                     catalogo=None, uniformes_aparelhos=None):
+    """
+    Executa uma iteração do Monte Carlo e retorna a série de vazão do prédio (L/s em cada
+    intervalo da grade de modelo['passo_tempo'] segundos) como eventos.SerieEsparsa.
+
+    'uniformes_iteracao' é a linha da matriz de sorteios do lote (ver amostragem.sortear_lote).
+    As linhas do relatório textual (se 'relatorio' não for None) e os avisos de erro fuzzy são
+    acrescentados às listas recebidas; o tempo de cada fase é somado no 'cronometro'. Com
+    'acumulador_agua_quente' (agua_quente.AcumuladorAguaQuente), os mesmos eventos são também acumulados
+    como demanda de água quente.
+
+    Os aparelhos da rotina do banho vêm do 'catalogo' (padrão: catalogo_aparelhos.CATALOGO), que pode
+    trazer a duração e o deslocamento sorteados de cada morador (ver catalogo_aparelhos.sortear_tempos);
+    com probabilidades de uso menores que 1, 'uniformes_aparelhos' (moradores x aparelhos, ver
+    catalogo_aparelhos.sortear_uso) decide quais são usados.
+    """
+    marca = perf_counter()
+    registrar = relatorio is not None
+    catalogo = aparelhos_convolucao['catalogo'] if catalogo is None else catalogo
+    linhas_catalogo = list(zip(catalogo['chaves'], catalogo['nomes'], catalogo['vazao'].tolist(), catalogo['referencia'].tolist(),
+                               catalogo['probabilidade'].tolist(), catalogo['ocupa'].tolist(),
+                               catalogo['um_por_apartamento'].tolist()))
+    # Duração e deslocamento de cada morador (uma linha por morador quando sorteados, ver catalogo_aparelhos.sortear_tempos)
+    forma_tempos = (len(moradores_predio), len(linhas_catalogo))
+    duracoes_aparelhos = np.broadcast_to(catalogo['duracao'], forma_tempos).tolist()
+    deslocamentos_aparelhos = np.broadcast_to(catalogo['deslocamento'], forma_tempos).tolist()
+
+    # Intervals [start, end) in seconds during which each fixture is open, with its flow rate.
+    # The building flow series is built from them at the end of the iteration (sparse, by change points).
+    # Each event also records its fixture and apartment (used by the hot-water model).
+    inicios_aparelhos, fins_aparelhos, vazoes_aparelhos = [], [], []
+    nomes_aparelhos, apartamentos_aparelhos = [], []
+
+    def somar_vazao(inicio, fim, vazao, aparelho, apartamento):
+        inicios_aparelhos.append(inicio)
+        fins_aparelhos.append(fim)
+        vazoes_aparelhos.append(vazao)
+        nomes_aparelhos.append(aparelho)
+        apartamentos_aparelhos.append(apartamento - 1)
+
+    # Initialize the occupation state of ALL BATHROOMS IN THE BUILDING.
+    total_apartamentos = moradores_predio[-1]['apartamento']
+    banheiros_livres_em = np.zeros(total_apartamentos * quantidade_banheiros_por_apartamento) # Stores the second when each bathroom will be free
+
+    # --- Sorteia o horário e preenche o campo para ordenação ---
+    for m in moradores_predio:
+        m['inicio_banho_sorteado'] = amostragem.uniforme_para_inteiro(uniformes_iteracao[m['indice_sorteio']], duracao_simulacao)
+        m['sorteio_mlr'] = uniformes_iteracao[len(moradores_predio) + m['indice_sorteio']]
+
+    # --- Ordenar os moradores pelo horário sorteado (SOLUÇÃO 1) ---
+    moradores_predio_ordenado = sorted(moradores_predio, key=lambda m: m['inicio_banho_sorteado'])
+    agora = perf_counter()
+    cronometro.adicionar('sorteios', agora - marca)
+    marca = agora
+
+
+    # --- Simulation logic for each resident and bathroom usage (coleta o relatório) ---
+    # Itera sobre a lista ORDENADA
+    for m in moradores_predio_ordenado:
+        # O horário de início do banho é o sorteado, agora usado em ordem
+        inicio_banho = m['inicio_banho_sorteado']
+
+        # Determine which rule set (duration surface) to use based on the 'tipo_regra' attribute set by the user's choice
+        tipo_regra_num = m['tipo_regra']
+        superficie_morador_atual = modelo['superficies'][tipo_regra_num]
+
+        # Identificação para o relatório
+        # ALTERAÇÃO DE NOME SOLICITADA: 'nome' já está com Morador 1, Morador 2, etc.
+        id_morador = f"{m['nome']} (Apto {m['apartamento']})" if registrar else ""
+
+        # Fuzzy shower duration for the current temperature and start time, interpolated on the precomputed surface
+        try:
+            # Ensure inputs are within the defined universe
+            clipped_inicio_banho = np.clip(inicio_banho, modelo['inicio_do_banho'].universe.min(), modelo['inicio_do_banho'].universe.max())
+
+            dur_banho_minutos = float(superficie_morador_atual.duracao_minutos(temperatura_atual, clipped_inicio_banho / duracao_simulacao))
+            dur_banho_segundos = int(dur_banho_minutos * 60) # Shower duration in seconds
+            agora = perf_counter()
+            cronometro.adicionar('fuzzy', agora - marca)
+            marca = agora
+            fim_banho = inicio_banho + dur_banho_segundos # Fim do banho é usado para o cálculo do início da MLR
+
+            # --- LOG: Duração do Banho e Horário Inicial ---
+            if registrar:
+                regra_nome = regras_map_nome.get(m['tipo_regra'], f"Opção {m['tipo_regra']}")
+                relatorio.append(f"[{id_morador}] (Regra: {regra_nome}, Temp: {temperatura_atual}°C) - Horário inicial sorteado: {inicio_banho}s. Duração fuzzy: {dur_banho_minutos:.2f} min ({dur_banho_segundos}s).")
+
+
+            # --- INÍCIO DA LÓGICA MÁQUINA DE LAVAR (V2: Escolha e Início Condicional) ---
+            usa_mlr_na_simulacao = False
+            inicio_mlr_clamped = 0
+            fim_mlr_clamped = 0
+            nome_volume_escolhido = ""
+            duracao_enchimento_mlr = 0
+
+            # Check if the resident is selected to use the machine in this apartment
+            if m['usa_mlr']:
+                # Check the fuzzy membership for 'On time' or anterior (Early, Very early)
+                pertinencia_delayed = np.interp(clipped_inicio_banho, modelo['inicio_do_banho'].universe, modelo['inicio_do_banho']['Delayed'].mf)
+                pertinencia_very_delayed = np.interp(clipped_inicio_banho, modelo['inicio_do_banho'].universe, modelo['inicio_do_banho']['Very delayed'].mf)
+
+                # Rule: Use the machine if the shower start is NOT primarily Delayed or Very Delayed
+                if pertinencia_delayed + pertinencia_very_delayed < 0.5:
+                    usa_mlr_na_simulacao = True
+
+                    # 1. Escolher o modelo da máquina aleatoriamente
+                    opcoes_volume = list(volumes_maquina_lavar.items())
+                    nome_volume_escolhido, volume_escolhido = opcoes_volume[amostragem.uniforme_para_inteiro(m['sorteio_mlr'], len(opcoes_volume))]
+
+                    # 2. Calcular o tempo de enchimento (duração da vazão)
+                    duracao_enchimento_mlr = calcular_tempo_enchimento(volume_escolhido, vazao_enchimento_mlr)
+
+                    # --- LOG: Máquina de Lavar Escolhida ---
+                    if registrar:
+                        relatorio.append(f"[{id_morador}] **SORTEADO P/ MLR.** Volume: {nome_volume_escolhido} ({volume_escolhido}L). Duração enchimento: {duracao_enchimento_mlr:.0f}s.")
+
+                    # 3. Determinar o início condicional (depende do uso da pia)
+                    inicio_mlr = fim_banho + 120 # 120s após o banho (Default - corrigido depois)
+
+
+                else:
+                    if registrar:
+                        relatorio.append(f"[{id_morador}] **SORTEADO P/ MLR, mas desiste.** (Horário de banho muito atrasado).")
+            # --- FIM DA LÓGICA MÁQUINA DE LAVAR (V2) ---
+
+
+            # Aparelhos do catálogo usados neste banho, com início e fim relativos ao início do banho
+            aparelhos_morador = []
+            antes_banho = depois_banho = 0
+            for j, (chave, nome, vazao, referencia, probabilidade, ocupa, um_por_apartamento) in enumerate(linhas_catalogo):
+                if um_por_apartamento and not m['usa_pia']:
+                    continue
+                if uniformes_aparelhos is not None and uniformes_aparelhos[m['indice_sorteio'], j] >= probabilidade:
+                    continue
+                if referencia == catalogo_aparelhos.DURANTE_BANHO:
+                    inicio_relativo, fim_relativo = 0, dur_banho_segundos
+                else:
+                    inicio_relativo = (deslocamentos_aparelhos[m['indice_sorteio']][j]
+                                       + (dur_banho_segundos if referencia == catalogo_aparelhos.FIM_BANHO else 0))
+                    fim_relativo = inicio_relativo + duracoes_aparelhos[m['indice_sorteio']][j]
+                if ocupa:
+                    antes_banho = max(antes_banho, -inicio_relativo)
+                    depois_banho = max(depois_banho, fim_relativo - dur_banho_segundos)
+                aparelhos_morador.append((chave, nome, vazao, inicio_relativo, fim_relativo))
+
+            # Ocupação vai do início do primeiro ao fim do último aparelho que ocupa o banheiro
+            intervalo_ocupacao_inicio = max(0, inicio_banho - antes_banho)
+            intervalo_ocupacao_fim = min(duracao_simulacao, fim_banho + depois_banho)
+
+
+            # --- INÍCIO DA LÓGICA DE FILA DE ESPERA (ALTERAÇÃO PRINCIPAL) ---
+            apt_num = m['apartamento']
+            primeiro_indice_banheiro_apt = (apt_num - 1) * quantidade_banheiros_por_apartamento
+            ultimo_indice_banheiro_apt = primeiro_indice_banheiro_apt + quantidade_banheiros_por_apartamento - 1
+
+            # 1. Encontrar o banheiro que ficará livre mais cedo dentro do apartamento
+            # Isso garante que SEMPRE haverá um banheiro a ser usado (mesmo que com espera)
+            banheiros_do_apt = banheiros_livres_em[primeiro_indice_banheiro_apt : ultimo_indice_banheiro_apt + 1]
+
+            # Encontra o índice LOCAL do banheiro que estará livre mais cedo (ou agora)
+            banheiro_usado_idx_local = np.argmin(banheiros_do_apt)
+            # Converte para o índice GLOBAL
+            banheiro_disponivel_indice_global = primeiro_indice_banheiro_apt + banheiro_usado_idx_local
+            tempo_liberacao_banheiro = banheiros_livres_em[banheiro_disponivel_indice_global]
+
+
+            # 2. Determinar o Início Real da Rotina (Espera ou Imediato)
+            # O uso real só pode começar após o tempo de liberação do banheiro E não antes do tempo sorteado
+            tempo_inicio_rotina_real = max(intervalo_ocupacao_inicio, tempo_liberacao_banheiro)
+
+            # 3. Se houve espera, recalcular todos os tempos
+            if tempo_inicio_rotina_real > intervalo_ocupacao_inicio:
+                tempo_espera = tempo_inicio_rotina_real - intervalo_ocupacao_inicio
+
+                # Atualiza a variável base do banho para o novo início
+                inicio_banho = tempo_inicio_rotina_real
+
+                # Recalcula as dependências com o novo início do banho
+                fim_banho = inicio_banho + dur_banho_segundos
+
+                # Atualiza os intervalos de ocupação
+                intervalo_ocupacao_inicio = max(0, inicio_banho - antes_banho)
+                intervalo_ocupacao_fim = min(duracao_simulacao, fim_banho + depois_banho)
+
+                if registrar:
+                    relatorio.append(f"[{id_morador}] **AGUARDA {tempo_espera:.0f}s** (Banheiro {banheiro_usado_idx_local + 1} livre em {tempo_liberacao_banheiro:.0f}s). Novo Início: {tempo_inicio_rotina_real:.0f}s.")
+            else:
+                # Não houve espera, usa no tempo sorteado
+                if registrar:
+                    relatorio.append(f"[{id_morador}] **USA BANHEIRO {banheiro_usado_idx_local + 1}** (Livre em: {intervalo_ocupacao_fim:.0f}s).")
+
+            # 4. Ocupa o banheiro com o novo tempo de liberação
+            # (O tempo final de ocupação é o mesmo, mas o início pode ter sido atrasado)
+            banheiros_livres_em[banheiro_disponivel_indice_global] = intervalo_ocupacao_fim
+            # --- FIM DA LÓGICA DE FILA DE ESPERA ---
+            agora = perf_counter()
+            cronometro.adicionar('fila', agora - marca)
+            marca = agora
+
+
+            # --- LÓGICA DE VAZÃO (usa as variáveis que podem ter sido ajustadas) ---
+
+            # Aparelhos do catálogo (o que começaria antes do início da simulação começa nele, com a mesma duração)
+            m['fim_pia_simulacao'] = 0
+            for chave, nome, vazao, inicio_relativo, fim_relativo in aparelhos_morador:
+                inicio_aparelho = max(0, inicio_banho + inicio_relativo)
+                inicio_aparelho_clamped = int(inicio_aparelho)
+                fim_aparelho_clamped = int(min(duracao_simulacao, inicio_aparelho + fim_relativo - inicio_relativo))
+                if fim_aparelho_clamped > inicio_aparelho_clamped:
+                    somar_vazao(inicio_aparelho_clamped, fim_aparelho_clamped, vazao, chave, m['apartamento'])
+                    if chave == catalogo_aparelhos.APARELHO_ANTES_MLR:
+                        m['fim_pia_simulacao'] = fim_aparelho_clamped
+                    if registrar:
+                        relatorio.append(f"  - {nome} ({vazao}L/s): {inicio_aparelho_clamped}s a {fim_aparelho_clamped}s.")
+                elif registrar:
+                    relatorio.append(f"  - {nome}: Não usado (tempo fora do intervalo).")
+
+
+            # --- MLR (Ajuste Final e Vazão) ---
+            if usa_mlr_na_simulacao:
+                # Recalcula o início da MLR com base no NOVO fim_banho/fim_pia
+                if m['fim_pia_simulacao'] > 0:
+                    inicio_mlr = m['fim_pia_simulacao'] + 30 
+                    motivo_inicio = "30s após Pia"
+                else:
+                    inicio_mlr = fim_banho + 120 
+                    motivo_inicio = "120s após Banho"
+
+                # Re-Clampa os limites
+                inicio_mlr_clamped = int(max(0, inicio_mlr))
+                fim_mlr_clamped = int(min(duracao_simulacao, inicio_mlr + int(duracao_enchimento_mlr)))
+
+                # Adiciona a vazão
+                if fim_mlr_clamped > inicio_mlr_clamped:
+                    somar_vazao(inicio_mlr_clamped, fim_mlr_clamped, vazao_enchimento_mlr, 'mlr', m['apartamento'])
+                    if registrar:
+                        relatorio.append(f"[{id_morador}] **USA MLR ({nome_volume_escolhido}).** Início: {motivo_inicio}. Vazão ({vazao_enchimento_mlr}L/s): {inicio_mlr_clamped}s a {fim_mlr_clamped}s.")
+                else:
+                    if registrar:
+                        relatorio.append(f"[{id_morador}] MLR Cancelada (tempo fora do intervalo).")
+
+            agora = perf_counter()
+            cronometro.adicionar('vazao', agora - marca)
+            marca = agora
+
+        except ValueError as e:
+                avisos.append(f"Erro na computação fuzzy para morador {m['nome']} do apto {m['apartamento']} na temperatura {temperatura_atual}°C: {e}")
+                marca = perf_counter()
+
+    passo_tempo = modelo['passo_tempo']
+    vazao_simulacao = eventos.SerieEsparsa.de_intervalos(inicios_aparelhos, fins_aparelhos, vazoes_aparelhos,
+                                                         pontos_da_grade(duracao_simulacao, passo_tempo), passo_tempo)
+    cronometro.adicionar('vazao', perf_counter() - marca)
+    if acumulador_agua_quente is not None:
+        with cronometro.medir('agua_quente'):
+            acumulador_agua_quente.adicionar(inicios_aparelhos, fins_aparelhos, vazoes_aparelhos, nomes_aparelhos,
+                                             apartamentos_aparelhos, temperatura_atual)
+    return vazao_simulacao
+
+
+def simular_temperatura(temperatura_atual, moradores_predio, modelo, duracao_simulacao, quantidade_banheiros_por_apartamento,
+                        n_lotes_minimo, tamanho_do_lote_k, limiar_convergencia, n_simulacoes_maximo,
+                        metodo_amostragem="aleatoria", criterio_parada="medias_lotes", precisao_relativa=0.005,
+                        estimar_cauda=False, gerar_relatorio=False, orcamento_memoria_mb=None, rng=None,
+                        ao_progresso=None, ao_concluir_lote=None, gravador_series=None, janelas_s=(),
+                        parametros_reservatorio=None, parametros_agua_quente=None, catalogo=None):
+    """
+    Executa o Monte Carlo para uma temperatura até a convergência (ou até n_simulacoes_maximo).
+
+    'ao_progresso(i)' é chamado a cada iteração e 'ao_concluir_lote(monitor, n_iteracoes, convergiu)'
+    ao fim de cada lote (usados pela interface para a barra de progresso e o status).
+    Se as séries guardadas ultrapassarem 'orcamento_memoria_mb', a média e os percentis passam a
+    ser calculados em fluxo (ver memoria.AcumuladorVazao). Com 'gravador_series', a série de cada
+    iteração é gravada em disco (ver armazem_series); 'janelas_s' lista as janelas (s) das vazões
+    médias móveis (ver janelas_moveis); 'parametros_reservatorio' ativa o cálculo do reservatório
+    (ver reservatorio) e 'parametros_agua_quente' o da demanda de água quente e do aquecedor
+    (ver agua_quente). 'catalogo' traz os aparelhos da rotina do banho (ver catalogo_aparelhos).
+    Retorna o dicionário de resultados da temperatura, incluindo o tempo gasto em cada fase.
+    """
+    cronometro = instrumentacao.CronometroFases()
+    rng = np.random.default_rng() if rng is None else rng
+    catalogo = aparelhos_convolucao['catalogo'] if catalogo is None else catalogo
+    # Relatório textual: só é mantido o da última iteração
+    relatorio_simulacao_temp = [] if gerar_relatorio else None
+    avisos = []
+    acumulador_agua_quente = (agua_quente.AcumuladorAguaQuente(
+        parametros_agua_quente, pontos_da_grade(duracao_simulacao, modelo['passo_tempo']), modelo['passo_tempo'],
+        moradores_predio[-1]['apartamento'], orcamento_memoria_mb, catalogo_aparelhos.temperaturas_uso(catalogo))
+        if parametros_agua_quente else None)
+
+    def simular(uniformes_iteracao):
+        if relatorio_simulacao_temp is not None:
+            relatorio_simulacao_temp.clear()
+        # Uso, durações e deslocamentos dos aparelhos: sorteados de uma vez para todos os moradores
+        with cronometro.medir('sorteios'):
+            uniformes_aparelhos = catalogo_aparelhos.sortear_uso(catalogo, len(moradores_predio), rng)
+            catalogo_iteracao = catalogo_aparelhos.sortear_tempos(catalogo, len(moradores_predio), rng)
+        return simular_iteracao(moradores_predio, uniformes_iteracao, modelo, temperatura_atual, duracao_simulacao,
+                                quantidade_banheiros_por_apartamento, relatorio_simulacao_temp, avisos, cronometro,
+                                acumulador_agua_quente, catalogo_iteracao, uniformes_aparelhos)
+
+    resultados = executar_monte_carlo(
+        simular, len(moradores_predio), duracao_simulacao, modelo['passo_tempo'], n_lotes_minimo, tamanho_do_lote_k,
+        limiar_convergencia, n_simulacoes_maximo, metodo_amostragem, criterio_parada, precisao_relativa, estimar_cauda,
+        orcamento_memoria_mb, rng, ao_progresso, ao_concluir_lote, cronometro, gravador_series, janelas_s,
+        parametros_reservatorio)
+    resultados['relatorio'] = relatorio_simulacao_temp if gerar_relatorio else [] # Text report of the last iteration
+    resultados['avisos'] = avisos # Fuzzy computation errors
+    resultados['agua_quente'] = None # Hot-water demand and heater capacity (None if not requested)
+    if acumulador_agua_quente is not None:
+        with resultados['cronometro'].medir('agua_quente'):
+            resultados['agua_quente'] = acumulador_agua_quente.finalizar()
+    return resultados
+
+
+def executar_monte_carlo(simular, total_sorteios, duracao_simulacao, passo_tempo, n_lotes_minimo, tamanho_do_lote_k,
+                         limiar_convergencia, n_simulacoes_maximo, metodo_amostragem, criterio_parada, precisao_relativa,
+                         estimar_cauda, orcamento_memoria_mb, rng, ao_progresso, ao_concluir_lote, cronometro,
+                         gravador_series=None, janelas_s=(), parametros_reservatorio=None):
+    """
+    Laço do Monte Carlo em lotes: sorteios, acúmulo das séries, critério de parada e estatísticas finais.
+
+    'simular(uniformes_iteracao)' executa uma iteração e retorna sua eventos.SerieEsparsa; os
+    uniformes vêm de amostragem.sortear_lote com 'total_sorteios' moradores (ou eventos de banho).
+    Com 'gravador_series' (armazem_series.GravadorSeries), a série de cada iteração é também
+    gravada em disco para reanálise. 'janelas_s' lista as janelas (s) das vazões médias móveis
+    (ver janelas_moveis), acumuladas na mesma passada. 'parametros_reservatorio' ({'vazao_reposicao',
+    'volume', 'nivel_servico'}) ativa o cálculo do reservatório (ver reservatorio).
+    """
+    # Gerador usado para os sorteios e para as sementes das réplicas QMC de cada lote
+    rng_amostragem = np.random.default_rng() if rng is None else rng
+
+    # Flow rate time series of each Monte Carlo simulation for this temperature (or streaming statistics)
+    acumulador = memoria.AcumuladorVazao(pontos_da_grade(duracao_simulacao, passo_tempo), orcamento_memoria_mb)
+    acumulador_janelas = (janelas_moveis.AcumuladorJanelas(janelas_s, passo_tempo, acumulador.n_pontos, acumulador)
+                          if janelas_s else None)
+    acumulador_reservatorio = (reservatorio.AcumuladorReservatorio(passo_tempo=passo_tempo, **parametros_reservatorio)
+                               if parametros_reservatorio else None)
+    # Series of the current batch (used for the batch P95)
+    resultados_vazao_lote = []
+    rss_pico_mb = memoria.rss_atual_mb()
+
+    # --- VARIÁVEIS PARA A NOVA LÓGICA DE CONVERGÊNCIA (Lotes) ---
+    monitor_parada = criterios_parada.MonitorParada(criterio_parada, n_lotes_minimo, limiar_convergencia, precisao_relativa)
+    convergencia_atingida = False
+
+    # Pico de vazão de cada iteração (usado para medir a redução de variância obtida)
+    picos_iteracao = []
+
+    # Monte Carlo simulation loop
+    # We use n_simulacoes_maximo as an upper limit, but the loop can stop earlier due to convergence
+    for i in range(n_simulacoes_maximo):
+        if ao_progresso is not None:
+            with cronometro.medir('interface'):
+                ao_progresso(i)
+
+        # --- Sorteia os uniformes do lote (aleatórios, Sobol ou LHS) no início de cada lote ---
+        if i % tamanho_do_lote_k == 0:
+            with cronometro.medir('sorteios'):
+                uniformes_lote = amostragem.sortear_lote(metodo_amostragem, tamanho_do_lote_k, total_sorteios, rng_amostragem)
+
+        vazao_simulacao = simular(uniformes_lote[i % tamanho_do_lote_k])
+
+        # Add the flow rate time series of this simulation to the results for this temperature
+        with cronometro.medir('estatisticas'):
+            acumulador.adicionar(vazao_simulacao)
+            if acumulador_janelas is not None:
+                acumulador_janelas.adicionar(vazao_simulacao)
+        resultados_vazao_lote.append(vazao_simulacao)
+        picos_iteracao.append(vazao_simulacao.pico())
+        if gravador_series is not None:
+            with cronometro.medir('gravacao'):
+                gravador_series.adicionar(vazao_simulacao)
+        if acumulador_reservatorio is not None:
+            with cronometro.medir('reservatorio'):
+                acumulador_reservatorio.adicionar(vazao_simulacao)
+
+        # --- INÍCIO DA ALTERAÇÃO 3: LÓGICA DE CONVERGÊNCIA POR ERRO PADRÃO DO P95 ---
+        # A verificação ocorre apenas se o número de simulações for um múltiplo de k
+        if (i + 1) % tamanho_do_lote_k == 0:
+            marca = perf_counter()
+
+            # 1. Estatística do LOTE isolado: máximo do P95 TS das últimas 'k' simulações.
+            # Lotes distintos são independentes, então o erro padrão entre lotes é válido (Batch Means).
+            _, p95_lote = eventos.estatisticas_por_instante(resultados_vazao_lote, acumulador.n_pontos, quantis=(95,))
+            max_p95_lote = np.max(p95_lote[95])
+            resultados_vazao_lote = []
+
+            # 2. Critério original: P95 sobre TODAS as simulações acumuladas (só calculado se escolhido,
+            # pois refaz o percentil sobre todos os dados a cada lote)
+            max_p95_cumulativo = None
+            if criterio_parada == 'cumulativo':
+                max_p95_cumulativo = acumulador.max_p95()
+
+            # 3. Teste de Parada Estatístico (apenas se M >= M_min)
+            convergencia_atingida = monitor_parada.registrar_lote(max_p95_lote, i + 1, max_p95_cumulativo)
+            cronometro.adicionar('convergencia', perf_counter() - marca)
+            rss_pico_mb = max(rss_pico_mb, memoria.rss_atual_mb())
+            if ao_concluir_lote is not None:
+                with cronometro.medir('interface'):
+                    ao_concluir_lote(monitor_parada, i + 1, convergencia_atingida)
+
+            if convergencia_atingida:
+                break
+        # --- FIM DA ALTERAÇÃO 3: LÓGICA DE CONVERGÊNCIA POR ERRO PADRÃO DO P95 ---
+
+    # After all Monte Carlo simulations for this temperature (until convergence or maximum), calculate statistics
+    marca = perf_counter()
+    del resultados_vazao_lote
+
+    # Calculate the mean, P5, and P95 over time (for each second) using the final results
+    media_vazao_ts, p5_vazao_ts, p95_vazao_ts = acumulador.finalizar()
+    rss_pico_mb = max(rss_pico_mb, memoria.rss_atual_mb())
+
+    # Calculate general statistics (maximum mean, maximum P95) over the entire simulation
+    max_media_vazao = np.max(media_vazao_ts)
+    max_p95_vazao = np.max(p95_vazao_ts)
+
+    # Redução de variância do pico por iteração em relação à amostragem simples
+    fator_reducao = amostragem.fator_reducao_variancia(picos_iteracao, tamanho_do_lote_k)
+
+    # Quantis altos do pico por iteração (modo de cauda)
+    cauda_empirica = cauda.quantis_empiricos(picos_iteracao) if estimar_cauda else None
+    cauda_gpd = cauda.quantis_gpd(picos_iteracao, rng=rng_amostragem) if estimar_cauda else None
+    cronometro.adicionar('estatisticas', perf_counter() - marca)
+
+    reservatorio_final = None
+    if acumulador_reservatorio is not None:
+        with cronometro.medir('reservatorio'):
+            reservatorio_final = acumulador_reservatorio.finalizar()
+
+    # Store the statistical results and time series for this temperature
+    return {
+        'media_ts': media_vazao_ts, # Mean time series
+        'p5_ts': p5_vazao_ts,        # P5 time series
+        'p95_ts': p95_vazao_ts,      # P95 time series
+        'max_media': max_media_vazao, # Maximum mean over time
+        'max_p95': max_p95_vazao,    # Maximum P95 over time
+        'tempo': np.arange(pontos_da_grade(duracao_simulacao, passo_tempo)) * passo_tempo, # The time x-axis (start of each grid interval, s)
+        'passo_tempo': passo_tempo, # Grid step (s)
+        'n_iteracoes': acumulador.n_iteracoes, # Iterations actually run
+        'n_lotes': monitor_parada.n_lotes, # Completed batches
+        'convergencia_atingida': convergencia_atingida,
+        'erro_padrao': monitor_parada.erro_padrao, # Standard error at the last check (None if < M_min batches)
+        'fator_reducao_variancia': fator_reducao, # Variance reduction vs. plain sampling (None if < 2 batches)
+        'cauda_empirica': cauda_empirica, # Empirical high quantiles of the per-iteration peak
+        'cauda_gpd': cauda_gpd, # GPD tail-fit quantiles of the per-iteration peak
+        'diagnostico_parada': monitor_parada.diagnostico(acumulador.n_iteracoes, n_simulacoes_maximo), # Which rule stopped the run
+        'historico_convergencia': monitor_parada.historico(), # Per-batch statistic, running mean and standard error
+        'janelas_moveis': acumulador_janelas.finalizar() if acumulador_janelas is not None else {}, # Rolling-window mean flows
+        'reservatorio': reservatorio_final, # Required storage volume and minimum refill rate (None if not requested)
+        'cronometro': cronometro, # Time spent in each phase of the run loop
+        'memoria': { # Memory accounting of this run
+            'orcamento_mb': orcamento_memoria_mb,
+            'em_fluxo': acumulador.em_fluxo, # Budget reached: P5/P95 estimated by streaming P²
+            'iteracao_troca': acumulador.iteracao_troca,
+            'pico_armazenado_mb': acumulador.pico_bytes / 2**20, # Series held by this run
+            'rss_pico_mb': rss_pico_mb # Whole process (shared by all sessions)
+        }
+    }
@@ -0,0 +1,170 @@
+# Conjuntos de regras fuzzy da duração do banho, definidos uma única vez como matrizes 5 x 5.
+#
+# Cada conjunto de regras é uma matriz regras[indice_inicio, indice_temperatura] com o índice do
+# conjunto de saída da duração (0 = 'No shower' ... 4 = 'Long'). A mesma matriz é compilada:
+#   - na inferência Mamdani vetorizada (inferir_duracao), que constrói as superfícies de duração
+#     (superficie_duracao) sem ControlSystemSimulation: mínimo entre as pertinências de entrada,
+#     máximo por conjunto de saída, corte das funções de saída e centroide por produto matricial;
+#   - nas tabelas de regras exibidas no aplicativo (tabela_exibicao);
+#   - em regras ctrl.Rule do skfuzzy (compilar_regras), usadas apenas como referência/conferência.
+# Conjuntos personalizados (ex.: um 4º perfil "idoso") são lidos de CSV (ler_regras_csv) ou
+# editados na barra lateral, e recebem os números seguintes aos dos conjuntos padrão.
+
+import numpy as np
+
+# Conjuntos das variáveis fuzzy, na ordem das linhas/colunas/valores das matrizes
+CONJUNTOS_INICIO = ['Very early', 'Early', 'On time', 'Delayed', 'Very delayed']
+CONJUNTOS_TEMPERATURA = ['Very cold', 'Cold', 'Pleasant', 'Hot', 'Very hot']
+CONJUNTOS_DURACAO = ['No shower', 'Very fast', 'Fast', 'Normal', 'Long']
+
+# Nomes exibidos no aplicativo, na mesma ordem
+ROTULOS_INICIO = ["Muito Cedo", "Cedo", "Na Hora", "Atrasado", "Muito Atrasado"]
+ROTULOS_TEMPERATURA = ["Muito Frio", "Frio", "Agradável", "Quente", "Muito Quente"]
+ROTULOS_DURACAO = ["Sem Banho", "Muito Rápido", "Rápido", "Normal", "Longo"]
+
+# Conjuntos de regras padrão: linhas = início do banho, colunas = temperatura do ar
+REGRAS_PADRAO = {
+    # Morador 1 (Pai): mais sensível ao frio e pontual
+    1: np.array([
+        [1, 2, 3, 3, 4],  # Very early
+        [1, 2, 3, 3, 4],  # Early
+        [1, 2, 2, 3, 3],  # On time
+        [0, 0, 0, 1, 1],  # Delayed
+        [0, 0, 0, 0, 0],  # Very delayed
+    ], dtype=np.int8),
+    # Morador 2 (Mãe): uso mais longo em temperaturas altas
+    2: np.array([
+        [1, 2, 2, 3, 3],
+        [1, 2, 2, 3, 4],
+        [1, 2, 2, 3, 3],
+        [0, 0, 0, 1, 1],
+        [0, 0, 0, 0, 0],
+    ], dtype=np.int8),
+    # Morador 3+ (Filho): mais tolerante a atrasos e não toma banho no frio
+    3: np.array([
+        [0, 0, 2, 4, 4],
+        [0, 0, 3, 3, 3],
+        [0, 0, 3, 4, 4],
+        [0, 0, 0, 1, 1],
+        [0, 0, 0, 0, 0],
+    ], dtype=np.int8),
+}
+
+NOMES_PADRAO = {1: "Morador 1 (Pai)", 2: "Morador 2 (Mãe)", 3: "Morador 3+ (Filho)"}
+
+
+def validar_matriz(regras):
+    """Converte para matriz 5 x 5 de índices de saída (int8), verificando a forma e os valores."""
+    matriz = np.asarray(regras)
+    if matriz.shape != (len(CONJUNTOS_INICIO), len(CONJUNTOS_TEMPERATURA)):
+        raise ValueError(f"O conjunto de regras deve ser uma matriz {len(CONJUNTOS_INICIO)} x {len(CONJUNTOS_TEMPERATURA)} "
+                         "(início do banho x temperatura do ar).")
+    if not np.issubdtype(matriz.dtype, np.integer) or matriz.min() < 0 or matriz.max() >= len(CONJUNTOS_DURACAO):
+        raise ValueError(f"Cada regra deve indicar um conjunto de duração de 0 a {len(CONJUNTOS_DURACAO) - 1}.")
+    return matriz.astype(np.int8)
+
+
+def indice_duracao(valor):
+    """Índice do conjunto de duração a partir do nome (em inglês ou português) ou do próprio índice."""
+    texto = str(valor).strip()
+    for nomes in (CONJUNTOS_DURACAO, ROTULOS_DURACAO):
+        for indice, nome in enumerate(nomes):
+            if texto.lower() == nome.lower():
+                return indice
+    if texto.isdigit() and int(texto) < len(CONJUNTOS_DURACAO):
+        return int(texto)
+    raise ValueError(f"Duração '{texto}' desconhecida: use {', '.join(ROTULOS_DURACAO)} ou um índice de 0 a {len(CONJUNTOS_DURACAO) - 1}.")
+
+
+def ler_regras_csv(arquivo):
+    """
+    Lê um conjunto de regras de um CSV: uma linha por conjunto de temperatura (Muito Frio ... Muito
+    Quente) e uma coluna por conjunto de início (Muito Cedo ... Muito Atrasado), como nas tabelas do
+    aplicativo. Uma primeira coluna com os nomes das temperaturas é opcional; as células aceitam o nome
+    da duração (em português ou inglês) ou o índice de 0 a 4. Aceita ';' ou ',' como separador.
+    """
+    import pandas as pd
+
+    tabela = pd.read_csv(arquivo, sep=None, engine='python', dtype=str)
+    if tabela.shape[1] == len(CONJUNTOS_INICIO) + 1:
+        tabela = tabela.iloc[:, 1:]
+    if tabela.shape != (len(CONJUNTOS_TEMPERATURA), len(CONJUNTOS_INICIO)):
+        raise ValueError(f"O CSV de regras deve ter {len(CONJUNTOS_TEMPERATURA)} linhas (temperaturas) e "
+                         f"{len(CONJUNTOS_INICIO)} colunas (horários de início).")
+    return validar_matriz(tabela.map(indice_duracao).to_numpy(dtype=np.int64).T)
+
+
+def matriz_de_rotulos(tabela):
+    """Converte uma tabela de exibição (temperatura x início, com os nomes das durações) em matriz de regras."""
+    return validar_matriz(np.vectorize(indice_duracao)(np.asarray(tabela, dtype=object)).astype(np.int64).T)
+
+
+def tabela_exibicao(regras):
+    """Tabela exibida no aplicativo: {temperatura: [duração para cada início]} com os nomes em português."""
+    return {
+        rotulo_temperatura: [ROTULOS_DURACAO[indice] for indice in regras[:, j]]
+        for j, rotulo_temperatura in enumerate(ROTULOS_TEMPERATURA)
+    }
+
+
+def compilar_regras(regras, inicio_do_banho, temperatura_do_ar, duracao_do_banho):
+    """Regras ctrl.Rule do skfuzzy equivalentes à matriz (referência para conferir a inferência vetorizada)."""
+    from skfuzzy import control as ctrl
+
+    return [
+        ctrl.Rule(temperatura_do_ar[CONJUNTOS_TEMPERATURA[j]] & inicio_do_banho[CONJUNTOS_INICIO[i]],
+                  duracao_do_banho[CONJUNTOS_DURACAO[regras[i, j]]])
+        for i in range(len(CONJUNTOS_INICIO)) for j in range(len(CONJUNTOS_TEMPERATURA))
+    ]
+
+
+def criar_simulador(regras, modelo):
+    """ControlSystemSimulation do skfuzzy para a matriz de regras, com as variáveis do modelo."""
+    from skfuzzy import control as ctrl
+
+    return ctrl.ControlSystemSimulation(ctrl.ControlSystem(compilar_regras(
+        regras, modelo['inicio_do_banho'], modelo['temperatura_do_ar'], modelo['duracao_do_banho'])))
+
+
+def _pertinencias(variavel, conjuntos, valores):
+    """Pertinência (n_valores x n_conjuntos) por interpolação nas funções amostradas, como no skfuzzy."""
+    valores = np.clip(valores, variavel.universe.min(), variavel.universe.max())
+    return np.stack([np.interp(valores, variavel.universe, variavel[conjunto].mf) for conjunto in conjuntos], axis=1)
+
+
+def _pesos_centroide(universo):
+    """Pesos w e a tais que centroide = (mf @ w) / (mf @ a) para a mf linear por partes no universo."""
+    dx = np.diff(universo)
+    pesos_area = np.zeros(len(universo))
+    pesos_area[:-1] += dx / 2
+    pesos_area[1:] += dx / 2
+    pesos_momento = np.zeros(len(universo))
+    pesos_momento[:-1] += dx * (2 * universo[:-1] + universo[1:]) / 6
+    pesos_momento[1:] += dx * (universo[:-1] + 2 * universo[1:]) / 6
+    return pesos_momento, pesos_area
+
+
+def inferir_duracao(regras, modelo, inicios, temperaturas):
+    """
+    Duração do banho (min) pela inferência Mamdani vetorizada da matriz de regras.
+
+    Mesma inferência do skfuzzy (E = mínimo, acumulação = máximo, centroide), avaliada para todos os
+    pontos de uma vez; a única diferença é que o centroide usa o universo de saída sem os pontos de
+    corte que o skfuzzy acrescenta, o que altera a duração em menos de um segundo.
+    Memória: n_pontos x tamanho do universo de saída (1600) valores por conjunto de saída.
+    """
+    pertinencia_inicio = _pertinencias(modelo['inicio_do_banho'], CONJUNTOS_INICIO, inicios)
+    pertinencia_temperatura = _pertinencias(modelo['temperatura_do_ar'], CONJUNTOS_TEMPERATURA, temperaturas)
+    # Ativação de cada regra: mínimo das pertinências (n_pontos x início x temperatura)
+    ativacao_regras = np.minimum(pertinencia_inicio[:, :, None], pertinencia_temperatura[:, None, :])
+
+    duracao_do_banho = modelo['duracao_do_banho']
+    agregada = np.zeros((len(ativacao_regras), len(duracao_do_banho.universe)))
+    for indice, conjunto in enumerate(CONJUNTOS_DURACAO):
+        if not (regras == indice).any():
+            continue
+        corte = ativacao_regras[:, regras == indice].max(axis=1)
+        np.maximum(agregada, np.minimum(corte[:, None], duracao_do_banho[conjunto].mf), out=agregada)
+
+    pesos_momento, pesos_area = _pesos_centroide(duracao_do_banho.universe)
+    return (agregada @ pesos_momento) / np.fmax(agregada @ pesos_area, np.finfo(float).eps)
@@ -0,0 +1,111 @@
+# Reservatório: volume de reservação e vazão de reposição a partir das séries de vazão simuladas.
+#
+# O reservatório começa cheio e é reabastecido a uma vazão constante R (L/s). O déficit em cada
+# instante segue a recursão de Lindley, D(t) = max(0, D(t - 1) + (Q(t) - R) x passo), que tem
+# forma fechada: com o saldo acumulado C(t) = soma de (Q - R) x passo até t, D(t) = C(t) - min(0,
+# min de C até t). O volume necessário numa iteração é o maior déficit: uma soma acumulada e um
+# mínimo acumulado (np.minimum.accumulate), vetorizados sobre um bloco de iterações.
+# Como a vazão é constante por trechos (eventos.SerieEsparsa), C é linear em cada trecho e o
+# maior déficit e o menor saldo só podem ocorrer no fim de um trecho: basta avaliar C nos pontos
+# de mudança (algumas centenas por iteração em vez de um valor por instante). As iterações de um
+# bloco são alinhadas completando as mais curtas com trechos de duração zero.
+# A menor vazão de reposição que atende um volume V em cada iteração sai por bisseção, também
+# vetorizada sobre o bloco: o volume necessário só diminui com R; entre a média da demanda menos
+# V / duração (abaixo disso falta água) e o pico da iteração (acima disso o déficit nunca cresce).
+# Sobre todas as iterações, o quantil do nível de serviço (ex.: 95%) dá o volume a reservar
+# para a reposição escolhida e a reposição mínima para o volume escolhido.
+
+import numpy as np
+
+import eventos
+
+# Passos da bisseção da vazão de reposição (precisão de pico / 2^20)
+PASSOS_BISSECAO = 20
+
+
+def volumes_necessarios(vazoes, duracoes, vazao_reposicao, passo_tempo):
+    """
+    Volume (L) que um reservatório inicialmente cheio precisa para não esvaziar, por iteração.
+
+    'vazoes' (L/s) e 'duracoes' (pontos da grade) são matrizes n_iteracoes x n_trechos com os
+    trechos de vazão constante de cada iteração (uma série densa é o caso de duração 1);
+    'vazao_reposicao' é um valor ou um vetor com a reposição (L/s) de cada iteração.
+    """
+    reposicao = np.reshape(vazao_reposicao, (-1, 1))
+    saldo = np.cumsum((vazoes - reposicao) * duracoes * passo_tempo, axis=1)
+    minimo = np.minimum(np.minimum.accumulate(saldo, axis=1), 0.0)
+    return np.max(saldo - minimo, axis=1)
+
+
+def reposicoes_minimas(vazoes, duracoes, volume, passo_tempo):
+    """Menor vazão de reposição (L/s) com que um reservatório de 'volume' L não esvazia, por iteração."""
+    pontos = duracoes.sum(axis=1)
+    inferior = np.maximum(((vazoes * duracoes).sum(axis=1) - volume / passo_tempo) / pontos, 0.0)
+    superior = vazoes.max(axis=1)
+    for _ in range(PASSOS_BISSECAO):
+        meio = (inferior + superior) / 2
+        atende = volumes_necessarios(vazoes, duracoes, meio, passo_tempo) <= volume
+        superior = np.where(atende, meio, superior)
+        inferior = np.where(atende, inferior, meio)
+    return superior
+
+
+def _trechos(series):
+    """Matrizes (vazoes, duracoes) dos trechos de uma lista de SerieEsparsa, completadas com duração zero."""
+    n_trechos = max(len(serie.vazoes) for serie in series)
+    vazoes = np.zeros((len(series), n_trechos))
+    duracoes = np.zeros((len(series), n_trechos))
+    for i, serie in enumerate(series):
+        vazoes[i, :len(serie.vazoes)] = serie.vazoes
+        duracoes[i, :len(serie.vazoes)] = np.diff(np.append(serie.tempos, serie.n_pontos))
+    return vazoes, duracoes
+
+
+class AcumuladorReservatorio:
+    """
+    Volume necessário e reposição mínima de cada iteração, calculados sobre os trechos das séries
+    esparsas em blocos de iterações.
+
+    'vazao_reposicao' (L/s) e 'volume' (L) são o reservatório avaliado; 'nivel_servico' (%) é a
+    fração de iterações que deve ser atendida.
+    """
+
+    def __init__(self, vazao_reposicao, volume, nivel_servico, passo_tempo):
+        self.vazao_reposicao = vazao_reposicao
+        self.volume = volume
+        self.nivel_servico = nivel_servico
+        self.passo_tempo = passo_tempo
+        self.pendentes = []
+        self.trechos_pendentes = 0
+        self.volumes = []
+        self.reposicoes = []
+
+    def adicionar(self, vazao):
+        self.pendentes.append(vazao)
+        self.trechos_pendentes += len(vazao.vazoes)
+        # O bloco e os temporários da bisseção (saldo, mínimo acumulado...) ficam perto de ELEMENTOS_POR_BLOCO
+        if self.trechos_pendentes >= eventos.ELEMENTOS_POR_BLOCO // 4:
+            self._processar()
+
+    def _processar(self):
+        if not self.pendentes:
+            return
+        vazoes, duracoes = _trechos(self.pendentes)
+        self.pendentes, self.trechos_pendentes = [], 0
+        self.volumes.append(volumes_necessarios(vazoes, duracoes, self.vazao_reposicao, self.passo_tempo))
+        self.reposicoes.append(reposicoes_minimas(vazoes, duracoes, self.volume, self.passo_tempo))
+
+    def finalizar(self):
+        self._processar()
+        volumes = np.concatenate(self.volumes) if self.volumes else np.empty(0)
+        reposicoes = np.concatenate(self.reposicoes) if self.reposicoes else np.empty(0)
+        return {
+            'vazao_reposicao': self.vazao_reposicao,
+            'volume': self.volume,
+            'nivel_servico': self.nivel_servico,
+            'volumes_necessarios': volumes, # L por iteração, com a reposição escolhida
+            'reposicoes_minimas': reposicoes, # L/s por iteração, com o volume escolhido
+            'volume_nivel_servico': float(np.percentile(volumes, self.nivel_servico)) if len(volumes) else float('nan'),
+            'reposicao_nivel_servico': float(np.percentile(reposicoes, self.nivel_servico)) if len(reposicoes) else float('nan'),
+            'probabilidade_falta': float(np.mean(volumes > self.volume)) if len(volumes) else float('nan'),
+        }
@@ -0,0 +1,270 @@
+# Análise de sensibilidade global dos parâmetros dos aparelhos sobre o pico do P95 da vazão.
+#
+# As vazões, durações e antecedências dos aparelhos (catálogo de aparelhos e máquina de lavar,
+# motor_simulacao.aparelhos_convolucao) são dados do modelo. Aqui cada um varia numa faixa e mede-se quanto ele pesa no máximo do P95
+# por instante, por dois métodos sobre amostras do hipercubo unitário (scipy.stats.qmc, importado
+# só ao gerar as amostras, pois scipy.stats leva cerca de 1 s para carregar):
+#   - Sobol: matrizes A e B (Sobol embaralhado) e as matrizes A_B^i (A com a coluna i de B),
+#     N x (d + 2) avaliações; índice de primeira ordem pelo estimador de Saltelli (2010), índice
+#     total pelo de Jansen, com intervalos de 95% por reamostragem (bootstrap) das N linhas;
+#   - Morris: trajetórias que mudam um parâmetro por vez numa grade de NIVEIS_MORRIS níveis,
+#     r x (d + 1) avaliações; média do módulo (μ*) e desvio (σ) dos efeitos elementares.
+# Cada amostra de parâmetros é avaliada com poucas iterações do motor vetorizado do modo diário
+# (simulacao_diaria, que usa as superfícies de duração já calculadas). Para avaliar muitas
+# amostras por chamada, o prédio é replicado uma vez por amostra (apartamentos distintos, um
+# parâmetro por banho) e os eventos de cada cópia são deslocados para uma linha do tempo própria;
+# todas as amostras usam os mesmos sorteios em cada iteração (números aleatórios comuns), o que
+# tira das diferenças entre amostras quase todo o ruído do Monte Carlo.
+
+from time import perf_counter
+
+import numpy as np
+
+import catalogo_aparelhos
+import eventos
+import motor_simulacao
+import simulacao_diaria
+
+# Parâmetros avaliados: (descrição, mínimo, máximo) da faixa padrão
+PARAMETROS = {
+    'chuveiro': ("Vazão do chuveiro (L/s)", 0.08, 0.20),
+    'vaso': ("Vazão do vaso (L/s)", 0.10, 0.20),
+    'lavatorio': ("Vazão do lavatório (L/s)", 0.05, 0.10),
+    'pia': ("Vazão da pia (L/s)", 0.07, 0.15),
+    'duracao_vaso': ("Duração do vaso (s)", 30, 90),
+    'duracao_lavatorio': ("Duração do lavatório (s)", 15, 60),
+    'duracao_pia': ("Duração da pia (s)", 20, 80),
+    'antecedencia_vaso': ("Início do vaso antes do banho (s)", 60, 120),
+    'vazao_mlr': ("Vazão de enchimento da máquina de lavar (L/s)", 0.10, 0.17),
+    'fator_volume_mlr': ("Fator dos volumes das máquinas de lavar", 0.7, 1.3),
+}
+
+# Parâmetros em segundos (arredondados para a grade de 1 s)
+PARAMETROS_INTEIROS = ('duracao_vaso', 'duracao_lavatorio', 'duracao_pia', 'antecedencia_vaso')
+
+# Parâmetros do catálogo de aparelhos -> (aparelho, coluna, sinal); os demais são da máquina de lavar
+COLUNAS_CATALOGO = {
+    'chuveiro': ('chuveiro', 'vazao', 1),
+    'vaso': ('vaso', 'vazao', 1),
+    'lavatorio': ('lavatorio', 'vazao', 1),
+    'pia': ('pia', 'vazao', 1),
+    'duracao_vaso': ('vaso', 'duracao', 1),
+    'duracao_lavatorio': ('lavatorio', 'duracao', 1),
+    'duracao_pia': ('pia', 'duracao', 1),
+    'antecedencia_vaso': ('vaso', 'deslocamento', -1),
+}
+
+# Opções exibidas no aplicativo -> método
+METODOS_SENSIBILIDADE = {"Sobol (índices de primeira ordem e totais)": "sobol", "Morris (efeitos elementares)": "morris"}
+
+NIVEIS_MORRIS = 4
+REAMOSTRAGENS_BOOTSTRAP = 200
+
+
+def periodo_janela_unica(duracao_simulacao, temperatura):
+    """(perfil horário, janelas) que reproduzem o modo de janela única no motor do modo diário."""
+    minutos = max(1, int(round(duracao_simulacao / 60)))
+    horas = -(-minutos // 60) + 1 # Uma hora a mais para a rotina após os últimos banhos
+    janelas = [{'Janela': 'Única', 'Início': '00:00', 'Fim': f"{minutos // 60:02d}:{minutos % 60:02d}", 'Fração de moradores': 1.0}]
+    return np.full(horas, float(temperatura)), janelas
+
+
+def amostras_sobol(n_base, d, rng):
+    """Pontos (N x (d + 2)) x d no hipercubo unitário: A, B e as d matrizes A_B^i, nesta ordem."""
+    from scipy.stats import qmc
+    base = qmc.Sobol(2 * d, scramble=True, seed=rng).random(n_base)
+    a, b = base[:, :d], base[:, d:]
+    ab = np.repeat(a[None], d, axis=0)
+    ab[np.arange(d), :, np.arange(d)] = b.T
+    return np.vstack((a, b, ab.reshape(-1, d)))
+
+
+def indices_sobol(y, n_base, d, rng):
+    """Índices de primeira ordem (Saltelli) e totais (Jansen) com intervalos de 95% por bootstrap."""
+    y_a, y_b, y_ab = y[:n_base], y[n_base:2 * n_base], y[2 * n_base:].reshape(d, n_base)
+
+    def estimar(linhas):
+        a, b, ab = y_a[linhas], y_b[linhas], y_ab[:, linhas]
+        # Saídas centradas na média: sem o termo f0², o estimador de primeira ordem é bem menos ruidoso
+        media = np.mean(np.concatenate((a, b), axis=-1), axis=-1, keepdims=True)
+        a, b, ab = a - media, b - media, ab - media
+        variancia = np.var(np.concatenate((a, b), axis=-1), axis=-1)
+        variancia = np.where(variancia > 0, variancia, np.nan)
+        primeira = np.mean(b * (ab - a), axis=-1) / variancia
+        total = 0.5 * np.mean((a - ab) ** 2, axis=-1) / variancia
+        return primeira, total
+
+    primeira, total = estimar(np.arange(n_base))
+    primeira_boot, total_boot = estimar(rng.integers(n_base, size=(REAMOSTRAGENS_BOOTSTRAP, n_base)))
+    return {
+        'primeira_ordem': primeira,
+        'total': total,
+        'ic_primeira_ordem': np.nanpercentile(primeira_boot, [2.5, 97.5], axis=1),
+        'ic_total': np.nanpercentile(total_boot, [2.5, 97.5], axis=1),
+    }
+
+
+def amostras_morris(n_trajetorias, d, rng):
+    """
+    Pontos (r x (d + 1)) x d das trajetórias de Morris e a ordem em que cada uma muda os parâmetros.
+
+    Cada trajetória parte de um nível da grade e soma o passo Δ = p / (2 (p - 1)) a um parâmetro por vez.
+    """
+    delta = NIVEIS_MORRIS / (2 * (NIVEIS_MORRIS - 1))
+    base = rng.integers(NIVEIS_MORRIS // 2, size=(n_trajetorias, d)) / (NIVEIS_MORRIS - 1)
+    ordem = np.argsort(rng.random((n_trajetorias, d)), axis=1)
+    passos = np.zeros((n_trajetorias, d + 1, d))
+    passos[np.arange(n_trajetorias)[:, None], np.arange(1, d + 1)[None, :], ordem] = delta
+    return (base[:, None, :] + np.cumsum(passos, axis=1)).reshape(-1, d), ordem
+
+
+def efeitos_morris(y, ordem):
+    """μ*, μ e σ dos efeitos elementares (variação de y entre os extremos da faixa de cada parâmetro)."""
+    n_trajetorias, d = ordem.shape
+    delta = NIVEIS_MORRIS / (2 * (NIVEIS_MORRIS - 1))
+    efeitos = np.empty((n_trajetorias, d))
+    efeitos[np.arange(n_trajetorias)[:, None], ordem] = np.diff(y.reshape(n_trajetorias, d + 1), axis=1) / delta
+    return {
+        'mu_estrela': np.abs(efeitos).mean(axis=0),
+        'mu': efeitos.mean(axis=0),
+        'sigma': efeitos.std(axis=0, ddof=1) if n_trajetorias > 1 else np.full(d, np.nan),
+    }
+
+
+def _aparelhos_por_banho(valores, n_banhos_copia, catalogo):
+    """aparelhos_convolucao com um valor por banho: cada amostra de 'valores' vale para os banhos de uma cópia."""
+    aparelhos = dict(motor_simulacao.aparelhos_convolucao)
+    copias = len(valores['vazao_mlr'])
+    catalogo = dict(catalogo)
+    for coluna in catalogo_aparelhos.COLUNAS_POR_BANHO:
+        catalogo[coluna] = np.repeat(np.broadcast_to(catalogo[coluna], (copias, len(catalogo['chaves']))), n_banhos_copia, axis=0)
+    for chave, (aparelho, coluna, sinal) in COLUNAS_CATALOGO.items():
+        j = catalogo_aparelhos.indice(catalogo, aparelho)
+        if j is not None:
+            catalogo[coluna][:, j] = sinal * np.repeat(valores[chave], n_banhos_copia)
+    aparelhos['catalogo'] = catalogo
+    aparelhos['vazao_mlr'] = np.repeat(valores['vazao_mlr'], n_banhos_copia)
+    volumes = np.array(list(motor_simulacao.volumes_maquina_lavar.values()), dtype=float)
+    duracoes_mlr = volumes[None, :] * valores['fator_volume_mlr'][:, None] / valores['vazao_mlr'][:, None]
+    aparelhos['duracoes_mlr'] = np.repeat(duracoes_mlr, n_banhos_copia, axis=0)
+    return aparelhos
+
+
+def _replicar(moradores, banhos, copias):
+    """Prédio com 'copias' cópias dos moradores (apartamentos distintos) e os banhos de cada cópia."""
+    n_moradores = len(moradores['apartamento'])
+    deslocamento = np.arange(copias)[:, None]
+    replicados = {
+        'apartamento': (moradores['apartamento'][None, :] + moradores['total_apartamentos'] * deslocamento).ravel(),
+        'tipo_regra': np.tile(moradores['tipo_regra'], copias),
+        'usa_pia': np.tile(moradores['usa_pia'], copias),
+        'usa_mlr': np.tile(moradores['usa_mlr'], copias),
+        'total_apartamentos': moradores['total_apartamentos'] * copias,
+    }
+    morador, janela, dia = banhos
+    return replicados, ((morador[None, :] + n_moradores * deslocamento).ravel(), np.tile(janela, copias), np.tile(dia, copias))
+
+
+def avaliar_amostras(valores, perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima,
+                     quantidade_banheiros_por_apartamento, passo_tempo, iteracoes_por_amostra, regras=None, rng=None,
+                     ao_progresso=None, catalogo=None):
+    """
+    Máximo do P95 por instante de cada amostra de parâmetros ('valores': {parâmetro: vetor}).
+
+    As amostras são avaliadas em blocos: em cada chamada do motor, uma cópia do prédio por amostra
+    do bloco, com os mesmos sorteios para todas; o bloco é limitado para que as séries densas das
+    iterações (iteracoes x amostras x instantes) fiquem perto de 4 x eventos.ELEMENTOS_POR_BLOCO.
+    'catalogo' (padrão: catalogo_aparelhos.CATALOGO) traz os aparelhos que os parâmetros alteram.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    catalogo = motor_simulacao.aparelhos_convolucao['catalogo'] if catalogo is None else catalogo
+    moradores, preparacao, banhos = simulacao_diaria.preparar_periodo(
+        perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima, regras)
+    duracao_horizonte = len(perfil_horario) * simulacao_diaria.SEGUNDOS_POR_HORA
+    n_pontos = motor_simulacao.pontos_da_grade(duracao_horizonte, passo_tempo)
+    n_banhos = len(banhos[0])
+    n_amostras = len(next(iter(valores.values())))
+    amostras_por_bloco = max(1, 4 * eventos.ELEMENTOS_POR_BLOCO // (iteracoes_por_amostra * n_pontos))
+
+    # Números aleatórios comuns: os mesmos sorteios em todas as amostras
+    uniformes = rng.random((iteracoes_por_amostra, 2 * n_banhos))
+    participacoes = rng.random((iteracoes_por_amostra, n_banhos))
+    usos = catalogo_aparelhos.sortear_uso(catalogo, (iteracoes_por_amostra, n_banhos), rng)
+    tempos = (rng.random((iteracoes_por_amostra, n_banhos, len(catalogo['chaves']), 2))
+              if catalogo_aparelhos.tempos_variaveis(catalogo) else None)
+
+    maximos_p95 = np.empty(n_amostras)
+    for inicio in range(0, n_amostras, amostras_por_bloco):
+        bloco = slice(inicio, min(inicio + amostras_por_bloco, n_amostras))
+        copias = bloco.stop - bloco.start
+        moradores_bloco, banhos_bloco = _replicar(moradores, banhos, copias)
+        aparelhos = _aparelhos_por_banho({chave: valor[bloco] for chave, valor in valores.items()}, n_banhos, catalogo)
+        densas = np.empty((iteracoes_por_amostra, copias, n_pontos), dtype=np.float32)
+        for i in range(iteracoes_por_amostra):
+            eventos_aparelhos = {}
+            aparelhos_iteracao = aparelhos
+            if tempos is not None:
+                # Durações e deslocamentos sorteados com os mesmos uniformes em todas as cópias
+                aparelhos_iteracao = dict(aparelhos, catalogo=catalogo_aparelhos.tempos_sorteados(
+                    aparelhos['catalogo'], np.tile(tempos[i], (copias, 1, 1))))
+            simulacao_diaria.simular_iteracao_periodo(
+                moradores_bloco, banhos_bloco, preparacao, perfil_horario,
+                np.concatenate((np.tile(uniformes[i, :n_banhos], copias), np.tile(uniformes[i, n_banhos:], copias))),
+                np.tile(participacoes[i], copias), quantidade_banheiros_por_apartamento, duracao_horizonte, passo_tempo,
+                eventos_aparelhos, aparelhos_iteracao, None if usos is None else np.tile(usos[i], (copias, 1)))
+            # Cada cópia numa linha do tempo própria: uma única série esparsa para todas
+            copia = eventos_aparelhos['apartamentos'] // moradores['total_apartamentos']
+            serie = eventos.SerieEsparsa.de_intervalos(
+                eventos_aparelhos['inicios'] + copia * duracao_horizonte, eventos_aparelhos['fins'] + copia * duracao_horizonte,
+                eventos_aparelhos['vazoes'], copias * n_pontos, passo_tempo)
+            densas[i] = serie.densificar().reshape(copias, n_pontos)
+        maximos_p95[bloco] = np.percentile(densas, 95, axis=0).max(axis=1)
+        if ao_progresso is not None:
+            ao_progresso(bloco.stop / n_amostras)
+    return maximos_p95
+
+
+def analisar(metodo, faixas, n_amostras, perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima,
+             quantidade_banheiros_por_apartamento, passo_tempo, iteracoes_por_amostra, regras=None, rng=None, ao_progresso=None,
+             catalogo=None):
+    """
+    Sensibilidade do máximo do P95 aos parâmetros dos aparelhos.
+
+    'faixas' ({parâmetro: (mínimo, máximo)}) cobre PARAMETROS; os de mínimo igual ao máximo ficam
+    fixos, assim como os de aparelhos ausentes do 'catalogo'. 'n_amostras' é o N de Sobol (potência
+    de 2) ou o número de trajetórias de Morris.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    catalogo = motor_simulacao.aparelhos_convolucao['catalogo'] if catalogo is None else catalogo
+    inicio = perf_counter()
+    variaveis = [chave for chave in PARAMETROS if faixas[chave][1] > faixas[chave][0]
+                 and (chave not in COLUNAS_CATALOGO or catalogo_aparelhos.indice(catalogo, COLUNAS_CATALOGO[chave][0]) is not None)]
+    d = len(variaveis)
+    if d == 0:
+        raise ValueError("Informe ao menos um parâmetro com máximo maior que o mínimo.")
+    if metodo == 'sobol':
+        unitarias = amostras_sobol(n_amostras, d, rng)
+    else:
+        unitarias, ordem = amostras_morris(n_amostras, d, rng)
+
+    valores = {chave: np.full(len(unitarias), float(faixas[chave][0])) for chave in PARAMETROS}
+    for j, chave in enumerate(variaveis):
+        minimo, maximo = faixas[chave]
+        valores[chave] = minimo + unitarias[:, j] * (maximo - minimo)
+    for chave in PARAMETROS_INTEIROS:
+        valores[chave] = np.rint(valores[chave]).astype(np.int64)
+
+    y = avaliar_amostras(valores, perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima,
+                         quantidade_banheiros_por_apartamento, passo_tempo, iteracoes_por_amostra, regras, rng, ao_progresso,
+                         catalogo)
+    indices = indices_sobol(y, n_amostras, d, rng) if metodo == 'sobol' else efeitos_morris(y, ordem)
+    return {
+        'metodo': metodo,
+        'parametros': variaveis,
+        'indices': indices, # Um valor por parâmetro de 'parametros'
+        'valores': valores, # Parâmetros de cada amostra avaliada
+        'max_p95': y, # Máximo do P95 de cada amostra
+        'n_avaliacoes': len(y),
+        'iteracoes_por_amostra': iteracoes_por_amostra,
+        'tempo_s': perf_counter() - inicio,
+    }
@@ -0,0 +1,319 @@
+# Simulação de um dia inteiro ou de vários dias, com perfil horário de temperatura.
+#
+# O modo de janela única usa uma temperatura fixa e um intervalo de banhos pela manhã. Aqui o
+# horizonte é de 24 h x dias, a temperatura vem de uma série horária (CSV) e os banhos acontecem
+# em várias janelas de uso (ex.: pico da manhã e da noite). A duração do banho vem da superfície
+# temperatura x fração de início na janela de cada conjunto de regras (superficie_duracao), a
+# mesma para todas as janelas. Assim cada iteração é vetorizada sobre todos os banhos do horizonte; só a fila dos
+# banheiros percorre os banhos de cada apartamento em ordem, e mesmo ela é vetorizada entre os
+# apartamentos. A série de cada iteração é esparsa (eventos.SerieEsparsa) e as estatísticas usam
+# o mesmo laço em lotes e o mesmo orçamento de memória do modo de janela única.
+
+import numpy as np
+
+import agua_quente
+import catalogo_aparelhos
+import eventos
+import instrumentacao
+import motor_convolucao
+import motor_simulacao
+
+SEGUNDOS_POR_HORA = 3600
+SEGUNDOS_POR_DIA = 24 * SEGUNDOS_POR_HORA
+
+# Janelas de uso padrão: fração dos moradores que toma banho em cada uma
+JANELAS_PADRAO = [
+    {'Janela': 'Manhã', 'Início': '04:45', 'Fim': '09:00', 'Fração de moradores': 1.0},
+    {'Janela': 'Noite', 'Início': '18:00', 'Fim': '22:00', 'Fração de moradores': 0.5},
+]
+
+
+def ler_perfil_temperatura(arquivo):
+    """
+    Lê a série horária de temperatura de um CSV (uma linha por hora, a partir de 00:00 do 1º dia).
+
+    Usa a coluna 'temperatura' se existir, senão a última coluna; aceita ';' ou ',' como
+    separador e vírgula decimal. Retorna um vetor com uma temperatura por hora.
+    """
+    import pandas as pd
+
+    tabela = pd.read_csv(arquivo, sep=None, engine='python', dtype=str)
+    colunas = {coluna.strip().lower(): coluna for coluna in tabela.columns}
+    coluna = colunas.get('temperatura', tabela.columns[-1])
+    temperaturas = pd.to_numeric(tabela[coluna].str.strip().str.replace(',', '.'), errors='coerce').to_numpy()
+    if len(temperaturas) == 0 or np.isnan(temperaturas).any():
+        raise ValueError("O perfil de temperatura deve ter uma temperatura numérica por hora.")
+    return temperaturas
+
+
+def perfil_sintetico(temperatura_minima, temperatura_maxima, dias):
+    """Perfil horário senoidal com mínima às 5 h e máxima às 15 h, repetido por 'dias'."""
+    horas = np.arange(24 * dias)
+    fase = np.cos(2 * np.pi * ((horas % 24) - 15) / 24)
+    return temperatura_minima + (temperatura_maxima - temperatura_minima) * (fase + 1) / 2
+
+
+def temperatura_no_instante(perfil_horario, instantes):
+    """Temperatura interpolada linearmente entre os valores horários (mantida após a última hora)."""
+    horas = np.arange(len(perfil_horario)) * SEGUNDOS_POR_HORA
+    return np.interp(instantes, horas, perfil_horario)
+
+
+def converter_janelas(janelas):
+    """Converte as janelas ('HH:MM' e fração) para (início em s no dia, duração em s, fração)."""
+    convertidas = []
+    for janela in janelas:
+        inicio = _segundos_do_dia(janela['Início'])
+        fim = _segundos_do_dia(janela['Fim'])
+        duracao = (fim - inicio) % SEGUNDOS_POR_DIA
+        fracao = float(janela['Fração de moradores'])
+        if duracao > 0 and fracao > 0:
+            convertidas.append((inicio, duracao, min(fracao, 1.0)))
+    if not convertidas:
+        raise ValueError("Defina ao menos uma janela de uso com duração e fração de moradores positivas.")
+    return convertidas
+
+
+def _segundos_do_dia(horario):
+    horas, minutos = str(horario).strip().split(':')
+    return (int(horas) * 60 + int(minutos)) * 60
+
+
+def preparar_janelas(janelas, temperatura_minima, temperatura_maxima, tipos_regra, regras=None):
+    """
+    Monta, para cada janela, os inícios em que a máquina de lavar é usada, e as superfícies de duração por regra.
+
+    As superfícies são as mesmas em todas as janelas (o início entra como fração da janela) e
+    cobrem toda a faixa [temperatura_minima, temperatura_maxima]; o perfil é limitado a ela.
+    """
+    preparadas = []
+    for inicio_janela, duracao_janela, fracao in converter_janelas(janelas):
+        modelo = motor_simulacao.construir_modelo_fuzzy(duracao_janela, temperatura_minima, temperatura_maxima, regras=regras)
+        preparadas.append({
+            'inicio': inicio_janela,
+            'duracao': duracao_janela,
+            'fracao': fracao,
+            'mlr_por_inicio': motor_convolucao.inicios_com_mlr(modelo['inicio_do_banho'], duracao_janela),
+        })
+    return {'janelas': preparadas, 'superficies': {tipo_regra: modelo['superficies'][tipo_regra] for tipo_regra in tipos_regra}}
+
+
+def _banhos_do_horizonte(moradores_predio, janelas, dias):
+    """Um possível banho por morador, janela e dia: índices do morador, da janela e do dia de cada banho."""
+    n_moradores = len(moradores_predio)
+    morador, janela, dia = np.meshgrid(np.arange(n_moradores), np.arange(len(janelas)), np.arange(dias), indexing='ij')
+    return morador.ravel(), janela.ravel(), dia.ravel()
+
+
+def simular_iteracao_periodo(moradores, banhos, preparacao, perfil_horario, uniformes_iteracao, uniformes_participacao,
+                             quantidade_banheiros_por_apartamento, duracao_horizonte, passo_tempo, eventos_aparelhos=None,
+                             aparelhos=None, uniformes_aparelhos=None):
+    """
+    Uma iteração do horizonte completo, vetorizada sobre todos os banhos; retorna a eventos.SerieEsparsa.
+
+    Reproduz a rotina do modo de janela única: os aparelhos do catálogo (padrão: vaso 90 s antes do
+    banho, lavatório 30 s após, pia 120 s após se o morador usa a pia; ver catalogo_aparelhos),
+    montados de uma vez como matrizes banhos x aparelhos, a máquina de lavar 30 s após a pia ou
+    120 s após o banho, e a fila pelo banheiro que fica livre mais cedo no apartamento. Se
+    'eventos_aparelhos' (dicionário) for passado, recebe os intervalos com o aparelho, o apartamento
+    e a temperatura do ar de cada evento (usados pelo modelo de água quente).
+
+    'aparelhos' (padrão: motor_simulacao.aparelhos_convolucao) pode trazer, no lugar de cada valor,
+    um vetor com um valor por banho, nas colunas numéricas do catálogo uma linha por banho e em
+    'duracoes_mlr' uma linha de durações por banho (usado pela análise de sensibilidade para avaliar
+    vários conjuntos de parâmetros numa só chamada e pelas durações e deslocamentos sorteados, ver
+    catalogo_aparelhos.sortear_tempos). 'uniformes_aparelhos' (banhos x aparelhos, ver
+    catalogo_aparelhos.sortear_uso) decide o uso dos aparelhos com probabilidade menor que 1.
+    """
+    aparelhos = motor_simulacao.aparelhos_convolucao if aparelhos is None else aparelhos
+    catalogo = aparelhos['catalogo']
+
+    def por_banho(chave, indices):
+        valor = aparelhos[chave]
+        return valor[indices] if np.ndim(valor) else valor
+
+    indice_morador, indice_janela, dia = banhos
+    n_banhos = len(indice_morador)
+    janelas = preparacao['janelas']
+
+    # Quem toma banho em cada janela e quando
+    fracoes = np.array([janela['fracao'] for janela in janelas])
+    participa = uniformes_participacao < fracoes[indice_janela]
+    duracoes_janela = np.array([janela['duracao'] for janela in janelas])
+    inicios_janela = np.array([janela['inicio'] for janela in janelas])
+    deslocamento = np.minimum((uniformes_iteracao[:n_banhos] * duracoes_janela[indice_janela]).astype(np.int64),
+                              duracoes_janela[indice_janela] - 1)
+    inicio_banho = dia * SEGUNDOS_POR_DIA + inicios_janela[indice_janela] + deslocamento
+
+    # Duração fuzzy pela superfície (temperatura do instante x fração de início na janela)
+    temperatura = temperatura_no_instante(perfil_horario, inicio_banho)
+    fracao_inicio = deslocamento / duracoes_janela[indice_janela]
+    duracao_banho = np.zeros(n_banhos)
+    for tipo_regra, superficie in preparacao['superficies'].items():
+        selecao = moradores['tipo_regra'][indice_morador] == tipo_regra
+        duracao_banho[selecao] = superficie.duracao_minutos(temperatura[selecao], fracao_inicio[selecao])
+    usa_mlr = np.zeros(n_banhos, dtype=bool)
+    for j, janela in enumerate(janelas):
+        na_janela = indice_janela == j
+        usa_mlr[na_janela] = janela['mlr_por_inicio'][deslocamento[na_janela]]
+    duracao_banho = (duracao_banho * 60).astype(np.int64)
+    usa_mlr &= moradores['usa_mlr'][indice_morador]
+    tabela_mlr = np.array(aparelhos['duracoes_mlr'], dtype=np.int64)
+    modelo_mlr = np.minimum((uniformes_iteracao[n_banhos:2 * n_banhos] * tabela_mlr.shape[-1]).astype(np.int64),
+                            tabela_mlr.shape[-1] - 1)
+    duracoes_mlr = tabela_mlr[np.arange(n_banhos), modelo_mlr] if tabela_mlr.ndim == 2 else tabela_mlr[modelo_mlr]
+
+    # Aparelhos do catálogo de cada banho (banhos x aparelhos), relativos ao início do banho,
+    # e quanto cada banho ocupa o banheiro antes e depois do chuveiro
+    usado = catalogo_aparelhos.usados(catalogo, uniformes_aparelhos, moradores['usa_pia'][indice_morador])
+    inicio_relativo, fim_relativo = catalogo_aparelhos.intervalos_relativos(catalogo, duracao_banho)
+    antes, depois = catalogo_aparelhos.ocupacao(catalogo, inicio_relativo, fim_relativo, duracao_banho, usado)
+
+    # Fila dos banheiros: banhos de cada apartamento em ordem de início, vetorizada entre apartamentos
+    banhos_validos = np.flatnonzero(participa)
+    apartamento = moradores['apartamento'][indice_morador[banhos_validos]] - 1
+    ordem = np.lexsort((inicio_banho[banhos_validos], apartamento))
+    banhos_validos, apartamento = banhos_validos[ordem], apartamento[ordem]
+    primeiro_do_apartamento = np.searchsorted(apartamento, apartamento, side='left')
+    posicao_no_apartamento = np.arange(len(banhos_validos)) - primeiro_do_apartamento
+
+    banheiros_livres_em = np.zeros((moradores['total_apartamentos'], quantidade_banheiros_por_apartamento))
+    for posicao in range(posicao_no_apartamento.max() + 1 if len(banhos_validos) else 0):
+        nesta_posicao = posicao_no_apartamento == posicao
+        banho = banhos_validos[nesta_posicao]
+        apto = apartamento[nesta_posicao]
+        inicio_ocupacao = np.maximum(0, inicio_banho[banho] - antes[banho])
+        banheiro = np.argmin(banheiros_livres_em[apto], axis=1)
+        liberacao = banheiros_livres_em[apto, banheiro]
+        # Com espera, o banho passa a começar quando o banheiro é liberado
+        inicio_banho[banho] = np.where(liberacao > inicio_ocupacao, liberacao, inicio_banho[banho])
+        fim_ocupacao = np.minimum(duracao_horizonte, inicio_banho[banho] + duracao_banho[banho] + depois[banho])
+        banheiros_livres_em[apto, banheiro] = fim_ocupacao
+
+    # Intervalos de cada aparelho (parâmetro de cada banho válido); o que começaria antes de 0
+    # começa em 0 com a mesma duração
+    b = banhos_validos
+
+    def de_cada(chave):
+        return np.broadcast_to(por_banho(chave, b), len(b))
+
+    inicio, fim_banho = inicio_banho[b], inicio_banho[b] + duracao_banho[b]
+    inicio_aparelho = np.maximum(0, inicio[:, None] + inicio_relativo[b])
+    fim_aparelho = inicio_aparelho + (fim_relativo[b] - inicio_relativo[b])
+    usado = usado[b]
+    vazao_aparelho = np.broadcast_to(catalogo_aparelhos.selecionar(catalogo, b)['vazao'], usado.shape)
+
+    j_antes_mlr = catalogo_aparelhos.indice(catalogo, catalogo_aparelhos.APARELHO_ANTES_MLR)
+    if j_antes_mlr is None:
+        antes_mlr_valido = np.zeros(len(b), dtype=bool)
+        fim_antes_mlr = fim_banho
+    else:
+        fim_antes_mlr = np.minimum(duracao_horizonte, fim_aparelho[:, j_antes_mlr])
+        antes_mlr_valido = usado[:, j_antes_mlr] & (fim_antes_mlr > inicio_aparelho[:, j_antes_mlr])
+    inicio_mlr = np.where(antes_mlr_valido, fim_antes_mlr + de_cada('atraso_mlr_apos_pia'),
+                          fim_banho + de_cada('atraso_mlr_apos_banho'))
+    mlr = usa_mlr[b]
+
+    # Eventos na ordem aparelho a aparelho (colunas da matriz), e a máquina de lavar por último
+    inicios = np.concatenate((inicio_aparelho.T[usado.T], inicio_mlr[mlr]))
+    fins = np.concatenate((fim_aparelho.T[usado.T], inicio_mlr[mlr] + duracoes_mlr[b][mlr]))
+    vazoes = np.concatenate((vazao_aparelho.T[usado.T], de_cada('vazao_mlr')[mlr])).astype(float)
+    inicios = np.clip(inicios, 0, duracao_horizonte)
+    fins = np.clip(fins, 0, duracao_horizonte)
+    validos = fins > inicios
+    if eventos_aparelhos is not None:
+        chaves = np.broadcast_to(catalogo['chaves'], usado.shape)
+        apartamentos = np.broadcast_to(apartamento[:, None], usado.shape)
+        eventos_aparelhos.update({
+            'inicios': inicios[validos], 'fins': fins[validos], 'vazoes': vazoes[validos],
+            'aparelhos': np.concatenate((chaves.T[usado.T], np.full(mlr.sum(), 'mlr', dtype=object)))[validos],
+            'apartamentos': np.concatenate((apartamentos.T[usado.T], apartamento[mlr]))[validos],
+            'temperatura_ar': temperatura_no_instante(perfil_horario, inicios[validos]),
+        })
+    return eventos.SerieEsparsa.de_intervalos(inicios[validos], fins[validos], vazoes[validos],
+                                              motor_simulacao.pontos_da_grade(duracao_horizonte, passo_tempo), passo_tempo)
+
+
+def preparar_periodo(perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima, regras=None):
+    """
+    (moradores, preparacao, banhos) usados por simular_iteracao_periodo: os atributos dos moradores
+    em vetores, as janelas e superfícies de duração (preparar_janelas) e os possíveis banhos do horizonte.
+    """
+    dias = int(np.ceil(len(perfil_horario) / 24))
+    duracao_horizonte = len(perfil_horario) * SEGUNDOS_POR_HORA
+    moradores = {
+        'apartamento': np.array([m['apartamento'] for m in moradores_predio]),
+        'tipo_regra': np.array([m['tipo_regra'] for m in moradores_predio]),
+        'usa_pia': np.array([m['usa_pia'] for m in moradores_predio]),
+        'usa_mlr': np.array([m['usa_mlr'] for m in moradores_predio]),
+        'total_apartamentos': moradores_predio[-1]['apartamento'],
+    }
+    preparacao = preparar_janelas(janelas, temperatura_minima, temperatura_maxima, set(moradores['tipo_regra']), regras)
+    banhos = _banhos_do_horizonte(moradores_predio, preparacao['janelas'], dias)
+    # Banhos de janelas que terminariam após o fim do perfil horário são descartados
+    dentro = banhos[2] * SEGUNDOS_POR_DIA + np.array([j['inicio'] for j in preparacao['janelas']])[banhos[1]] < duracao_horizonte
+    return moradores, preparacao, tuple(indices[dentro] for indices in banhos)
+
+
+def simular_periodo(perfil_horario, janelas, moradores_predio, temperatura_minima, temperatura_maxima,
+                    quantidade_banheiros_por_apartamento, passo_tempo, n_lotes_minimo, tamanho_do_lote_k,
+                    limiar_convergencia, n_simulacoes_maximo, metodo_amostragem="aleatoria",
+                    criterio_parada="medias_lotes", precisao_relativa=0.005, estimar_cauda=False,
+                    orcamento_memoria_mb=None, rng=None, ao_progresso=None, ao_concluir_lote=None, regras=None,
+                    gravador_series=None, janelas_s=(), parametros_reservatorio=None, parametros_agua_quente=None,
+                    catalogo=None):
+    """
+    Executa o Monte Carlo do horizonte completo (um dia por 24 valores do perfil horário).
+
+    'regras' ({tipo_regra: matriz}) traz os conjuntos de regras, inclusive os personalizados
+    (padrão: regras_fuzzy.REGRAS_PADRAO). Com 'gravador_series', a série de cada iteração é gravada
+    em disco (ver armazem_series); 'janelas_s' lista as janelas (s) das vazões médias móveis e
+    'parametros_reservatorio' ativa o cálculo do reservatório (ver reservatorio) e
+    'parametros_agua_quente' o da demanda de água quente e do aquecedor (ver agua_quente).
+    'catalogo' traz os aparelhos da rotina do banho (padrão: catalogo_aparelhos.CATALOGO).
+
+    Retorna o mesmo dicionário de resultados de motor_simulacao.simular_temperatura, acrescido
+    da temperatura interpolada em cada instante da grade ('temperatura_ts').
+    """
+    cronometro = instrumentacao.CronometroFases()
+    rng = np.random.default_rng() if rng is None else rng
+    aparelhos = motor_simulacao.aparelhos_convolucao
+    if catalogo is not None:
+        aparelhos = dict(aparelhos, catalogo=catalogo)
+    duracao_horizonte = len(perfil_horario) * SEGUNDOS_POR_HORA
+    with cronometro.medir('fuzzy'):
+        moradores, preparacao, banhos = preparar_periodo(perfil_horario, janelas, moradores_predio,
+                                                         temperatura_minima, temperatura_maxima, regras)
+    acumulador_agua_quente = (agua_quente.AcumuladorAguaQuente(
+        parametros_agua_quente, motor_simulacao.pontos_da_grade(duracao_horizonte, passo_tempo), passo_tempo,
+        moradores['total_apartamentos'], orcamento_memoria_mb, catalogo_aparelhos.temperaturas_uso(aparelhos['catalogo']))
+        if parametros_agua_quente else None)
+
+    def simular(uniformes_iteracao):
+        eventos_aparelhos = {} if acumulador_agua_quente is not None else None
+        with cronometro.medir('vazao'):
+            # Durações e deslocamentos dos aparelhos sorteados de uma vez para todos os banhos (se não forem fixos)
+            aparelhos_iteracao = dict(aparelhos, catalogo=catalogo_aparelhos.sortear_tempos(aparelhos['catalogo'],
+                                                                                            len(banhos[0]), rng))
+            vazao = simular_iteracao_periodo(moradores, banhos, preparacao, perfil_horario, uniformes_iteracao,
+                                             rng.random(len(banhos[0])), quantidade_banheiros_por_apartamento,
+                                             duracao_horizonte, passo_tempo, eventos_aparelhos, aparelhos_iteracao,
+                                             catalogo_aparelhos.sortear_uso(aparelhos['catalogo'], len(banhos[0]), rng))
+        if acumulador_agua_quente is not None:
+            with cronometro.medir('agua_quente'):
+                acumulador_agua_quente.adicionar(**eventos_aparelhos)
+        return vazao
+
+    resultados = motor_simulacao.executar_monte_carlo(
+        simular, len(banhos[0]), duracao_horizonte, passo_tempo, n_lotes_minimo, tamanho_do_lote_k,
+        limiar_convergencia, n_simulacoes_maximo, metodo_amostragem, criterio_parada, precisao_relativa, estimar_cauda,
+        orcamento_memoria_mb, rng, ao_progresso, ao_concluir_lote, cronometro, gravador_series, janelas_s,
+        parametros_reservatorio)
+    resultados['temperatura_ts'] = temperatura_no_instante(perfil_horario, resultados['tempo'])
+    resultados['relatorio'] = []
+    resultados['avisos'] = []
+    resultados['agua_quente'] = None
+    if acumulador_agua_quente is not None:
+        with cronometro.medir('agua_quente'):
+            resultados['agua_quente'] = acumulador_agua_quente.finalizar()
+    return resultados
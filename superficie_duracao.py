@@ -0,0 +1,168 @@
+# Superfície contínua da duração do banho (temperatura x início), pré-calculada e guardada em disco.
+#
+# A duração fuzzy depende só do conjunto de regras, da temperatura do ar e da posição do início do
+# banho na janela: os conjuntos de início são triângulos em múltiplos de duração/4, então a saída é
+# a mesma para qualquer duração de janela quando o início é expresso como fração dela. Cada
+# conjunto de regras vira uma tabela em toda a faixa [temperatura_minima, temperatura_maxima], no
+# passo de 0,1 °C, com PONTOS_POR_QUARTO pontos de início entre dois conjuntos de início vizinhos.
+# A tabela é calculada uma única vez pela inferência vetorizada da matriz de regras (regras_fuzzy),
+# guardada em disco (.npz) e depois consultada por interpolação bilinear em O(1): as grades são
+# uniformes, então o índice vem de uma divisão, sem busca. Varreduras de temperatura, perfis
+# horários e estudos de sensibilidade não fazem inferência fuzzy. Com 64 pontos por quarto, a
+# diferença para o skfuzzy direto é de 0,05 s em média e de no máximo ~2,5 s por banho (junto às
+# quinas do mínimo entre pertinências).
+
+import functools
+import hashlib
+import inspect
+import os
+from pathlib import Path
+
+import numpy as np
+
+import regras_fuzzy
+
+# Resolução da superfície: passo de temperatura (°C) e pontos de início por quarto da janela
+PASSO_TEMPERATURA = 0.1
+PONTOS_POR_QUARTO = 64
+
+# Duração da janela do modelo de referência: cada ponto da grade de início cai num segundo inteiro
+DURACAO_REFERENCIA = 4 * PONTOS_POR_QUARTO * 60
+
+# Pontos avaliados por chamada à inferência durante a construção (limita a memória e permite informar o progresso)
+PONTOS_POR_BLOCO = 4096
+
+# Versão do formato da tabela em disco (incluída na chave do cache)
+VERSAO_SUPERFICIE = 2
+
+DIRETORIO_CACHE = Path(os.environ.get("SIMULADOR_VAZAO_CACHE", Path.home() / ".cache" / "simulador_vazao"))
+
+# Superfícies já carregadas neste processo, por chave
+_superficies = {}
+
+
+class SuperficieDuracao:
+    """Duração do banho (min) de um conjunto de regras em função da temperatura e da fração de início na janela."""
+
+    def __init__(self, tabela, temperatura_minima, temperatura_maxima):
+        self.tabela = tabela
+        self.temperatura_minima = temperatura_minima
+        self.temperatura_maxima = temperatura_maxima
+        self.passo_temperatura = (temperatura_maxima - temperatura_minima) / (tabela.shape[0] - 1) or 1.0
+        self.passo_inicio = 1 / (tabela.shape[1] - 1)
+
+    def duracao_minutos(self, temperaturas, fracoes_inicio):
+        """Interpolação bilinear (vetorizada); temperaturas e frações fora da faixa são limitadas às bordas."""
+        t = (np.clip(temperaturas, self.temperatura_minima, self.temperatura_maxima) - self.temperatura_minima) / self.passo_temperatura
+        s = np.clip(fracoes_inicio, 0.0, 1.0) / self.passo_inicio
+        i = np.minimum(np.asarray(t, dtype=np.int64), self.tabela.shape[0] - 2)
+        j = np.minimum(np.asarray(s, dtype=np.int64), self.tabela.shape[1] - 2)
+        peso_t = t - i
+        peso_s = s - j
+        inferior = self.tabela[i, j] * (1 - peso_s) + self.tabela[i, j + 1] * peso_s
+        superior = self.tabela[i + 1, j] * (1 - peso_s) + self.tabela[i + 1, j + 1] * peso_s
+        return inferior * (1 - peso_t) + superior * peso_t
+
+
+class SuperficiesDuracao:
+    """Superfícies dos conjuntos de regras de um modelo, obtidas sob demanda (memória, disco ou inferência vetorizada)."""
+
+    def __init__(self, construir_modelo, regras, temperatura_minima, temperatura_maxima):
+        self.construir_modelo = construir_modelo
+        self.regras = regras
+        self.temperatura_minima = float(temperatura_minima)
+        self.temperatura_maxima = float(temperatura_maxima)
+        self._por_regra = {}
+
+    def __getitem__(self, tipo_regra):
+        if tipo_regra not in self._por_regra:
+            self._por_regra[tipo_regra] = obter_superficie(self.construir_modelo, self.regras[tipo_regra],
+                                                           self.temperatura_minima, self.temperatura_maxima)
+        return self._por_regra[tipo_regra]
+
+    def faltantes(self, tipos_regra):
+        """Conjuntos de regras cuja superfície ainda não está em memória nem em disco."""
+        return [tipo_regra for tipo_regra in sorted(set(tipos_regra))
+                if _chave(self.construir_modelo, self.regras[tipo_regra], self.temperatura_minima, self.temperatura_maxima) not in _superficies
+                and not _arquivo_cache(self.construir_modelo, self.regras[tipo_regra], self.temperatura_minima, self.temperatura_maxima).exists()]
+
+    def preparar(self, tipos_regra, ao_progresso=None):
+        """Carrega ou constrói as superfícies dos conjuntos de regras; 'ao_progresso(fracao)' durante a construção."""
+        tipos_regra = sorted(set(tipos_regra))
+        for n, tipo_regra in enumerate(tipos_regra):
+            progresso_regra = None
+            if ao_progresso is not None:
+                def progresso_regra(fracao, n=n):
+                    ao_progresso((n + fracao) / len(tipos_regra))
+            self._por_regra[tipo_regra] = obter_superficie(self.construir_modelo, self.regras[tipo_regra], self.temperatura_minima,
+                                                           self.temperatura_maxima, progresso_regra)
+
+
+def grade_temperatura(temperatura_minima, temperatura_maxima):
+    """Grade uniforme de temperatura da superfície, com passo de no máximo PASSO_TEMPERATURA."""
+    n_temperaturas = max(2, int(np.ceil(round((temperatura_maxima - temperatura_minima) / PASSO_TEMPERATURA, 6))) + 1)
+    return np.linspace(temperatura_minima, temperatura_maxima, n_temperaturas)
+
+
+def grade_inicio():
+    """Grade uniforme da fração de início na janela (inclui as quinas dos conjuntos de início)."""
+    return np.linspace(0.0, 1.0, 4 * PONTOS_POR_QUARTO + 1)
+
+
+def construir_tabela(construir_modelo, regras, temperatura_minima, temperatura_maxima, ao_progresso=None):
+    """Avalia a matriz de regras em toda a grade temperatura x início; retorna tabela[indice_temperatura, indice_inicio] (min)."""
+    modelo = construir_modelo(DURACAO_REFERENCIA, temperatura_minima, temperatura_maxima)
+    inicios, temperaturas = np.meshgrid(grade_inicio() * DURACAO_REFERENCIA, grade_temperatura(temperatura_minima, temperatura_maxima))
+    inicios, temperaturas = inicios.ravel(), temperaturas.ravel()
+
+    duracoes = np.empty(len(inicios))
+    for inicio in range(0, len(inicios), PONTOS_POR_BLOCO):
+        bloco = slice(inicio, inicio + PONTOS_POR_BLOCO)
+        # A temperatura máxima pode ficar um resíduo acima do universo fuzzy (np.arange com passo 0,1): a inferência limita às bordas
+        duracoes[bloco] = regras_fuzzy.inferir_duracao(regras, modelo, inicios[bloco], temperaturas[bloco])
+        if ao_progresso is not None:
+            ao_progresso(min(inicio + PONTOS_POR_BLOCO, len(inicios)) / len(inicios))
+    return duracoes.reshape(-1, len(grade_inicio()))
+
+
+def obter_superficie(construir_modelo, regras, temperatura_minima, temperatura_maxima, ao_progresso=None):
+    """Superfície de um conjunto de regras: da memória do processo, do cache em disco ou construída agora."""
+    chave = _chave(construir_modelo, regras, temperatura_minima, temperatura_maxima)
+    if chave not in _superficies:
+        arquivo = _arquivo_cache(construir_modelo, regras, temperatura_minima, temperatura_maxima)
+        try:
+            with np.load(arquivo) as dados:
+                tabela = dados['tabela']
+        except (OSError, KeyError, ValueError):
+            tabela = construir_tabela(construir_modelo, regras, temperatura_minima, temperatura_maxima, ao_progresso)
+            _salvar(arquivo, tabela)
+        _superficies[chave] = SuperficieDuracao(tabela, temperatura_minima, temperatura_maxima)
+    return _superficies[chave]
+
+
+def _chave(construir_modelo, regras, temperatura_minima, temperatura_maxima):
+    # A matriz de regras e o código das funções de pertinência entram na chave: alterá-los invalida o cache
+    regras = "".join(map(str, np.asarray(regras).ravel()))
+    dados = (f"{VERSAO_SUPERFICIE}|{PASSO_TEMPERATURA}|{PONTOS_POR_QUARTO}|{regras}|"
+             f"{float(temperatura_minima)!r}|{float(temperatura_maxima)!r}|{_fonte(construir_modelo)}")
+    return hashlib.sha1(dados.encode()).hexdigest()[:16]
+
+
+@functools.lru_cache(maxsize=None)
+def _fonte(construir_modelo):
+    return inspect.getsource(construir_modelo)
+
+
+def _arquivo_cache(construir_modelo, regras, temperatura_minima, temperatura_maxima):
+    return DIRETORIO_CACHE / f"duracao_{_chave(construir_modelo, regras, temperatura_minima, temperatura_maxima)}.npz"
+
+
+def _salvar(arquivo, tabela):
+    """Grava a tabela no cache (escrita atômica); sem permissão de escrita, fica só em memória."""
+    try:
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+        temporario = arquivo.with_name(f"{arquivo.stem}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(temporario, tabela=tabela)
+        os.replace(temporario, arquivo)
+    except OSError:
+        pass